@@ -7,76 +7,204 @@ import torch
 from transformers import CLIPProcessor, CLIPModel, Speech2TextProcessor, Speech2TextForConditionalGeneration
 import numpy as np
 from PIL import Image
-from typing import List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
 import logging
+import threading
+import functools
+from embedding_cache import EmbeddingCache
+from model_lifecycle import ModelLifecycleManager
+from inference_engine import CompiledCLIP, InferenceEngine, engine
+from text_chunker import TextChunker, TextWindow, chunk_text
+from audio_stream import split_waveform
+from metrics import stage_timer
+from profiling import record_shapes
+import config
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _batches(items: list, batch_size: Optional[int]):
+    """Split items into consecutive chunks of at most batch_size (all at once if None)"""
+    if not batch_size:
+        batch_size = max(1, len(items))
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+def warmup_clip(models: Tuple[CLIPModel, CLIPProcessor], engine: InferenceEngine = engine):
+    """Run one text and one image forward pass so the first request does not pay for lazy initialization
+
+    Runs in the engine's context, so warmup (and any graph built here) uses
+    the same precision as serving.
+    """
+    clip_model, clip_processor = models
+    inputs = clip_processor(text=["warmup"], images=[Image.new("RGB", (224, 224))], return_tensors="pt", padding=True)
+    with engine.context():
+        if isinstance(clip_model, CompiledCLIP):
+            # Trace/compile every batch shape (or load cached graphs) up front
+            clip_model.prepare()
+        clip_model.get_text_features(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+        clip_model.get_image_features(pixel_values=inputs["pixel_values"])
+
+def warmup_speech(models: Tuple[Speech2TextForConditionalGeneration, Speech2TextProcessor], engine: InferenceEngine = engine,
+                  sampling_rate: int = 16000):
+    """Transcribe one second of silence to initialize the encoder and decoder"""
+    speech_model, speech_processor = models
+    inputs = speech_processor(np.zeros(sampling_rate, dtype=np.float32), sampling_rate=sampling_rate, return_tensors="pt")
+    with engine.context():
+        speech_model.generate(inputs["input_features"], attention_mask=inputs["attention_mask"], max_new_tokens=4)
+
+# Models each modality needs at ingest time
+MODALITY_MODELS = {"text": ("clip",), "image": ("clip",), "audio": ("speech", "clip")}
+
 class AIModelsManager:
-    """Manages AI models for multimodal processing"""
+    """Manages AI models for multimodal processing
+    
+    Models are loaded on first use (or in the background via start()) and may
+    be unloaded again after idle_ttl seconds without requests.
+    
+    Models are loaded and run through an InferenceEngine (see
+    inference_engine), which fixes the precision ("fp32", "int8" dynamic
+    quantization or "bf16" autocast), wraps forwards in inference_mode and may
+    trace or compile the CLIP encoders. Without an engine one is created for
+    precision. Embeddings are always returned as float32.
+    """
+    
+    def __init__(self, query_cache_entries: int = 10000, query_cache_bytes: int = 64 * 1024 * 1024,
+                 idle_ttl: float = 0.0, warmup: bool = True, precision: str = "fp32",
+                 engine: Optional[InferenceEngine] = None):
+        self.clip_model_name = "openai/clip-vit-base-patch32"
+        self.speech_model_name = "facebook/s2t-medium-librispeech-asr"
+        self.engine = engine or InferenceEngine(precision=precision)
+        self.query_cache = EmbeddingCache(query_cache_entries, query_cache_bytes)
+        # Fast tokenizers switch truncation/padding state per call and raise
+        # "Already borrowed" when used from two threads at once
+        self._tokenizer_lock = threading.Lock()
+        
+        self.lifecycle = ModelLifecycleManager(idle_ttl=idle_ttl)
+        self.lifecycle.register("clip", self._load_clip, functools.partial(warmup_clip, engine=self.engine) if warmup else None)
+        self.lifecycle.register("speech", self._load_speech, functools.partial(warmup_speech, engine=self.engine) if warmup else None)
+    
+    @property
+    def precision(self) -> str:
+        return self.engine.precision
     
-    def __init__(self):
-        self.clip_model = None
-        self.clip_processor = None
-        self.speech_model = None
-        self.speech_processor = None
-        self.models_loaded = False
+    def _load_clip(self) -> Tuple[CLIPModel, CLIPProcessor]:
+        return self.engine.load_clip(self.clip_model_name)
+    
+    def _load_speech(self) -> Tuple[Speech2TextForConditionalGeneration, Speech2TextProcessor]:
+        return self.engine.load_speech(self.speech_model_name)
     
     def load_models(self) -> bool:
-        """Load CLIP and Speech2Text models"""
-        try:
-            logger.info("Loading CLIP model...")
-            self.clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-            self.clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-            
-            logger.info("Loading Speech2Text model...")
-            self.speech_model = Speech2TextForConditionalGeneration.from_pretrained("facebook/s2t-medium-librispeech-asr")
-            self.speech_processor = Speech2TextProcessor.from_pretrained("facebook/s2t-medium-librispeech-asr")
-            
-            self.models_loaded = True
+        """Load CLIP and Speech2Text models, blocking until both are ready"""
+        success = self.lifecycle.load_all()
+        if success:
             logger.info("All AI models loaded successfully!")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error loading AI models: {e}")
-            return False
-    
-    def get_text_embeddings(self, texts: List[str]) -> torch.Tensor:
-        """Get text embeddings using CLIP"""
-        if not self.models_loaded:
-            raise RuntimeError("Models not loaded. Call load_models() first.")
+        return success
+    
+    def start(self, preload: List[str] = ("clip", "speech")):
+        """Load the preload models in the background; the rest load on first use"""
+        self.lifecycle.start(preload)
+    
+    def shutdown(self):
+        self.lifecycle.shutdown()
+    
+    @property
+    def models_loaded(self) -> bool:
+        return all(model.is_ready for model in self.lifecycle.models.values())
+    
+    def get_text_embeddings(self, texts: List[str], batch_size: Optional[int] = None) -> torch.Tensor:
+        """Get text embeddings using CLIP, in forward passes of at most batch_size texts"""
+        text_embeddings = []
+        with self.lifecycle.use("clip") as (clip_model, clip_processor):
+            for batch in _batches(texts, batch_size):
+                # Longer texts should be chunked first (see text_chunker); anything
+                # past the encoder's context is cut rather than failing the batch
+                with self._tokenizer_lock, stage_timer("clip_text_tokenize"):
+                    inputs = clip_processor(text=batch, return_tensors="pt", padding=True, truncation=True)
+                record_shapes("clip_text", input_ids=inputs["input_ids"])
+                with stage_timer("clip_text_forward"):
+                    text_embeddings.append(self.engine.text_features(clip_model, inputs))
+        return torch.cat(text_embeddings)
+    
+    def _locked(self, tokenizer):
+        """Wrap a tokenizer so calls from concurrent ingests are serialized"""
+        def tokenize(*args, **kwargs):
+            with self._tokenizer_lock:
+                return tokenizer(*args, **kwargs)
+        return tokenize
+    
+    def text_chunker(self, window_tokens: int = 75, overlap_tokens: int = 16) -> TextChunker:
+        """A streaming chunker using CLIP's tokenizer, loading CLIP if needed"""
+        with self.lifecycle.use("clip") as (_, clip_processor):
+            return TextChunker(self._locked(clip_processor.tokenizer), window_tokens, overlap_tokens)
+    
+    def chunk_texts(self, texts: List[str], window_tokens: int = 75, overlap_tokens: int = 16) -> List[List[TextWindow]]:
+        """Split in-memory texts into overlapping CLIP token windows"""
+        with self.lifecycle.use("clip") as (_, clip_processor):
+            return [chunk_text(text, self._locked(clip_processor.tokenizer), window_tokens, overlap_tokens) for text in texts]
+    
+    def get_cached_query_embedding(self, query: str) -> Optional[torch.Tensor]:
+        """Return the cached embedding for a query, or None on a miss"""
+        return self.query_cache.get(self.clip_model_name, query)
+    
+    def get_query_embeddings(self, queries: List[str]) -> torch.Tensor:
+        """Get query embeddings, running the text encoder only for uncached queries
+        
+        Lookups here do not touch the hit/miss counters; callers record those
+        through get_cached_query_embedding before falling back to this method.
+        """
+        normalized = [EmbeddingCache.normalize_text(query) for query in queries]
+        found = {}
+        for text in dict.fromkeys(normalized):
+            embedding = self.query_cache.get(self.clip_model_name, text, record=False)
+            if embedding is not None:
+                found[text] = embedding
         
-        inputs = self.clip_processor(text=texts, return_tensors="pt", padding=True)
-        with torch.no_grad():
-            text_embeddings = self.clip_model.get_text_features(**inputs)
-        return text_embeddings
-    
-    def get_image_embeddings(self, images: List[Image.Image]) -> torch.Tensor:
-        """Get image embeddings using CLIP"""
-        if not self.models_loaded:
-            raise RuntimeError("Models not loaded. Call load_models() first.")
+        misses = [text for text in dict.fromkeys(normalized) if text not in found]
+        if misses:
+            for text, embedding in zip(misses, self.get_text_embeddings(misses)):
+                found[text] = embedding
+                self.query_cache.put(self.clip_model_name, text, embedding)
         
-        inputs = self.clip_processor(images=images, return_tensors="pt")
-        with torch.no_grad():
-            image_embeddings = self.clip_model.get_image_features(**inputs)
-        return image_embeddings
+        return torch.stack([found[text] for text in normalized])
+    
+    def get_image_embeddings(self, images: List[Image.Image], batch_size: Optional[int] = None) -> torch.Tensor:
+        """Get image embeddings using CLIP, in forward passes of at most batch_size images"""
+        image_embeddings = []
+        with self.lifecycle.use("clip") as (clip_model, clip_processor):
+            for batch in _batches(images, batch_size):
+                with stage_timer("clip_image_preprocess"):
+                    inputs = clip_processor(images=batch, return_tensors="pt")
+                record_shapes("clip_image", pixel_values=inputs["pixel_values"])
+                with stage_timer("clip_image_forward"):
+                    image_embeddings.append(self.engine.image_features(clip_model, inputs))
+        return torch.cat(image_embeddings)
     
     def transcribe_audio(self, audio_waveform: np.ndarray, sampling_rate: int = 16000) -> str:
-        """Transcribe audio using Speech2Text model"""
-        if not self.models_loaded:
-            raise RuntimeError("Models not loaded. Call load_models() first.")
-        
-        inputs = self.speech_processor(audio_waveform, sampling_rate=sampling_rate, return_tensors="pt")
-        with torch.no_grad():
-            generated_ids = self.speech_model.generate(
-                inputs["input_features"], 
-                attention_mask=inputs["attention_mask"]
-            )
-        
-        transcription = self.speech_processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-        return transcription
+        """Transcribe audio using Speech2Text model, window by window for long recordings"""
+        return " ".join(text for _, _, text in self.transcribe_segments(audio_waveform, sampling_rate) if text)
+    
+    def transcribe_segments(self, audio_waveform: np.ndarray, sampling_rate: int = 16000, window_seconds: float = 20.0,
+                            overlap_seconds: float = 2.0, batch_size: int = 4) -> List[Tuple[float, float, str]]:
+        """Transcribe overlapping windows of a waveform in batches, returning (start, end, text) per window"""
+        windows = split_waveform(audio_waveform, sampling_rate, window_seconds, overlap_seconds)
+        texts = []
+        for batch in _batches(windows, batch_size):
+            texts.extend(self.transcribe_audio_batch([window.samples for window in batch], sampling_rate))
+        return [(window.start, window.end, text) for window, text in zip(windows, texts)]
+    
+    def transcribe_audio_batch(self, audio_waveforms: List[np.ndarray], sampling_rate: int = 16000) -> List[str]:
+        """Transcribe several waveforms with one padded Speech2Text generate call"""
+        with self.lifecycle.use("speech") as (speech_model, speech_processor):
+            with stage_timer("speech_features"):
+                inputs = speech_processor(audio_waveforms, sampling_rate=sampling_rate, return_tensors="pt", padding=True)
+            with stage_timer("speech_generate"):
+                generated_ids = self.engine.generate(speech_model, inputs)
+            record_shapes("speech", input_features=inputs["input_features"], generated_ids=generated_ids)
+            
+            with stage_timer("speech_detokenize"):
+                return speech_processor.batch_decode(generated_ids, skip_special_tokens=True)
     
     def get_unified_embeddings(self, texts: List[str] = None, images: List[Image.Image] = None) -> Tuple[Optional[torch.Tensor], Optional[torch.Tensor]]:
         """Get unified embeddings for texts and images"""
@@ -94,7 +222,24 @@ class AIModelsManager:
     def is_ready(self) -> bool:
         """Check if models are loaded and ready"""
         return self.models_loaded
+    
+    def modality_readiness(self) -> Dict[str, bool]:
+        """Whether every model needed to ingest each modality is loaded"""
+        return {
+            modality: all(self.lifecycle.is_ready(name) for name in names)
+            for modality, names in MODALITY_MODELS.items()
+        }
+    
+    def model_status(self) -> Dict[str, Dict[str, Any]]:
+        """Lifecycle state of each managed model"""
+        return self.lifecycle.status()
 
 # Global instance
-ai_models = AIModelsManager()
+ai_models = AIModelsManager(
+    query_cache_entries=config.QUERY_CACHE_ENTRIES,
+    query_cache_bytes=config.QUERY_CACHE_MB * 1024 * 1024,
+    idle_ttl=config.MODEL_IDLE_TTL_S,
+    warmup=config.MODEL_WARMUP,
+    engine=engine
+)
 
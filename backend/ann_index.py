@@ -0,0 +1,262 @@
+"""
+Approximate Nearest Neighbour Module
+IVF-flat index trained by spherical k-means over the rows of a VectorIndex
+"""
+
+import os
+import math
+import numpy as np
+import torch
+import torch.nn.functional as F
+from typing import Dict, List, Optional, Tuple, Type
+import logging
+from vector_index import VectorIndex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ASSIGN_CHUNK_ROWS = 65536
+
+def spherical_kmeans(data: torch.Tensor, k: int, iterations: int = 20, seed: int = 0) -> torch.Tensor:
+    """Cluster L2-normalized rows by cosine similarity and return normalized centroids"""
+    generator = torch.Generator().manual_seed(seed)
+    centroids = data[torch.randperm(data.shape[0], generator=generator)[:k]].clone()
+
+    for _ in range(iterations):
+        assignments = assign_to_centroids(data, centroids)
+        sums = torch.zeros_like(centroids).index_add_(0, assignments, data)
+        counts = torch.bincount(assignments, minlength=k)
+
+        # Re-seed empty clusters with random points so every list gets used
+        empty = (counts == 0).nonzero().flatten()
+        if len(empty):
+            sums[empty] = data[torch.randint(data.shape[0], (len(empty),), generator=generator)]
+
+        centroids = F.normalize(sums, dim=-1)
+
+    return centroids
+
+def assign_to_centroids(data: torch.Tensor, centroids: torch.Tensor) -> torch.Tensor:
+    """Index of the most similar centroid for every row, computed in bounded chunks"""
+    assignments = torch.empty(data.shape[0], dtype=torch.long)
+    for start in range(0, data.shape[0], ASSIGN_CHUNK_ROWS):
+        chunk = data[start:start + ASSIGN_CHUNK_ROWS].to(torch.float32)
+        assignments[start:start + ASSIGN_CHUNK_ROWS] = (chunk @ centroids.T).argmax(dim=1)
+    return assignments
+
+class InvertedList:
+    """Growable array of one cluster's row positions"""
+
+    def __init__(self, capacity: int = 16):
+        self._positions = np.empty(capacity, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._positions[:self._size]
+
+    def extend(self, positions: np.ndarray):
+        count = len(positions)
+        if self._size + count > len(self._positions):
+            self._positions = np.resize(self._positions, max(16, self._size + count, 2 * self._size))
+        self._positions[self._size:self._size + count] = positions
+        self._size += count
+
+class IVFFlatIndex:
+    """Inverted-file index: only the nprobe closest clusters are scored exactly
+
+    Inverted lists hold row positions only; a probe gathers its rows from the
+    vector index, so a memory-mapped embedding file stays the single copy of
+    the vectors (shared by every process mapping it) and the lists cost
+    8 bytes per row.
+
+    Until the corpus reaches train_threshold rows, searches fall back to exact
+    scoring; the index trains itself once the threshold is crossed and retrains
+    when the corpus has grown by retrain_growth since the last training.
+    """
+
+    STATE_FILE = "ivf_index.npz"
+
+    def __init__(self, vector_index: VectorIndex, nlist: Optional[int] = None, nprobe: int = 16,
+                 train_threshold: int = 10000, retrain_growth: float = 8.0, kmeans_iterations: int = 20,
+                 max_training_points: int = 256):
+        self.vector_index = vector_index
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.retrain_growth = retrain_growth
+        self.kmeans_iterations = kmeans_iterations
+        self.max_training_points = max_training_points
+
+        self.centroids = None
+        self.trained_size = 0
+        self._lists: List[InvertedList] = []
+        self._assignments = np.empty(0, dtype=np.int32)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def bytes_per_vector(self) -> int:
+        """Bytes held in memory per row: list position and assignment, plus the float row if the vector index keeps rows in RAM"""
+        float_bytes = self.vector_index.dim * self.vector_index.matrix.element_size() if self.vector_index.in_memory else 0
+        return np.dtype(np.int64).itemsize + self._assignments.itemsize + float_bytes
+
+    def train(self):
+        """Run k-means over (a sample of) the stored rows and rebuild every inverted list"""
+        size = len(self.vector_index)
+        if size == 0:
+            return
+
+        nlist = min(self.nlist or max(1, int(math.sqrt(size))), size)
+        matrix = self.vector_index.matrix
+        sample_size = min(size, nlist * self.max_training_points)
+        sample = torch.randperm(size)[:sample_size]
+        self.centroids = spherical_kmeans(matrix[sample].to(torch.float32), nlist, self.kmeans_iterations)
+        self.trained_size = size
+
+        self._rebuild(assign_to_centroids(matrix, self.centroids).numpy().astype(np.int32))
+        logger.info(f"Trained IVF index: {size} vectors in {nlist} lists")
+
+    def _rebuild(self, assignments: np.ndarray):
+        """Recreate inverted lists from a position -> list assignment array"""
+        nlist = self.centroids.shape[0]
+        size = len(assignments)
+        self._assignments = np.resize(assignments, max(16, size))
+        self._lists = []
+
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        for list_id in range(nlist):
+            members = order[bounds[list_id]:bounds[list_id + 1]]
+            inverted = InvertedList(max(16, len(members)))
+            inverted.extend(members)
+            self._lists.append(inverted)
+
+    def _ensure_capacity(self, required: int):
+        if required > len(self._assignments):
+            capacity = max(required, 2 * len(self._assignments))
+            self._assignments = np.resize(self._assignments, capacity)
+
+    def add(self, positions: List[int]):
+        """Insert rows that were just appended to the vector index"""
+        size = len(self.vector_index)
+        if not self.is_trained:
+            if size >= self.train_threshold:
+                self.train()
+            return
+        if size >= self.trained_size * self.retrain_growth:
+            self.train()
+            return
+
+        rows = self.vector_index.matrix[positions]
+        list_ids = assign_to_centroids(rows, self.centroids).tolist()
+        self._ensure_capacity(max(positions) + 1)
+        for position, list_id in zip(positions, list_ids):
+            self._assignments[position] = list_id
+            self._lists[list_id].extend(np.array([position]))
+
+    def compact(self, keep: np.ndarray):
+        """Renumber the lists after the vector index kept only the rows in keep"""
+        if not self.is_trained:
+            return
+        self._rebuild(self._assignments[keep])
+
+    def search(self, query_embedding: torch.Tensor, top_k: int = 3, nprobe: Optional[int] = None,
+               exclude: Optional[torch.Tensor] = None,
+               candidates: Optional[torch.Tensor] = None) -> Tuple[List[int], List[float]]:
+        """Score only rows in the nprobe clusters closest to the query, skipping rows masked by exclude
+
+        With candidates (positions passing a filter), rows outside them are
+        dropped from each probed list before it is scored.
+        """
+        if not self.is_trained:
+            return self.vector_index.search(query_embedding, top_k=top_k, exclude=exclude, candidates=candidates)
+        if top_k <= 0:
+            return [], []
+
+        nprobe = min(nprobe or self.nprobe, len(self._lists))
+        if candidates is not None and len(candidates) <= len(self.vector_index) * nprobe / len(self._lists):
+            # A selective filter leaves fewer rows than the probes would score: score them all, exactly
+            return self.vector_index.search(query_embedding, top_k=top_k, candidates=candidates)
+
+        query = VectorIndex.normalize(query_embedding.reshape(-1))
+        probes = torch.topk(self.centroids @ query, nprobe).indices.tolist()
+        probed = [self._lists[list_id] for list_id in probes if len(self._lists[list_id])]
+        if not probed:
+            return [], []
+
+        if candidates is not None:
+            allowed = np.zeros(len(self.vector_index), dtype=bool)
+            allowed[candidates.numpy()] = True
+            positions = np.concatenate([inverted.positions[allowed[inverted.positions]] for inverted in probed])
+        else:
+            positions = np.concatenate([inverted.positions for inverted in probed])
+        scores = self.vector_index.candidate_scores(query_embedding, torch.from_numpy(positions))
+        available = len(positions)
+        if exclude is not None and candidates is None:
+            excluded = exclude[torch.from_numpy(positions)]
+            scores[excluded] = float("-inf")
+            available -= int(excluded.sum())
+        if available <= 0:
+            return [], []
+        top = torch.topk(scores, min(top_k, available))
+        return positions[top.indices.numpy()].tolist(), top.values.tolist()
+
+    def save(self, directory: str):
+        """Persist centroids and list assignments next to the embedding file"""
+        if not self.is_trained:
+            return
+        size = len(self.vector_index)
+        tmp_path = os.path.join(directory, "ivf_index.tmp.npz")
+        np.savez(tmp_path, centroids=self.centroids.numpy(), assignments=self._assignments[:size],
+                 trained_size=self.trained_size)
+        os.replace(tmp_path, os.path.join(directory, self.STATE_FILE))
+
+    def discard(self, directory: str):
+        """Remove a saved index that no longer matches the store"""
+        path = os.path.join(directory, self.STATE_FILE)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def load(self, directory: str) -> bool:
+        """Restore a saved index and bring it up to the current corpus
+
+        Positions are stable between compactions (which save the index), so
+        a state saved at another row count still holds for the rows both
+        have: assignments past the corpus are dropped and rows appended
+        since the save are assigned as if just added.
+        """
+        path = os.path.join(directory, self.STATE_FILE)
+        if not os.path.exists(path):
+            return False
+
+        state = np.load(path)
+        size = len(self.vector_index)
+        assignments = state["assignments"][:size]
+        self.centroids = torch.from_numpy(state["centroids"])
+        self.trained_size = int(state["trained_size"])
+        self._rebuild(assignments)
+        if len(assignments) < size:
+            self.add(list(range(len(assignments), size)))
+        return True
+
+# Imported here because the quantized indexes are registered alongside IVF
+from quantization import ScalarQuantizedIndex, ProductQuantizedIndex
+
+ANN_INDEXES: Dict[str, Type] = {
+    "ivf": IVFFlatIndex,
+    "sq8": ScalarQuantizedIndex,
+    "pq": ProductQuantizedIndex,
+}
+
+def create_ann_index(kind: str, vector_index: VectorIndex, **params):
+    """Build the ANN index registered under kind"""
+    if kind not in ANN_INDEXES:
+        raise ValueError(f"Unknown ANN index '{kind}'. Available: {', '.join(ANN_INDEXES)}")
+    return ANN_INDEXES[kind](vector_index, **params)
@@ -0,0 +1,125 @@
+"""
+Audio Stream Module
+Decodes audio in bounded blocks and cuts it into overlapping transcription windows
+"""
+
+import shutil
+import subprocess
+import numpy as np
+from typing import Iterator, List, NamedTuple
+from metrics import stage_timer
+from profiling import record_shapes
+
+class AudioWindow(NamedTuple):
+    """One segment of a recording: its index, start/end in seconds and samples"""
+    index: int
+    start: float
+    end: float
+    samples: np.ndarray
+
+def iter_pcm_blocks(path: str, sampling_rate: int = 16000, block_seconds: float = 10.0) -> Iterator[np.ndarray]:
+    """Decode an audio file to mono float32 samples at sampling_rate, block by block
+
+    With ffmpeg on the PATH the file is decoded by a subprocess and read from
+    its stdout, so memory stays bounded by one block. Without it pydub can
+    still read WAV files, but decodes the whole file at once.
+    """
+    block_samples = max(1, int(block_seconds * sampling_rate))
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        from pydub import AudioSegment
+
+        with stage_timer("audio_decode"):
+            segment = AudioSegment.from_file(path)
+        with stage_timer("audio_resample"):
+            segment = segment.set_frame_rate(sampling_rate).set_channels(1)
+            scale = float(1 << (8 * segment.sample_width - 1))
+            samples = np.array(segment.get_array_of_samples(), dtype=np.float32) / scale
+        record_shapes("audio_decode", samples=len(samples), sampling_rate=sampling_rate)
+        for start in range(0, len(samples), block_samples):
+            yield samples[start:start + block_samples]
+        return
+
+    process = subprocess.Popen(
+        [ffmpeg, "-nostdin", "-loglevel", "error", "-i", path,
+         "-f", "f32le", "-ac", "1", "-ar", str(sampling_rate), "pipe:1"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    finished = False
+    decoded = 0
+    try:
+        while True:
+            # ffmpeg decodes and resamples in one pass
+            with stage_timer("audio_decode"):
+                data = process.stdout.read(block_samples * 4)
+            if not data:
+                break
+            decoded += len(data) // 4
+            yield np.frombuffer(data, dtype=np.float32)
+        finished = True
+        record_shapes("audio_decode", samples=decoded, sampling_rate=sampling_rate)
+    finally:
+        if not finished:
+            # The consumer stopped early or failed; do not wait for the rest of the file
+            process.kill()
+        process.stdout.close()
+        error = process.stderr.read().decode("utf-8", "replace").strip()
+        process.stderr.close()
+        process.wait()
+
+    if process.returncode:
+        raise RuntimeError(f"Could not decode audio: {error or f'ffmpeg exited with {process.returncode}'}")
+
+class AudioWindower:
+    """Incrementally cuts a sample stream into windows of window_seconds that
+    overlap by overlap_seconds, so words at a boundary appear whole in one window.
+
+    Only the samples of the window in progress are buffered.
+    """
+
+    def __init__(self, sampling_rate: int = 16000, window_seconds: float = 20.0, overlap_seconds: float = 2.0):
+        if not 0 <= overlap_seconds < window_seconds:
+            raise ValueError("overlap_seconds must be smaller than window_seconds")
+        self.sampling_rate = sampling_rate
+        self.window_samples = int(window_seconds * sampling_rate)
+        self.overlap_samples = int(overlap_seconds * sampling_rate)
+
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._buffer_start = 0  # absolute sample offset of _buffer
+        self._emitted = 0
+
+    def _window(self, count: int) -> AudioWindow:
+        start = self._buffer_start
+        window = AudioWindow(
+            self._emitted,
+            start / self.sampling_rate,
+            (start + count) / self.sampling_rate,
+            self._buffer[:count].copy()
+        )
+        self._emitted += 1
+        return window
+
+    def feed(self, samples: np.ndarray) -> List[AudioWindow]:
+        """Add decoded samples and return the windows they complete"""
+        self._buffer = np.concatenate([self._buffer, samples.astype(np.float32, copy=False)])
+        windows = []
+        step = self.window_samples - self.overlap_samples
+        while len(self._buffer) >= self.window_samples:
+            windows.append(self._window(self.window_samples))
+            self._buffer = self._buffer[step:]
+            self._buffer_start += step
+        return windows
+
+    def finish(self) -> List[AudioWindow]:
+        """Return the final, shorter window if any samples are not yet covered"""
+        uncovered = len(self._buffer) - (self.overlap_samples if self._emitted else 0)
+        windows = [self._window(len(self._buffer))] if uncovered > 0 else []
+        self._buffer = np.zeros(0, dtype=np.float32)
+        return windows
+
+def split_waveform(waveform: np.ndarray, sampling_rate: int = 16000, window_seconds: float = 20.0,
+                   overlap_seconds: float = 2.0) -> List[AudioWindow]:
+    """Cut an in-memory waveform into overlapping windows"""
+    windower = AudioWindower(sampling_rate, window_seconds, overlap_seconds)
+    return windower.feed(waveform) + windower.finish()
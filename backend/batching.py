@@ -0,0 +1,111 @@
+"""
+Dynamic Batching Module
+Coalesces concurrent requests into batched model calls
+"""
+
+import asyncio
+import time
+from collections import Counter, deque
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class DynamicBatcher:
+    """Collects submitted items for up to max_wait_ms (or max_batch_size items)
+    and runs batch_fn once over all of them, handing each caller its own row.
+
+    batch_fn takes a list of items and returns a sequence with one result per
+    item. It runs inline on the event loop unless an executor is given.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Sequence[Any]], max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, executor: Optional[Executor] = None, history: int = 1000):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self.executor = executor
+
+        self._pending = []
+        self._timer = None
+        # The loop only keeps weak references to tasks; in-flight batches are held here
+        self._running = set()
+
+        self.requests_total = 0
+        self.batches_total = 0
+        self.batch_size_counts = Counter()
+        self._recent_waits_ms = deque(maxlen=history)
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result from the next batch"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+        self.requests_total += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Start a batch with everything queued so far (up to max_batch_size)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch = self._pending[:self.max_batch_size]
+        self._pending = self._pending[self.max_batch_size:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait_ms / 1000, self._flush)
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: list):
+        started = time.perf_counter()
+        self.batches_total += 1
+        self.batch_size_counts[len(batch)] += 1
+        self._recent_waits_ms.extend((started - queued) * 1000 for _, _, queued in batch)
+
+        items = [item for item, _, _ in batch]
+        try:
+            if self.executor is None:
+                results = self.batch_fn(items)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(self.executor, self.batch_fn, items)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch-size and queue-wait metrics"""
+        waits = np.array(self._recent_waits_ms) if self._recent_waits_ms else np.zeros(1)
+        batched_requests = sum(size * count for size, count in self.batch_size_counts.items())
+        return {
+            "requests_total": self.requests_total,
+            "batches_total": self.batches_total,
+            "pending": len(self._pending),
+            "mean_batch_size": round(batched_requests / self.batches_total, 2) if self.batches_total else 0.0,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "queue_wait_ms": {
+                "mean": round(float(waits.mean()), 3),
+                "p50": round(float(np.percentile(waits, 50)), 3),
+                "p99": round(float(np.percentile(waits, 99)), 3),
+            },
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+        }
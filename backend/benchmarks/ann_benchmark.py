@@ -0,0 +1,143 @@
+"""
+ANN Benchmark
+Reports recall@k against exact search, p50/p99 query latency, bytes held in memory per
+vector and bytes on disk per vector for IVF-flat and quantized (sq8 / pq) indexes on
+synthetic vectors
+
+The corpus is a memory-mapped embedding file, as in the document store. IVF keeps
+only row positions in its lists and gathers the probed rows from the file; quantized
+indexes keep only their codes in memory and read the float rows of the re-ranked
+shortlist back from the file, so re-ranked latencies include those reads.
+
+Usage:
+    python backend/benchmarks/ann_benchmark.py --sizes 10000 100000 1000000 --nprobe 4 16 64
+    python backend/benchmarks/ann_benchmark.py --sizes 100000 --pq-m 32 64 --rerank 0 4
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+import tempfile
+import numpy as np
+import torch
+from vector_index import MemmapVectorIndex, VectorIndex
+from ann_index import IVFFlatIndex
+from quantization import ScalarQuantizedIndex, ProductQuantizedIndex
+
+def synthetic_vectors(count: int, dim: int, clusters: int = 1024, seed: int = 0) -> torch.Tensor:
+    """Gaussian blobs around fixed random directions, roughly mimicking clustered CLIP embeddings
+
+    Cluster centers depend only on (clusters, dim), so corpus chunks and queries
+    drawn with different seeds share the same structure.
+    """
+    centers = torch.randn(clusters, dim, generator=torch.Generator().manual_seed(clusters * dim))
+    generator = torch.Generator().manual_seed(seed)
+    labels = torch.randint(clusters, (count,), generator=generator)
+    return centers[labels] + torch.randn(count, dim, generator=generator)
+
+def build_index(size: int, dim: int, chunk: int = 100000) -> VectorIndex:
+    path = os.path.join(tempfile.mkdtemp(prefix="ann-benchmark-"), "embeddings.float32")
+    index = MemmapVectorIndex(path, dim=dim, initial_capacity=size)
+    for start in range(0, size, chunk):
+        index.add(synthetic_vectors(min(chunk, size - start), dim, seed=start + 1))
+    return index
+
+def time_queries(search, queries: torch.Tensor, top_k: int):
+    """Run every query once; return result positions and per-query latency in ms"""
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        positions, _ = search(query, top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(positions)
+    return results, np.array(latencies)
+
+def recall_at_k(results, ground_truth) -> float:
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(results, ground_truth))
+    return hits / sum(len(expected) for expected in ground_truth)
+
+def summarize(name: str, latencies: np.ndarray, recall: float, memory_bytes: int, disk_bytes: int) -> dict:
+    return {
+        "index": name,
+        "recall": round(recall, 4),
+        "memory_bytes_per_vector": memory_bytes,
+        "disk_bytes_per_vector": disk_bytes,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+def run(size: int, dim: int, num_queries: int, top_k: int, nprobes, nlist=None, pq_ms=(64,), reranks=(0, 4)) -> list:
+    print(f"\n📦 Building {size} x {dim} corpus...")
+    index = build_index(size, dim)
+    queries = synthetic_vectors(num_queries, dim, seed=size)
+
+    exact_results, exact_latencies = time_queries(
+        lambda q, k: index.search(q, top_k=k), queries, top_k
+    )
+    float_bytes = dim * index.matrix.element_size()
+    rows = [summarize("exact", exact_latencies, 1.0, float_bytes, float_bytes)]
+
+    start = time.perf_counter()
+    ivf = IVFFlatIndex(index, nlist=nlist, train_threshold=0)
+    ivf.train()
+    print(f"   IVF training: {time.perf_counter() - start:.1f}s ({ivf.centroids.shape[0]} lists)")
+
+    # The inverted lists hold positions; probed rows are read from the mapped corpus
+    for nprobe in nprobes:
+        results, latencies = time_queries(
+            lambda q, k: ivf.search(q, top_k=k, nprobe=nprobe), queries, top_k
+        )
+        rows.append(summarize(f"ivf nprobe={nprobe}", latencies, recall_at_k(results, exact_results),
+                                  ivf.bytes_per_vector, float_bytes))
+
+    quantized = [ScalarQuantizedIndex(index, train_threshold=0)]
+    quantized += [ProductQuantizedIndex(index, m=m, train_threshold=0) for m in pq_ms]
+    for codec in quantized:
+        start = time.perf_counter()
+        codec.train()
+        name = codec.quantizer.name + (f" m={codec.quantizer.m}" if codec.quantizer.name == "pq" else "")
+        print(f"   {name} training: {time.perf_counter() - start:.1f}s ({float_bytes // codec.code_bytes}x smaller than float rows)")
+
+        for rerank in reranks:
+            results, latencies = time_queries(
+                lambda q, k: codec.search(q, top_k=k, rerank_factor=rerank), queries, top_k
+            )
+            rows.append(summarize(f"{name} rerank={rerank}", latencies, recall_at_k(results, exact_results),
+                                  codec.bytes_per_vector, float_bytes + codec.code_bytes))
+
+    for row in rows:
+        row["size"] = size
+        print(f"   {row['index']:<18} recall@{top_k}={row['recall']:.3f}  p50={row['p50_ms']:.2f}ms  "
+              f"p99={row['p99_ms']:.2f}ms  {row['memory_bytes_per_vector']}B in memory, {row['disk_bytes_per_vector']}B on disk/vector")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--pq-m", type=int, nargs="+", default=[64], help="PQ sub-vector counts to try")
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 4], help="Exact re-rank factors for quantized indexes")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    print("🚀 ANN recall/latency benchmark")
+    print("=" * 50)
+    results = []
+    for size in args.sizes:
+        results.extend(run(size, args.dim, args.queries, args.top_k, args.nprobe, args.nlist, args.pq_m, args.rerank))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
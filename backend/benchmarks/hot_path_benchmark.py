@@ -0,0 +1,236 @@
+"""
+Hot Path Benchmark
+Offline ingest and query benchmark on stub models: embedding throughput per modality,
+upload latency, /query latency percentiles and memory at several corpus sizes
+
+Usage:
+    python backend/benchmarks/hot_path_benchmark.py --sizes 1000 10000 --output hot_path.json
+    python backend/benchmarks/hot_path_benchmark.py --output current.json --baseline hot_path.json --tolerance 0.25
+
+Tiny randomly initialized CLIP and Speech2Text checkpoints (see stub_models)
+replace the real models, so nothing is downloaded. The numbers track the
+code around the models (preprocessing, batching, storage, search, HTTP),
+not model quality. The API runs in process against a fresh data directory;
+corpora are filled with synthetic rows up to each size.
+
+With --baseline every metric is compared against an earlier --output file,
+and the process exits with status 1 when one is worse by more than the
+tolerance (a fraction: throughput lower, or latency / memory higher).
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import io
+import json
+import logging
+import resource
+import tempfile
+import time
+import wave
+import numpy as np
+import torch
+from PIL import Image
+from stub_models import build_stub_models
+
+WORDS = ("invoice order shipment meeting report battery recipe train platform mountain lake sunset "
+         "contract budget review network server latency cache index vector query upload audio image").split()
+
+def percentiles(samples_ms: list) -> dict:
+    return {f"p{q}_ms": round(float(np.percentile(samples_ms, q)), 3) for q in (50, 95, 99)}
+
+def rss_mb() -> float:
+    """Current resident set size, falling back to the peak where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def random_text(rng: np.random.Generator, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS, words))
+
+def random_png(rng: np.random.Generator) -> bytes:
+    buffer = io.BytesIO()
+    Image.fromarray((rng.random((64, 64, 3)) * 255).astype("uint8")).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def random_wav(rng: np.random.Generator, seconds: float = 2.0) -> bytes:
+    t = np.arange(int(16000 * seconds)) / 16000
+    samples = 0.3 * np.sin(2 * np.pi * rng.uniform(150, 900) * t) + 0.01 * rng.standard_normal(len(t))
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes((samples * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+def load_api(data_dir: str, clip_path: str, speech_path: str, embedding_dim: int):
+    """Import the API against data_dir and the stub models; config is read at import, so env is set first"""
+    os.environ["RAG_DATA_DIR"] = data_dir
+    os.environ["RAG_EMBEDDING_DIM"] = str(embedding_dim)
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    from ai_models import ai_models
+    ai_models.clip_model_name, ai_models.speech_model_name = clip_path, speech_path
+    import api_endpoints
+    from fastapi.testclient import TestClient
+    # Per-request INFO logging would dominate the latencies
+    logging.disable(logging.INFO)
+    return api_endpoints, TestClient(api_endpoints.app)
+
+def bench_embeddings(models, rng: np.random.Generator, items: int, batch_size: int) -> dict:
+    """items / s through the text and image encoders and the transcriber, after one warm-up pass"""
+    texts = [random_text(rng, 40) for _ in range(items)]
+    images = [Image.open(io.BytesIO(random_png(rng))).convert("RGB") for _ in range(items)]
+    recordings = []
+    for _ in range(max(1, items // 8)):
+        with wave.open(io.BytesIO(random_wav(rng)), "rb") as f:
+            recordings.append(np.frombuffer(f.readframes(f.getnframes()), dtype="<i2").astype(np.float32) / 32768.0)
+
+    metrics = {}
+    tasks = {
+        "text": (lambda: models.get_text_embeddings(texts, batch_size), len(texts)),
+        "image": (lambda: models.get_image_embeddings(images, batch_size), len(images)),
+        "audio": (lambda: models.transcribe_audio_batch(recordings), len(recordings)),
+    }
+    for name, (run, count) in tasks.items():
+        run()
+        start = time.perf_counter()
+        run()
+        metrics[f"embed.{name}.items_per_s"] = round(count / (time.perf_counter() - start), 2)
+    return metrics
+
+def bench_uploads(client, rng: np.random.Generator, uploads: int) -> dict:
+    """Latency of single foreground uploads per modality (unique payloads, so dedup never short-circuits)"""
+    payloads = {
+        "text": lambda i: (f"bench_{i}.txt", f"{i} {random_text(rng, 60)}".encode(), "text/plain"),
+        "image": lambda i: (f"bench_{i}.png", random_png(rng), "image/png"),
+        "audio": lambda i: (f"bench_{i}.wav", random_wav(rng), "audio/wav"),
+    }
+    metrics = {}
+    for modality, payload in payloads.items():
+        latencies = []
+        for i in range(uploads + 1):
+            file = payload(i)
+            start = time.perf_counter()
+            response = client.post(f"/upload/{modality}", files={"file": file})
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                raise RuntimeError(f"/upload/{modality} returned {response.status_code}: {response.text}")
+            if i:  # the first upload loads the model
+                latencies.append(elapsed)
+        metrics.update({f"upload.{modality}.{key}": value for key, value in percentiles(latencies).items()})
+    return metrics
+
+def fill_corpus(store, size: int, dim: int, rng: np.random.Generator, chunk: int = 4096):
+    """Add synthetic text rows until the store holds size rows"""
+    while len(store) < size:
+        count = min(chunk, size - len(store))
+        vectors = torch.from_numpy(rng.standard_normal((count, dim)).astype(np.float32))
+        records = [{"id": store.allocate_id("text"), "content": random_text(rng), "modality": "text",
+                    "filename": "synthetic.txt", "uploaded_at": time.time()} for _ in range(count)]
+        store.add_many(records, vectors)
+
+def bench_queries(client, rng: np.random.Generator, queries: int, modes) -> dict:
+    """/query latency per mode; each query is distinct so the query-embedding cache never hits"""
+    metrics = {}
+    for mode in modes:
+        latencies = []
+        for i in range(queries):
+            start = time.perf_counter()
+            response = client.post("/query", json={"query": f"{random_text(rng, 3)} {mode} {i}", "mode": mode})
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f"/query returned {response.status_code}: {response.text}")
+        metrics.update({f"{mode}.{key}": value for key, value in percentiles(latencies).items()})
+    return metrics
+
+def run(args) -> dict:
+    rng = np.random.default_rng(args.seed)
+    models_dir = args.models_dir or tempfile.mkdtemp(prefix="stub-models-")
+    clip_path, speech_path = build_stub_models(models_dir, args.embedding_dim)
+    api, client = load_api(args.data_dir or tempfile.mkdtemp(prefix="hot-path-"), clip_path, speech_path, args.embedding_dim)
+
+    metrics = {"memory.baseline_rss_mb": round(rss_mb(), 1)}
+    print("   Embedding throughput...")
+    metrics.update(bench_embeddings(api.ai_models, rng, args.embed_items, args.batch_size))
+    print("   Upload latency...")
+    metrics.update(bench_uploads(client, rng, args.uploads))
+    metrics["memory.models_rss_mb"] = round(rss_mb(), 1)
+
+    for size in sorted(args.sizes):
+        print(f"   Corpus of {size} rows...")
+        fill_corpus(api.document_store, size, args.embedding_dim, rng)
+        query_metrics = bench_queries(client, rng, args.queries, args.modes)
+        metrics.update({f"query.n{size}.{key}": value for key, value in query_metrics.items()})
+        metrics[f"memory.n{size}.rss_mb"] = round(rss_mb(), 1)
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "torch": torch.__version__,
+        "metrics": metrics,
+    }
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list:
+    """(metric, baseline, current, relative change, regressed) for every metric present in both runs"""
+    rows = []
+    for metric, value in current["metrics"].items():
+        base = baseline["metrics"].get(metric)
+        if base is None or base == 0:
+            continue
+        change = (value - base) / base
+        regressed = change < -tolerance if higher_is_better(metric) else change > tolerance
+        rows.append((metric, base, value, change, regressed))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="Corpus sizes (rows) to query")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per corpus size and mode")
+    parser.add_argument("--modes", nargs="+", default=["vector", "lexical", "hybrid"], choices=["vector", "lexical", "hybrid"])
+    parser.add_argument("--uploads", type=int, default=20, help="Uploads per modality")
+    parser.add_argument("--embed-items", type=int, default=64, help="Texts and images per throughput run (audio: 1/8)")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--embedding-dim", type=int, default=64, help="Projection size of the stub CLIP")
+    parser.add_argument("--models-dir", help="Where to write (or reuse) the stub checkpoints (default: a temp dir)")
+    parser.add_argument("--data-dir", help="API data directory (default: a fresh temp dir)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression per metric")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    print("🚀 Hot path benchmark (stub models)")
+    print("=" * 50)
+    results = run(args)
+    for metric, value in results["metrics"].items():
+        print(f"   {metric:<40} {value}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\n📊 Compared with {args.baseline} (tolerance {args.tolerance:.0%})")
+        for metric, base, value, change, regressed in compare(baseline, results, args.tolerance):
+            print(f"   {'❌' if regressed else '  '} {metric:<40} {base:>10} -> {value:<10} ({change:+.1%})")
+            if regressed:
+                regressions.append(metric)
+        print(f"\n{len(regressions)} regressions" if regressions else "\n✅ No regressions")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
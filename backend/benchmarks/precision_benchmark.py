@@ -0,0 +1,169 @@
+"""
+Precision Benchmark
+Compares int8 / bf16 inference against fp32 on a fixed local sample set: embedding
+cosine drift for CLIP, transcript WER drift for Speech2Text, and throughput
+
+Usage:
+    python backend/benchmarks/precision_benchmark.py --precisions int8 bf16
+    python backend/benchmarks/precision_benchmark.py --samples ./samples --output precision.json \
+        --max-cosine-drift 0.02 --max-wer 0.1
+
+A samples directory holds *.txt, *.png / *.jpg and *.wav (16 kHz mono) files;
+without one a small synthetic set is generated from fixed seeds. The process
+exits with status 1 when a drift threshold is exceeded.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import glob
+import json
+import time
+import wave
+import numpy as np
+import torch
+from PIL import Image, ImageFilter
+from ai_models import AIModelsManager
+from model_precision import PRECISIONS
+
+SAMPLE_TEXTS = [
+    "A quarterly report on revenue growth in the northern region.",
+    "Two cats sleeping on a red sofa next to a window.",
+    "Instructions for replacing the battery in a smoke detector.",
+    "The meeting was moved to Thursday afternoon at three o'clock.",
+    "A mountain landscape at sunset with a lake in the foreground.",
+    "Invoice INV-2041 is overdue by thirty days.",
+    "Recipe: whisk two eggs with flour, milk and a pinch of salt.",
+    "The train to Berlin departs from platform nine.",
+]
+
+def synthetic_samples(seed: int = 0):
+    """Fixed texts, smooth random pictures and chirp recordings"""
+    rng = np.random.default_rng(seed)
+    images = [
+        Image.fromarray((rng.random((8, 8, 3)) * 255).astype("uint8")).resize((224, 224), Image.BICUBIC)
+        .filter(ImageFilter.GaussianBlur(3))
+        for _ in range(8)
+    ]
+    t = np.arange(16000 * 4) / 16000
+    audio = [(0.3 * np.sin(2 * np.pi * (200 + 150 * i) * t * (1 + t / 4))).astype(np.float32) for i in range(4)]
+    return SAMPLE_TEXTS, images, audio
+
+def read_wav(path: str) -> np.ndarray:
+    with wave.open(path, "rb") as f:
+        if f.getsampwidth() != 2 or f.getframerate() != 16000:
+            raise ValueError(f"{path}: expected 16-bit 16 kHz PCM")
+        samples = np.frombuffer(f.readframes(f.getnframes()), dtype="<i2").reshape(-1, f.getnchannels())
+    return samples.mean(axis=1).astype(np.float32) / 32768.0
+
+def load_samples(directory: str):
+    texts = [open(path, encoding="utf-8").read() for path in sorted(glob.glob(os.path.join(directory, "*.txt")))]
+    images = [Image.open(path).convert("RGB") for pattern in ("*.png", "*.jpg", "*.jpeg")
+              for path in sorted(glob.glob(os.path.join(directory, pattern)))]
+    audio = [read_wav(path) for path in sorted(glob.glob(os.path.join(directory, "*.wav")))]
+    return texts, images, audio
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level Levenshtein distance divided by the reference length"""
+    ref, hyp = reference.split(), hypothesis.split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, start=1):
+        current = [i]
+        for j, other in enumerate(hyp, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other)))
+        previous = current
+    return previous[-1] / len(ref)
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def run_precision(precision: str, clip_model: str, speech_model: str, samples, batch_size: int) -> dict:
+    """Embed and transcribe the samples once to warm up, then again timed"""
+    texts, images, audio = samples
+    models = AIModelsManager(query_cache_entries=0, warmup=False, precision=precision)
+    models.clip_model_name, models.speech_model_name = clip_model, speech_model
+
+    outputs, seconds = {}, {}
+    tasks = {
+        "text": (models.get_text_embeddings, texts, batch_size),
+        "image": (models.get_image_embeddings, images, batch_size),
+        "audio": (models.transcribe_audio_batch, audio),
+    }
+    for name, (fn, items, *extra) in tasks.items():
+        if not items:
+            continue
+        fn(items, *extra)
+        outputs[name], seconds[name] = timed(fn, items, *extra)
+    models.shutdown()
+    return {"precision": models.precision, "outputs": outputs, "seconds": seconds}
+
+def compare(baseline: dict, candidate: dict, samples) -> dict:
+    counts = dict(zip(("text", "image", "audio"), (len(items) for items in samples)))
+    row = {"precision": candidate["precision"]}
+    for name in ("text", "image"):
+        if name in candidate["outputs"]:
+            cosine = torch.nn.functional.cosine_similarity(baseline["outputs"][name], candidate["outputs"][name])
+            row[f"{name}_cosine_mean"] = round(float(cosine.mean()), 5)
+            row[f"{name}_cosine_min"] = round(float(cosine.min()), 5)
+    if "audio" in candidate["outputs"]:
+        rates = [word_error_rate(ref, hyp) for ref, hyp in zip(baseline["outputs"]["audio"], candidate["outputs"]["audio"])]
+        row["audio_wer_vs_fp32"] = round(float(np.mean(rates)), 4)
+    for name, elapsed in candidate["seconds"].items():
+        row[f"{name}_items_per_s"] = round(counts[name] / elapsed, 2)
+        row[f"{name}_speedup"] = round(baseline["seconds"][name] / elapsed, 2)
+    return row
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--precisions", nargs="+", default=["int8", "bf16"], choices=[p for p in PRECISIONS if p != "fp32"])
+    parser.add_argument("--samples", help="Directory of *.txt, *.png/*.jpg and *.wav samples (default: synthetic)")
+    parser.add_argument("--clip-model", default="openai/clip-vit-base-patch32")
+    parser.add_argument("--speech-model", default="facebook/s2t-medium-librispeech-asr")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--max-cosine-drift", type=float, default=None, help="Fail if 1 - min cosine exceeds this")
+    parser.add_argument("--max-wer", type=float, default=None, help="Fail if transcript WER vs fp32 exceeds this")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    samples = load_samples(args.samples) if args.samples else synthetic_samples()
+    print("🚀 Inference precision benchmark")
+    print("=" * 50)
+    print(f"   {len(samples[0])} texts, {len(samples[1])} images, {len(samples[2])} recordings")
+
+    baseline = run_precision("fp32", args.clip_model, args.speech_model, samples, args.batch_size)
+    results, failures = [], []
+    for precision in args.precisions:
+        candidate = run_precision(precision, args.clip_model, args.speech_model, samples, args.batch_size)
+        if candidate["precision"] != precision:
+            print(f"   {precision}: not supported on this machine, skipped")
+            continue
+        row = compare(baseline, candidate, samples)
+        results.append(row)
+        print(f"   {json.dumps(row)}")
+
+        for name in ("text", "image"):
+            drift = 1 - row.get(f"{name}_cosine_min", 1.0)
+            if args.max_cosine_drift is not None and drift > args.max_cosine_drift:
+                failures.append(f"{precision} {name} cosine drift {drift:.4f} > {args.max_cosine_drift}")
+        if args.max_wer is not None and row.get("audio_wer_vs_fp32", 0.0) > args.max_wer:
+            failures.append(f"{precision} WER {row['audio_wer_vs_fp32']:.4f} > {args.max_wer}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
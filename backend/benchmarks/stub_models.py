@@ -0,0 +1,84 @@
+"""
+Stub Models
+Tiny randomly initialized CLIP and Speech2Text checkpoints written to disk, so the
+benchmarks load them offline through the usual from_pretrained path
+"""
+
+import os
+import json
+import string
+import torch
+from transformers import (CLIPConfig, CLIPImageProcessor, CLIPModel, CLIPProcessor, CLIPTokenizer,
+                          Speech2TextConfig, Speech2TextFeatureExtractor, Speech2TextForConditionalGeneration,
+                          Speech2TextProcessor, Speech2TextTokenizer)
+
+SPEECH_CORPUS = [
+    "hello world this is a test of speech",
+    "the quick brown fox jumps over the lazy dog",
+]
+
+def build_clip(directory: str, projection_dim: int = 64, seed: int = 0) -> str:
+    """A two-layer CLIP with a character-level tokenizer and 32x32 images"""
+    os.makedirs(directory, exist_ok=True)
+    vocab = {"<|startoftext|>": 0, "<|endoftext|>": 1}
+    for char in string.printable.strip():
+        vocab[char] = len(vocab)
+        vocab[char + "</w>"] = len(vocab)
+    with open(os.path.join(directory, "vocab.json"), "w") as f:
+        json.dump(vocab, f)
+    with open(os.path.join(directory, "merges.txt"), "w") as f:
+        f.write("#version: 0.2\n")
+
+    tokenizer = CLIPTokenizer(os.path.join(directory, "vocab.json"), os.path.join(directory, "merges.txt"), model_max_length=77)
+    image_processor = CLIPImageProcessor(size={"shortest_edge": 32}, crop_size={"height": 32, "width": 32})
+    config = CLIPConfig(
+        text_config=dict(vocab_size=len(vocab), hidden_size=32, intermediate_size=64, num_hidden_layers=2,
+                         num_attention_heads=2, max_position_embeddings=77, bos_token_id=0, eos_token_id=1, pad_token_id=1),
+        vision_config=dict(hidden_size=32, intermediate_size=64, num_hidden_layers=2, num_attention_heads=2,
+                           image_size=32, patch_size=8),
+        projection_dim=projection_dim
+    )
+    torch.manual_seed(seed)
+    CLIPModel(config).save_pretrained(directory)
+    CLIPProcessor(image_processor=image_processor, tokenizer=tokenizer).save_pretrained(directory)
+    return directory
+
+def build_speech(directory: str, seed: int = 0) -> str:
+    """A one-layer Speech2Text with a small SentencePiece vocabulary, generating at most 20 tokens"""
+    import sentencepiece as spm
+
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, "spm")
+    spm.SentencePieceTrainer.train(sentence_iterator=iter(SPEECH_CORPUS * 50), model_prefix=prefix, vocab_size=32,
+                                   model_type="unigram", bos_id=0, pad_id=1, eos_id=2, unk_id=3, minloglevel=2)
+    pieces = spm.SentencePieceProcessor(model_file=prefix + ".model")
+    vocab = {"<s>": 0, "<pad>": 1, "</s>": 2, "<unk>": 3}
+    for i in range(4, pieces.get_piece_size()):
+        vocab[pieces.id_to_piece(i)] = i
+    with open(prefix + ".json", "w") as f:
+        json.dump(vocab, f)
+
+    tokenizer = Speech2TextTokenizer(vocab_file=prefix + ".json", spm_file=prefix + ".model")
+    feature_extractor = Speech2TextFeatureExtractor(feature_size=80, num_mel_bins=80)
+    config = Speech2TextConfig(
+        vocab_size=len(vocab), d_model=16, encoder_layers=1, decoder_layers=1, encoder_attention_heads=2,
+        decoder_attention_heads=2, encoder_ffn_dim=32, decoder_ffn_dim=32, conv_channels=16, input_feat_per_channel=80,
+        max_source_positions=6000, max_target_positions=64, pad_token_id=1, bos_token_id=0, eos_token_id=2,
+        decoder_start_token_id=2
+    )
+    torch.manual_seed(seed)
+    model = Speech2TextForConditionalGeneration(config)
+    model.generation_config.max_length = 20
+    model.save_pretrained(directory)
+    Speech2TextProcessor(feature_extractor, tokenizer).save_pretrained(directory)
+    return directory
+
+def build_stub_models(directory: str, projection_dim: int = 64):
+    """Write (or reuse) both stub checkpoints under directory; returns (clip path, speech path)"""
+    clip_dir = os.path.join(directory, f"clip-{projection_dim}")
+    speech_dir = os.path.join(directory, "s2t")
+    if not os.path.exists(os.path.join(clip_dir, "config.json")):
+        build_clip(clip_dir, projection_dim)
+    if not os.path.exists(os.path.join(speech_dir, "config.json")):
+        build_speech(speech_dir)
+    return clip_dir, speech_dir
@@ -0,0 +1,173 @@
+"""
+Blob Store Module
+Content-addressed on-disk storage for raw uploads and their thumbnails
+"""
+
+import os
+import io
+import json
+import shutil
+import tempfile
+import threading
+from typing import Dict, Optional
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (128, 128)
+COPY_CHUNK_BYTES = 1024 * 1024
+
+class BlobStore:
+    """Raw upload bytes stored once per content digest, with reference counts
+
+    Layout of the store directory:
+        ab/abcdef...     the blob whose digest starts with "ab"
+        thumbs/<digest>  JPEG thumbnail of an image blob
+        refs.jsonl       append-only log of reference count changes
+
+    Every document pointing at a blob holds one reference; the blob and its
+    thumbnail are deleted when the last reference is released. Writes go to a
+    temporary file that is renamed into place, so a blob is never half-written.
+    The reference log is rewritten on open once mostly stale, unless compact
+    is False.
+    """
+
+    REFS_FILE = "refs.jsonl"
+
+    def __init__(self, directory: str, compact: bool = True):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "thumbs"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._refs: Dict[str, int] = {}
+
+        refs_path = os.path.join(directory, self.REFS_FILE)
+        lines = self._load(refs_path)
+        if compact and lines > 2 * len(self._refs) + 64:
+            self._compact(refs_path)
+        self._log = open(refs_path, "a", encoding="utf-8")
+
+    def _load(self, path: str) -> int:
+        """Replay the reference log and return how many lines it had"""
+        if not os.path.exists(path):
+            return 0
+
+        lines = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt line in {path}")
+                    continue
+                lines += 1
+                count = self._refs.get(entry["blob"], 0) + entry["delta"]
+                if count > 0:
+                    self._refs[entry["blob"]] = count
+                else:
+                    self._refs.pop(entry["blob"], None)
+        return lines
+
+    def _compact(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for digest, count in self._refs.items():
+                f.write(json.dumps({"blob": digest, "delta": count}) + "\n")
+        os.replace(tmp_path, path)
+
+    def _append(self, digest: str, delta: int):
+        self._log.write(json.dumps({"blob": digest, "delta": delta}) + "\n")
+        self._log.flush()
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def thumbnail_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "thumbs", digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self.path(digest))
+
+    def refs(self, digest: str) -> int:
+        with self._lock:
+            return self._refs.get(digest, 0)
+
+    def _place(self, digest: str, write):
+        """Write a blob through write(file) unless it is already stored"""
+        path = self.path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+            write(tmp)
+        os.replace(tmp.name, path)
+
+    def _add(self, digest: str, write):
+        # The reference is taken before the write, so a concurrent release of
+        # the same blob cannot delete it underneath us
+        self.add_ref(digest)
+        try:
+            self._place(digest, write)
+        except Exception:
+            self.release(digest)
+            raise
+
+    def add_bytes(self, digest: str, content: bytes):
+        """Store content under its digest and take a reference to it"""
+        self._add(digest, lambda f: f.write(content))
+
+    def add_file(self, digest: str, source_path: str):
+        """Copy a file (e.g. a spooled upload) into the store and take a reference to it"""
+        def copy(f):
+            with open(source_path, "rb") as source:
+                shutil.copyfileobj(source, f, COPY_CHUNK_BYTES)
+        self._add(digest, copy)
+
+    def add_fileobj(self, digest: str, source):
+        """Copy a readable binary file object, from its current position, into the store"""
+        self._add(digest, lambda f: shutil.copyfileobj(source, f, COPY_CHUNK_BYTES))
+
+    def add_ref(self, digest: str):
+        with self._lock:
+            self._refs[digest] = self._refs.get(digest, 0) + 1
+            self._append(digest, 1)
+
+    def release(self, digest: str):
+        """Drop one reference; the last one deletes the blob and its thumbnail"""
+        with self._lock:
+            count = self._refs.get(digest, 0) - 1
+            self._append(digest, -1)
+            if count > 0:
+                self._refs[digest] = count
+                return
+            self._refs.pop(digest, None)
+            for path in (self.path(digest), self.thumbnail_path(digest)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def save_thumbnail(self, digest: str, image) -> bool:
+        """Store a small JPEG preview of a decoded PIL image, once per blob"""
+        path = self.thumbnail_path(digest)
+        if os.path.exists(path):
+            return True
+        try:
+            thumbnail = image.convert("RGB")
+            thumbnail.thumbnail(THUMBNAIL_SIZE)
+            buffer = io.BytesIO()
+            thumbnail.save(buffer, format="JPEG", quality=80)
+        except Exception as e:
+            logger.warning(f"Could not create thumbnail for {digest}: {e}")
+            return False
+
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+            tmp.write(buffer.getvalue())
+        os.replace(tmp.name, path)
+        return True
+
+    def close(self):
+        with self._lock:
+            self._log.close()
@@ -0,0 +1,144 @@
+"""
+Configuration Module
+Runtime settings for the backend, read from environment variables
+"""
+
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def env_int(name: str, default: int) -> int:
+    """Read an integer setting from the environment"""
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+def env_float(name: str, default: float) -> float:
+    """Read a float setting from the environment"""
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+def env_bool(name: str, default: bool) -> bool:
+    """Read a boolean setting from the environment"""
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+# Persistent document store
+DATA_DIR = os.environ.get("RAG_DATA_DIR", os.path.join(BASE_DIR, "data"))
+EMBEDDING_DIM = env_int("RAG_EMBEDDING_DIM", 512)
+EMBEDDING_DTYPE = os.environ.get("RAG_EMBEDDING_DTYPE", "float32")
+
+# Approximate / compressed search: "" keeps exact search, "ivf" enables IVF-flat,
+# "sq8" and "pq" score int8 scalar or product-quantized codes with exact re-ranking
+# (only the codes stay in memory; the float rows are read back from the embedding
+# file for the re-ranked shortlist)
+ANN_INDEX = os.environ.get("RAG_ANN_INDEX", "")
+ANN_TRAIN_THRESHOLD = env_int("RAG_ANN_TRAIN_THRESHOLD", 10000)
+IVF_NLIST = env_int("RAG_IVF_NLIST", 0) or None
+IVF_NPROBE = env_int("RAG_IVF_NPROBE", 16)
+PQ_M = env_int("RAG_PQ_M", 64)
+RERANK_FACTOR = env_int("RAG_RERANK_FACTOR", 4)
+
+def ann_params() -> dict:
+    """Keyword arguments for the configured ANN index"""
+    if ANN_INDEX == "ivf":
+        return {"nlist": IVF_NLIST, "nprobe": IVF_NPROBE, "train_threshold": ANN_TRAIN_THRESHOLD}
+    if ANN_INDEX == "sq8":
+        return {"rerank_factor": RERANK_FACTOR, "train_threshold": ANN_TRAIN_THRESHOLD}
+    if ANN_INDEX == "pq":
+        return {"m": PQ_M, "rerank_factor": RERANK_FACTOR, "train_threshold": ANN_TRAIN_THRESHOLD}
+    return {}
+
+# Batch ingestion: files per encoder forward pass in /upload/batch
+UPLOAD_BATCH_SIZE = env_int("RAG_UPLOAD_BATCH_SIZE", 32)
+
+# Dynamic batching of concurrent /query embeddings
+QUERY_BATCH_WINDOW_MS = env_float("RAG_QUERY_BATCH_WINDOW_MS", 5.0)
+QUERY_MAX_BATCH_SIZE = env_int("RAG_QUERY_MAX_BATCH_SIZE", 32)
+
+# Inference executor: worker threads for model/decoding work and torch intra-op
+# threads (0 splits the CPU cores evenly across workers)
+INFERENCE_WORKERS = env_int("RAG_INFERENCE_WORKERS", 2)
+INFERENCE_TORCH_THREADS = env_int("RAG_INFERENCE_TORCH_THREADS", 0)
+# torch inter-op pool size (0 keeps torch's default)
+INFERENCE_INTEROP_THREADS = env_int("RAG_INFERENCE_INTEROP_THREADS", 0)
+
+# LRU cache for query embeddings (0 entries disables it)
+QUERY_CACHE_ENTRIES = env_int("RAG_QUERY_CACHE_ENTRIES", 10000)
+QUERY_CACHE_MB = env_int("RAG_QUERY_CACHE_MB", 64)
+
+# Byte-identical uploads: "alias" returns the existing document, "reject" answers
+# 409 Conflict, "off" stores every upload
+DEDUP_MODE = os.environ.get("RAG_DEDUP_MODE", "alias")
+
+# Near-duplicate images: an image whose 64-bit perceptual hash is within this
+# Hamming distance of a stored image is treated like a duplicate of it and
+# skips CLIP (-1 disables the check)
+IMAGE_HASH_DISTANCE = env_int("RAG_IMAGE_HASH_DISTANCE", 6)
+
+# Model lifecycle: models listed in RAG_PRELOAD_MODELS ("clip", "speech") load in
+# the background at startup, the others on first use. Idle models are unloaded
+# after RAG_MODEL_IDLE_TTL_S seconds (0 keeps them resident).
+PRELOAD_MODELS = [name.strip() for name in os.environ.get("RAG_PRELOAD_MODELS", "clip").split(",") if name.strip()]
+MODEL_WARMUP = env_bool("RAG_MODEL_WARMUP", True)
+MODEL_IDLE_TTL_S = env_float("RAG_MODEL_IDLE_TTL_S", 0.0)
+
+# CPU inference precision: "fp32", "int8" (dynamic int8 quantization of Linear
+# layers) or "bf16" (bfloat16 autocast, only where the CPU has native support)
+MODEL_PRECISION = os.environ.get("RAG_MODEL_PRECISION", "fp32")
+
+# CLIP encoders run "eager", "trace" (TorchScript graphs saved to COMPILE_CACHE_DIR
+# and reused by later processes) or "compile" (torch.compile, inductor cache in
+# COMPILE_CACHE_DIR). Compiled graphs are built for these batch sizes at startup.
+COMPILE_MODE = os.environ.get("RAG_COMPILE_MODE", "eager")
+COMPILE_CACHE_DIR = os.environ.get("RAG_COMPILE_CACHE_DIR", os.path.join(DATA_DIR, "compiled"))
+COMPILE_BATCH_SIZES = [int(size) for size in os.environ.get("RAG_COMPILE_BATCH_SIZES", "1,8,32").split(",") if size.strip()]
+
+# Text chunking: documents are split into windows of this many CLIP tokens
+# (the encoder takes 77 including start/end tokens), overlapping by TEXT_CHUNK_OVERLAP
+TEXT_CHUNK_TOKENS = env_int("RAG_TEXT_CHUNK_TOKENS", 75)
+TEXT_CHUNK_OVERLAP = env_int("RAG_TEXT_CHUNK_OVERLAP", 16)
+
+# Audio is transcribed in overlapping windows (seconds), AUDIO_BATCH_SIZE windows
+# per Speech2Text generate call; each window is stored as a timestamped segment
+AUDIO_WINDOW_S = env_float("RAG_AUDIO_WINDOW_S", 20.0)
+AUDIO_WINDOW_OVERLAP_S = env_float("RAG_AUDIO_WINDOW_OVERLAP_S", 2.0)
+AUDIO_BATCH_SIZE = env_int("RAG_AUDIO_BATCH_SIZE", 4)
+
+# Background ingestion: uploads sent with ?background=true return 202 and a job
+# id; JOB_WORKERS workers process queued jobs, up to JOB_BATCH_SIZE of one
+# modality at a time
+JOB_WORKERS = env_int("RAG_JOB_WORKERS", 2)
+JOB_BATCH_SIZE = env_int("RAG_JOB_BATCH_SIZE", 16)
+
+# Deletes tombstone rows; the store is compacted in the background once at least
+# COMPACT_MIN_DELETED rows, and COMPACT_RATIO of all rows, are tombstoned
+COMPACT_RATIO = env_float("RAG_COMPACT_RATIO", 0.25)
+COMPACT_MIN_DELETED = env_int("RAG_COMPACT_MIN_DELETED", 1024)
+
+# Multi-worker serving (uvicorn --workers N): with RAG_SHARED_STORE one worker
+# takes the writer lock and owns ingestion, deletes and compaction; the others
+# serve queries read-only from the same memory-mapped files and queue uploads
+# and deletes for it. The writer publishes a store snapshot every
+# SNAPSHOT_INTERVAL_S seconds while the corpus changes, and readers switch to it
+# within another interval. The ANN and BM25 indexes are saved only after
+# CHECKPOINT_ROWS new rows or CHECKPOINT_INTERVAL_S seconds of unsaved changes
+# (and on compaction and shutdown); readers index the rows added since.
+SHARED_STORE = env_bool("RAG_SHARED_STORE", False)
+SNAPSHOT_INTERVAL_S = env_float("RAG_SNAPSHOT_INTERVAL_S", 1.0)
+CHECKPOINT_ROWS = env_int("RAG_CHECKPOINT_ROWS", 50000)
+CHECKPOINT_INTERVAL_S = env_float("RAG_CHECKPOINT_INTERVAL_S", 300.0)
+
+# Per-request profiling (admin only): /query and /upload/* requests sent with an
+# X-Profile header equal to PROFILE_TOKEN get a "profile" field with stage
+# timings and tensor shapes; X-Profile-Dump: cprofile|torch also writes a
+# .pstats file or Chrome trace for the request to PROFILE_DIR. Disabled while
+# no token is set.
+PROFILE_TOKEN = os.environ.get("RAG_PROFILE_TOKEN", "")
+PROFILE_DIR = os.environ.get("RAG_PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+
+# Hybrid /query mode: the top HYBRID_DEPTH documents of the vector and BM25
+# keyword rankings are fused with reciprocal rank fusion, 1 / (RRF_K + rank)
+HYBRID_DEPTH = env_int("RAG_HYBRID_DEPTH", 50)
+RRF_K = env_int("RAG_RRF_K", 60)
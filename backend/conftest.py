@@ -0,0 +1,11 @@
+"""
+Pytest configuration
+Points the data directory at a temporary one before any test module imports config
+"""
+
+import os
+import tempfile
+
+# config reads RAG_DATA_DIR at import, and the first test module to import it
+# (directly or through ai_models / api_endpoints) fixes it for the whole run
+os.environ["RAG_DATA_DIR"] = tempfile.mkdtemp(prefix="rag-test-data-")
@@ -0,0 +1,122 @@
+"""
+Content Index Module
+Persistent content-hash to document-id index for de-duplicating uploads
+"""
+
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEDUP_MODES = ("alias", "reject", "off")
+
+def new_hasher():
+    """Incremental BLAKE2b hasher used for upload content"""
+    return hashlib.blake2b(digest_size=32)
+
+def content_digest(chunks: Iterable[bytes]) -> str:
+    """Hex BLAKE2b digest of a sequence of byte chunks"""
+    hasher = new_hasher()
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+class ContentHashIndex:
+    """Maps (modality, content digest) to the id of the document first stored for it
+
+    Entries live in memory and are appended to content_hashes.jsonl; a removal
+    appends a tombstone line. The log is rewritten on open once tombstones and
+    superseded lines outnumber the live entries, unless compact is False
+    (processes that only read the index must not replace the writer's log).
+    """
+
+    FILE = "content_hashes.jsonl"
+
+    def __init__(self, directory: str, compact: bool = True):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, self.FILE)
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], str] = {}
+        self._by_document: Dict[str, Set[Tuple[str, str]]] = {}
+
+        lines = self._load()
+        if compact and lines > 2 * len(self._entries) + 64:
+            self._compact()
+        self._log = open(self.path, "a", encoding="utf-8")
+
+    def _load(self) -> int:
+        """Replay the log and return how many lines it had"""
+        if not os.path.exists(self.path):
+            return 0
+
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash; everything before it is intact
+                    logger.warning(f"Skipping corrupt line in {self.path}")
+                    continue
+                lines += 1
+                key = (entry["modality"], entry["hash"])
+                if entry.get("id") is None:
+                    self._discard(key)
+                else:
+                    self._set(key, entry["id"])
+        return lines
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for (modality, digest), doc_id in self._entries.items():
+                f.write(json.dumps({"modality": modality, "hash": digest, "id": doc_id}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _set(self, key: Tuple[str, str], doc_id: str):
+        self._discard(key)
+        self._entries[key] = doc_id
+        self._by_document.setdefault(doc_id, set()).add(key)
+
+    def _discard(self, key: Tuple[str, str]):
+        doc_id = self._entries.pop(key, None)
+        if doc_id is not None:
+            keys = self._by_document[doc_id]
+            keys.discard(key)
+            if not keys:
+                del self._by_document[doc_id]
+
+    def _append(self, modality: str, digest: str, doc_id: Optional[str]):
+        self._log.write(json.dumps({"modality": modality, "hash": digest, "id": doc_id}) + "\n")
+        self._log.flush()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, modality: str, digest: str) -> Optional[str]:
+        """Return the id of the document already stored for this content"""
+        with self._lock:
+            return self._entries.get((modality, digest))
+
+    def add(self, modality: str, digest: str, doc_id: str):
+        """Record doc_id as the canonical document for this content"""
+        with self._lock:
+            self._set((modality, digest), doc_id)
+            self._append(modality, digest, doc_id)
+
+    def remove_document(self, doc_id: str):
+        """Forget every content hash that points at doc_id"""
+        with self._lock:
+            for modality, digest in list(self._by_document.get(doc_id, ())):
+                self._discard((modality, digest))
+                self._append(modality, digest, None)
+
+    def close(self):
+        with self._lock:
+            self._log.close()
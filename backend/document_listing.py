@@ -0,0 +1,67 @@
+"""
+Document Listing Module
+Cursor pagination, field projection and incremental serialization of document records
+"""
+
+import json
+import base64
+import binascii
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from document_store import DocumentStore
+
+class InvalidCursor(ValueError):
+    """Raised for a cursor that was not produced by encode_cursor"""
+
+def encode_cursor(position: int, doc_id: str) -> str:
+    """Opaque cursor pointing just past the document doc_id at position"""
+    return base64.urlsafe_b64encode(json.dumps([position, doc_id]).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    try:
+        position, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+    if not isinstance(position, int) or not isinstance(doc_id, str) or position < 0:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return position, doc_id
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated fields= parameter; None keeps every field"""
+    if not fields:
+        return None
+    selected = [name.strip() for name in fields.split(",") if name.strip()]
+    return ["id"] + [name for name in selected if name != "id"]
+
+def project(record: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return record
+    return {name: record[name] for name in fields if name in record}
+
+def start_position(store: DocumentStore, cursor: Optional[str]) -> int:
+    """Position to start listing from for a cursor (or the beginning)"""
+    if not cursor:
+        return 0
+    return store.resume_after(*decode_cursor(cursor))
+
+def json_page(store: DocumentStore, start: int, limit: int, fields: Optional[List[str]] = None) -> Iterator[str]:
+    """Serialize one page as {"documents": [...], "next_cursor": ...}, record by record
+
+    One record past the page is read to tell whether a next page exists.
+    """
+    yield '{"documents": ['
+    next_cursor = None
+    last = None
+    count = 0
+    for position, record in store.scan_documents(start):
+        if count == limit:
+            next_cursor = encode_cursor(*last)
+            break
+        yield ("," if count else "") + json.dumps(project(record, fields))
+        last = (position, record["id"])
+        count += 1
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + "}"
+
+def ndjson_export(store: DocumentStore, start: int = 0, fields: Optional[List[str]] = None) -> Iterator[str]:
+    """Serialize every document from start on as one JSON object per line"""
+    for _, record in store.scan_documents(start):
+        yield json.dumps(project(record, fields)) + "\n"
@@ -0,0 +1,965 @@
+"""
+Document Store Module
+Persists document metadata and embeddings so the corpus survives restarts
+"""
+
+import os
+import re
+import copy
+import json
+import math
+import time
+import fcntl
+import fnmatch
+import shutil
+import struct
+import threading
+from contextlib import contextmanager
+import numpy as np
+import torch
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import logging
+from vector_index import MemmapVectorIndex
+from ann_index import create_ann_index
+from lexical_index import BM25Index, lexical_text, reciprocal_rank_fusion
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TORCH_DTYPES = {"float32": torch.float32, "float16": torch.float16}
+
+class SearchFilter(NamedTuple):
+    """Metadata restrictions for a search; None leaves a field unrestricted"""
+    modalities: Optional[List[str]] = None
+    filename: Optional[str] = None  # glob pattern, e.g. "*.wav"
+    uploaded_after: Optional[float] = None  # unix timestamps, inclusive
+    uploaded_before: Optional[float] = None
+
+    @property
+    def is_empty(self) -> bool:
+        return all(value is None for value in self)
+
+class MetadataColumns:
+    """Per-row metadata kept as columns so filters become bitmask operations
+
+    modalities maps each modality to a boolean row mask, filenames maps each
+    filename to its rows, and uploaded_at holds every row's upload time (NaN
+    for rows stored before upload times were recorded).
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.modalities: Dict[str, torch.Tensor] = {}
+        self.filenames: Dict[str, List[int]] = {}
+        self.uploaded_at = torch.full((capacity,), math.nan, dtype=torch.float64)
+
+    def _reserve(self, required: int):
+        capacity = len(self.uploaded_at)
+        if required <= capacity:
+            return
+        capacity = max(required, 2 * capacity)
+        grown = torch.full((capacity,), math.nan, dtype=torch.float64)
+        grown[:self.size] = self.uploaded_at[:self.size]
+        self.uploaded_at = grown
+        for modality, mask in self.modalities.items():
+            self.modalities[modality] = torch.cat([mask, torch.zeros(capacity - len(mask), dtype=torch.bool)])
+
+    def add(self, position: int, record: Dict[str, Any]):
+        self._reserve(position + 1)
+        modality = record.get("modality")
+        if modality not in self.modalities:
+            self.modalities[modality] = torch.zeros(len(self.uploaded_at), dtype=torch.bool)
+        self.modalities[modality][position] = True
+        self.filenames.setdefault(record.get("filename") or "", []).append(position)
+        if record.get("uploaded_at") is not None:
+            self.uploaded_at[position] = record["uploaded_at"]
+        self.size = max(self.size, position + 1)
+
+    def mask(self, search_filter: SearchFilter, count: int) -> torch.Tensor:
+        """Rows among the first count that pass every restriction of the filter"""
+        allowed = torch.ones(count, dtype=torch.bool)
+        if search_filter.modalities is not None:
+            matching = torch.zeros(count, dtype=torch.bool)
+            for modality in search_filter.modalities:
+                if modality in self.modalities:
+                    matching |= self.modalities[modality][:count]
+            allowed &= matching
+        if search_filter.filename is not None:
+            matching = torch.zeros(count, dtype=torch.bool)
+            for filename, positions in self.filenames.items():
+                if fnmatch.fnmatchcase(filename, search_filter.filename):
+                    matching[positions] = True
+            allowed &= matching
+        if search_filter.uploaded_after is not None or search_filter.uploaded_before is not None:
+            # NaN compares false, so rows without an upload time never pass
+            uploaded_at = self.uploaded_at[:count]
+            after = -math.inf if search_filter.uploaded_after is None else search_filter.uploaded_after
+            before = math.inf if search_filter.uploaded_before is None else search_filter.uploaded_before
+            allowed &= (uploaded_at >= after) & (uploaded_at <= before)
+        return allowed
+
+class DocumentStore:
+    """Memory-mapped embedding matrix plus an append-only metadata sidecar
+
+    Layout of the store directory:
+        store.json       header with the row and document counts, next document
+                         number, dimension and dtype
+        embeddings.<dt>  fixed-width rows of normalized embeddings (numpy.memmap)
+        metadata.jsonl   one JSON record per row
+        metadata.idx     fixed 16-byte (offset, length) entries into metadata.jsonl
+        tombstones.bin   one byte per row, 1 once the row is deleted
+
+    A document may span several rows (chunks), each a record with the same
+    "id" and a "chunk" index; the row with chunk 0 (or no chunk) is the head
+    of its document. Searches return the best-scoring chunk of each document.
+
+    Opening a store reads only the header and maps the embedding file, so it is
+    O(1) in the corpus size; records are fetched on demand through the offsets.
+
+    When ann_index names a registered ANN backend (e.g. "ivf"), searches go
+    through it instead of scoring every stored embedding.
+
+    Deleting a document only tombstones its rows, found through an in-memory
+    id -> rows map, and searches mask tombstoned rows. Once there are at least
+    compact_min_deleted tombstones and they make up compact_ratio of the rows,
+    a background thread compacts the store.
+
+    Keyword search uses a BM25 inverted index over text content and audio
+    transcriptions (see lexical_index). It is loaded or built on first use,
+    kept current by add, delete and compact, and saved on flush.
+
+    Several processes can share one store directory: a single writer adds,
+    deletes and compacts, and periodically calls publish_snapshot(), which
+    records the committed counts in snapshot.json. Rows reach the files as
+    they are added, so publishing costs one small file write; the ANN and
+    BM25 indexes are saved less often by checkpoint(), and a reader loading
+    an older save indexes the rows appended since. A store opened
+    read_only serves that snapshot from the same files (rows the writer
+    appended since are ignored) and shares the embedding file's pages with
+    the other processes. Compaction builds new files aside and holds an
+    exclusive lock on store.lock only while it moves them in (replacing
+    files rather than rewriting them), and read-only opens take the lock
+    shared, so a reader always opens a consistent snapshot and keeps reading
+    it unchanged until it moves on. refresh() moves a reader to a later
+    snapshot in place, indexing only the rows appended since; after a
+    compaction (which bumps the generation recorded in the header and
+    snapshot) the reader reopens instead.
+    """
+
+    HEADER_FILE = "store.json"
+    METADATA_FILE = "metadata.jsonl"
+    OFFSETS_FILE = "metadata.idx"
+    OFFSET_ENTRY = struct.Struct("<QQ")
+    TOMBSTONES_FILE = "tombstones.bin"
+    SNAPSHOT_FILE = "snapshot.json"
+    LOCK_FILE = "store.lock"
+    STAGING_DIR = "compacting"
+
+    def __init__(self, directory: str, dim: int = 512, dtype: str = "float32",
+                 ann_index: Optional[str] = None, ann_params: Optional[Dict[str, Any]] = None,
+                 compact_ratio: float = 0.25, compact_min_deleted: int = 1024, read_only: bool = False):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        self.compact_min_deleted = compact_min_deleted
+        self.read_only = read_only
+        self._lock = threading.RLock()
+        self._compactor = None
+        self._compaction_lock = threading.Lock()  # one compaction at a time
+        self._ids = None  # doc id -> live row positions, built on first use
+        self._columns = None  # MetadataColumns, built on the first filtered search
+        self._lexical = None  # BM25Index, loaded or built on the first keyword search
+        self._lexical_rows = 0  # rows below this position have been given to the BM25 index
+        self._changes = 0  # bumped by every add, delete and compaction
+        self.snapshot_version = 0
+
+        if read_only:
+            with self._file_lock(exclusive=False):
+                self._open(dim, dtype, ann_index, ann_params)
+        else:
+            self._open(dim, dtype, ann_index, ann_params)
+        # What the last saved index state covers; see checkpoint()
+        self._saved_changes, self._saved_count, self._saved_at = 0, self._count, time.monotonic()
+
+    def _open(self, dim: int, dtype: str, ann_index: Optional[str], ann_params: Optional[Dict[str, Any]]):
+        header = self._read_header()
+        if header is None:
+            if dtype not in TORCH_DTYPES:
+                raise ValueError(f"Unsupported embedding dtype: {dtype}")
+            header = {"count": 0, "documents": 0, "dim": dim, "dtype": dtype}
+        elif header["dim"] != dim or header["dtype"] != dtype:
+            logger.warning(
+                f"Existing store uses dim={header['dim']} dtype={header['dtype']}; ignoring requested dim={dim} dtype={dtype}"
+            )
+
+        self.dim = header["dim"]
+        self.dtype = header["dtype"]
+        self._count = header["count"]
+        # Stores written before chunking had one row per document
+        self._documents = header.get("documents", header["count"])
+        self._generation = header.get("generation", 0)
+        if self.read_only:
+            snapshot = self.read_snapshot(self.directory)
+            if snapshot is not None:
+                self._count, self._documents = snapshot["count"], snapshot["documents"]
+                self._generation = snapshot.get("generation", 0)
+                self.snapshot_version = snapshot["version"]
+
+        self.vector_index = MemmapVectorIndex(
+            self._path(f"embeddings.{self.dtype}"),
+            dim=self.dim,
+            size=self._count,
+            dtype=TORCH_DTYPES[self.dtype],
+            read_only=self.read_only
+        )
+        self._open_metadata()
+        self._open_tombstones()
+        # Stores written before the id allocator numbered documents by count;
+        # start past every number in use so ids are never reused
+        self._next_id = header.get("next_id")
+        if self._next_id is None:
+            self._next_id = max((self._id_number(record["id"]) + 1 for record in self.iter_rows()), default=0)
+        if not self.read_only:
+            self._write_header()
+
+        self.ann_index = None
+        if ann_index:
+            self.ann_index = create_ann_index(ann_index, self.vector_index, **(ann_params or {}))
+            self.ann_index.load(self.directory)
+        if self.read_only:
+            # Loaded now, under the lock, since a later compaction replaces the saved index
+            # (rows appended after that save are indexed on first use)
+            lexical = BM25Index()
+            covered = lexical.load(self.directory, self._count)
+            if covered is not None:
+                self._lexical, self._lexical_rows = lexical, covered
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_header(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(self.HEADER_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_header(self):
+        """Atomically replace the header so a crash never leaves it half-written"""
+        tmp_path = self._path(self.HEADER_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"count": self._count, "documents": self._documents, "next_id": self._next_id,
+                       "generation": self._generation, "dim": self.dim, "dtype": self.dtype}, f)
+        os.replace(tmp_path, self._path(self.HEADER_FILE))
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        """flock on store.lock: exclusive while files are replaced, shared while a reader opens them"""
+        with open(self._path(self.LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError("Document store is opened read-only")
+
+    def _open_metadata(self):
+        """Open the sidecar files and drop anything written after the last committed record"""
+        for name in (self.METADATA_FILE, self.OFFSETS_FILE):
+            open(self._path(name), "ab").close()
+
+        mode = "rb" if self.read_only else "r+b"
+        self._metadata = open(self._path(self.METADATA_FILE), mode)
+        self._offsets = open(self._path(self.OFFSETS_FILE), mode)
+
+        self._metadata_end = 0
+        if self._count:
+            offset, length = self._read_offset(self._count - 1)
+            self._metadata_end = offset + length
+
+        if not self.read_only:
+            self._offsets.truncate(self._count * self.OFFSET_ENTRY.size)
+            self._metadata.truncate(self._metadata_end)
+
+    def _open_tombstones(self):
+        """Load the tombstone bytes, sized to the committed rows"""
+        path = self._path(self.TOMBSTONES_FILE)
+        open(path, "ab").close()
+        self._tombstone_file = open(path, "rb" if self.read_only else "r+b")
+        if not self.read_only:
+            self._tombstone_file.truncate(self._count)
+
+        flags = np.fromfile(path, dtype=np.uint8, count=self._count)
+        self._tombstones = torch.zeros(max(1024, self._count), dtype=torch.bool)
+        self._tombstones[:len(flags)] = torch.from_numpy(flags.astype(bool))
+        self._deleted = int(self._tombstones.sum())
+
+    def _read_offset(self, position: int, offsets: Optional[BinaryIO] = None) -> Tuple[int, int]:
+        offsets = offsets or self._offsets
+        offsets.seek(position * self.OFFSET_ENTRY.size)
+        return self.OFFSET_ENTRY.unpack(offsets.read(self.OFFSET_ENTRY.size))
+
+    @staticmethod
+    def is_head(record: Dict[str, Any]) -> bool:
+        """Whether a row record is the first chunk of its document"""
+        return record.get("chunk", 0) == 0
+
+    @staticmethod
+    def _id_number(doc_id: str) -> int:
+        match = re.search(r"_(\d+)$", doc_id)
+        return int(match.group(1)) if match else -1
+
+    def __len__(self) -> int:
+        """Number of stored (live) rows"""
+        return self._count - self._deleted
+
+    @property
+    def deleted_count(self) -> int:
+        """Number of tombstoned rows not yet reclaimed by compaction"""
+        return self._deleted
+
+    @property
+    def document_count(self) -> int:
+        """Number of distinct documents"""
+        return self._documents
+
+    @property
+    def changes(self) -> int:
+        """Counter bumped by every add, delete and compaction, to tell when to publish"""
+        return self._changes
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.iter_documents()
+
+    def allocate_id(self, modality: str) -> str:
+        """Return a new document id; ids are never reused, even after deletes
+
+        The counter reaches disk with the next header commit (add or flush);
+        an id lost to a crash before then had no rows stored under it.
+        """
+        self._check_writable()
+        with self._lock:
+            doc_id = f"{modality}_{self._next_id}"
+            self._next_id += 1
+            return doc_id
+
+    def add(self, record: Dict[str, Any], embedding: torch.Tensor) -> int:
+        """Store a row record with its embedding and return its position"""
+        return self.add_many([record], embedding.reshape(1, -1))[0]
+
+    def add_many(self, records: List[Dict[str, Any]], embeddings: torch.Tensor) -> List[int]:
+        """Store several row records with their embeddings (one row each) and return their positions
+
+        The rows are appended with one write per file and committed by a
+        single header write, so ingesting a long document in batches costs
+        one header replace per batch rather than per chunk.
+        """
+        self._check_writable()
+        if not records:
+            return []
+        embeddings = embeddings.reshape(len(records), -1)
+        lines = [json.dumps(record).encode("utf-8") + b"\n" for record in records]
+
+        with self._lock:
+            start = self._count
+            end = start + len(records)
+            if end > len(self._tombstones):
+                grown = torch.zeros(max(end, 2 * len(self._tombstones)), dtype=torch.bool)
+                grown[:start] = self._tombstones[:start]
+                self._tombstones = grown
+            self._tombstone_file.seek(start)
+            self._tombstone_file.write(bytes(len(records)))
+            self._tombstone_file.flush()
+
+            self.vector_index.add(embeddings)
+            positions = list(range(start, end))
+            if self.ann_index is not None:
+                self.ann_index.add(positions)
+
+            self._metadata.seek(self._metadata_end)
+            self._metadata.write(b"".join(lines))
+            self._metadata.flush()
+
+            offsets = []
+            offset = self._metadata_end
+            for line in lines:
+                offsets.append(self.OFFSET_ENTRY.pack(offset, len(line)))
+                offset += len(line)
+            self._offsets.seek(start * self.OFFSET_ENTRY.size)
+            self._offsets.write(b"".join(offsets))
+            self._offsets.flush()
+
+            # The header is written last; it is the commit point for the new records
+            self._metadata_end = offset
+            self._count = end
+            self._documents += sum(self.is_head(record) for record in records)
+            self._changes += len(records)
+            self._write_header()
+            for position, record in zip(positions, records):
+                if self._ids is not None:
+                    self._ids.setdefault(record["id"], []).append(position)
+                if self._columns is not None:
+                    self._columns.add(position, record)
+                if self._lexical is not None:
+                    self._lexical.add(position, lexical_text(record))
+            if self._lexical is not None:
+                self._lexical_rows = end
+
+        return positions
+
+    def get(self, position: int) -> Dict[str, Any]:
+        """Fetch the record stored at position"""
+        with self._lock:
+            if not 0 <= position < self._count:
+                raise IndexError(f"Position {position} out of range")
+
+            offset, length = self._read_offset(position)
+            self._metadata.seek(offset)
+            return json.loads(self._metadata.read(length))
+
+    def is_deleted(self, position: int) -> bool:
+        return bool(self._tombstones[position])
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """Yield every live row record (all chunks) in insertion order"""
+        for position in range(self._count):
+            if not self._tombstones[position]:
+                yield self.get(position)
+
+    def iter_documents(self) -> Iterator[Dict[str, Any]]:
+        """Yield the head record of every document in insertion order"""
+        for record in self.iter_rows():
+            if self.is_head(record):
+                yield record
+
+    def scan_documents(self, start: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (position, head record) of every live document from position start on
+
+        The lock is taken per row, so a long scan does not block writers.
+        """
+        position = start
+        while True:
+            with self._lock:
+                if position >= self._count:
+                    return
+                record = None if self._tombstones[position] else self.get(position)
+            if record is not None and self.is_head(record):
+                yield position, record
+            position += 1
+
+    def resume_after(self, position: int, doc_id: str) -> int:
+        """Position to continue a scan after the document doc_id, last seen at position
+
+        If that document was deleted and the store compacted since, the scan
+        resumes at its old position, which may skip documents that moved down.
+        """
+        with self._lock:
+            if position < self._count and not self._tombstones[position] and self.get(position)["id"] == doc_id:
+                return position + 1
+            head = self.find(doc_id)
+            if head is not None:
+                return head + 1
+            return min(position, self._count)
+
+    def _id_map(self) -> Dict[str, List[int]]:
+        """The doc id -> live row positions map, built by one scan on first use"""
+        with self._lock:
+            if self._ids is None:
+                ids = {}
+                for position in range(self._count):
+                    if not self._tombstones[position]:
+                        ids.setdefault(self.get(position)["id"], []).append(position)
+                self._ids = ids
+            return self._ids
+
+    def find(self, doc_id: str) -> Optional[int]:
+        """Return the position of the head row of the document with the given id"""
+        with self._lock:
+            for position in self._id_map().get(doc_id, ()):
+                if self.is_head(self.get(position)):
+                    return position
+            return None
+
+    def find_all(self, doc_id: str) -> List[int]:
+        """Return the positions of every row (chunk) of the document with the given id"""
+        with self._lock:
+            return list(self._id_map().get(doc_id, ()))
+
+    def delete(self, position: int):
+        """Delete the row at position"""
+        self.delete_many([position])
+
+    def delete_many(self, positions: List[int]):
+        """Tombstone rows in O(1) each; space is reclaimed later by compact()"""
+        self._check_writable()
+        with self._lock:
+            ids = self._id_map()
+            removed = 0
+            for position in set(positions):
+                if not 0 <= position < self._count or self._tombstones[position]:
+                    continue
+                record = self.get(position)
+                self._tombstones[position] = True
+                self._tombstone_file.seek(position)
+                self._tombstone_file.write(b"\1")
+                if self._lexical is not None:
+                    self._lexical.remove(position, lexical_text(record))
+
+                rows = ids.get(record["id"], [])
+                if position in rows:
+                    rows.remove(position)
+                if not rows:
+                    ids.pop(record["id"], None)
+                self._documents -= self.is_head(record)
+                removed += 1
+
+            self._tombstone_file.flush()
+            self._deleted += removed
+            self._changes += removed
+            self._write_header()
+        self._maybe_compact()
+
+    def delete_document(self, doc_id: str) -> int:
+        """Delete every row of a document; returns how many rows were removed"""
+        with self._lock:
+            positions = self.find_all(doc_id)
+            self.delete_many(positions)
+            return len(positions)
+
+    def delete_where(self, predicate: Callable[[Dict[str, Any]], bool]) -> List[Dict[str, Any]]:
+        """Delete every document whose head record matches predicate; returns those head records"""
+        with self._lock:
+            heads = [record for record in self.iter_documents() if predicate(record)]
+            ids = self._id_map()
+            self.delete_many([position for record in heads for position in ids.get(record["id"], ())])
+            return heads
+
+    def _maybe_compact(self):
+        """Start a background compaction once enough rows are tombstoned"""
+        with self._lock:
+            if self._deleted < max(1, self.compact_min_deleted) or self._deleted < self.compact_ratio * self._count:
+                return
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            self._compactor = threading.Thread(target=self.compact, name="store-compactor", daemon=True)
+            self._compactor.start()
+
+    def compact(self) -> int:
+        """Drop tombstoned rows from the embedding file and sidecars; returns rows reclaimed
+
+        Live rows keep their order but move to new positions, and the ANN and
+        BM25 indexes are renumbered to match. The compacted files are built
+        in a staging directory from the rows present when compaction starts,
+        without holding the store's locks; only the swap takes them, and
+        carries over the rows added and deleted in the meantime.
+        """
+        self._check_writable()
+        with self._compaction_lock:
+            with self._lock:
+                if not self._deleted:
+                    return 0
+                built = self._count
+                keep = np.flatnonzero(~self._tombstones[:built].numpy())
+                # A shallow copy: compacting it rebinds its arrays, leaving the live index as is
+                ann_index = copy.copy(self.ann_index)
+                lexical = BM25Index() if self._lexical is not None else None
+
+            ids = self._build_compacted(keep, ann_index, lexical)
+            with self._lock, self._file_lock(exclusive=True):
+                self._swap_compacted(keep, built, ids, ann_index, lexical)
+
+        logger.info(f"Compacted document store: reclaimed {built - len(keep)} rows")
+        return built - len(keep)
+
+    def _copy_records(self, positions: np.ndarray, source: Tuple[BinaryIO, BinaryIO], metadata: BinaryIO,
+                      offsets: BinaryIO, start: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Append the metadata lines of rows at positions to the given files, yielding (new position, record)
+
+        source is the (metadata, offsets) pair of files to read them from.
+        """
+        source_metadata, source_offsets = source
+        for new_position, position in enumerate(positions.tolist(), start):
+            offset, length = self._read_offset(position, source_offsets)
+            source_metadata.seek(offset)
+            line = source_metadata.read(length)
+            offsets.write(self.OFFSET_ENTRY.pack(metadata.tell(), len(line)))
+            metadata.write(line)
+            yield new_position, json.loads(line)
+
+    def _build_compacted(self, keep: np.ndarray, ann_index, lexical: Optional[BM25Index]) -> Dict[str, List[int]]:
+        """Write the rows in keep, and the indexes over them, to the staging directory; returns their id map
+
+        Rows below the count compaction started from never change, so they
+        are read through separate file handles while the store stays in use.
+        """
+        staging = self._path(self.STAGING_DIR)
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        embeddings_path = os.path.join(staging, os.path.basename(self.vector_index.path))
+        self.vector_index.write_rows(keep, embeddings_path)
+
+        ids = {}
+        with open(self._path(self.METADATA_FILE), "rb") as source_metadata, \
+                open(self._path(self.OFFSETS_FILE), "rb") as source_offsets, \
+                open(os.path.join(staging, self.METADATA_FILE), "wb") as metadata, \
+                open(os.path.join(staging, self.OFFSETS_FILE), "wb") as offsets:
+            for new_position, record in self._copy_records(keep, (source_metadata, source_offsets), metadata, offsets):
+                ids.setdefault(record["id"], []).append(new_position)
+                if lexical is not None:
+                    lexical.add(new_position, lexical_text(record))
+
+        if ann_index is not None:
+            ann_index.vector_index = MemmapVectorIndex(embeddings_path, dim=self.dim, size=len(keep),
+                                                       dtype=TORCH_DTYPES[self.dtype])
+            ann_index.compact(keep)
+            ann_index.save(staging)
+        if lexical is not None:
+            lexical.save(staging, len(keep))
+        return ids
+
+    def _swap_compacted(self, keep: np.ndarray, built: int, ids: Dict[str, List[int]], ann_index,
+                        lexical: Optional[BM25Index]):
+        """Append the rows added since the build, tombstone the rows deleted since, and move the staged files in"""
+        staging = self._path(self.STAGING_DIR)
+        added = np.arange(built, self._count)
+        kept = np.concatenate([keep, added])
+        tombstones = self._tombstones[torch.from_numpy(kept)]
+
+        self.vector_index.write_rows(added, os.path.join(staging, os.path.basename(self.vector_index.path)), start=len(keep))
+        with open(os.path.join(staging, self.METADATA_FILE), "ab") as metadata, \
+                open(os.path.join(staging, self.OFFSETS_FILE), "ab") as offsets:
+            for new_position, record in self._copy_records(added, (self._metadata, self._offsets), metadata, offsets,
+                                                           start=len(keep)):
+                if tombstones[new_position]:
+                    continue
+                ids.setdefault(record["id"], []).append(new_position)
+                if lexical is not None:
+                    lexical.add(new_position, lexical_text(record))
+        for new_position in np.flatnonzero(tombstones[:len(keep)].numpy()).tolist():
+            record = self.get(int(keep[new_position]))
+            rows = ids.get(record["id"], [])
+            rows.remove(new_position)
+            if not rows:
+                ids.pop(record["id"], None)
+            if lexical is not None:
+                lexical.remove(new_position, lexical_text(record))
+
+        self.vector_index.replace_file(os.path.join(staging, os.path.basename(self.vector_index.path)), len(kept))
+        self._metadata.close()
+        self._offsets.close()
+        # A checkpoint during the build may have saved the live index in the old layout
+        if ann_index is not None:
+            ann_index.discard(self.directory)
+        for name in os.listdir(staging):
+            os.replace(os.path.join(staging, name), self._path(name))
+        os.rmdir(staging)
+        if lexical is None:
+            BM25Index.discard(self.directory)
+
+        self._count = len(kept)
+        self._tombstones = torch.zeros(max(1024, self._count), dtype=torch.bool)
+        self._tombstones[:self._count] = tombstones
+        self._tombstone_file.seek(0)
+        self._tombstone_file.write(tombstones.numpy().astype(np.uint8).tobytes())
+        self._tombstone_file.truncate(self._count)
+        self._tombstone_file.flush()
+        self._deleted = int(tombstones.sum())
+        self._changes += 1
+        self._generation += 1
+        self._ids = ids
+        self._columns = None
+        self._write_header()
+        self._open_metadata()
+        if ann_index is not None:
+            ann_index.vector_index = self.vector_index
+            if len(added):
+                ann_index.add(list(range(len(keep), self._count)))
+        self.ann_index = ann_index
+        self._lexical = lexical
+        self._lexical_rows = self._count if lexical is not None else 0
+        self._mark_saved()
+        # Readers must not pair the old snapshot's counts with the compacted files
+        if os.path.exists(self._path(self.SNAPSHOT_FILE)):
+            self._write_snapshot()
+
+    def _metadata_columns(self) -> MetadataColumns:
+        """The metadata columns, built by one scan on first use"""
+        with self._lock:
+            if self._columns is None:
+                columns = MetadataColumns(max(1024, self._count))
+                for position in range(self._count):
+                    columns.add(position, self.get(position))
+                self._columns = columns
+            return self._columns
+
+    def filter_candidates(self, search_filter: Optional[SearchFilter]) -> Optional[torch.Tensor]:
+        """Positions of the live rows passing the filter (None when nothing is filtered)"""
+        if search_filter is None or search_filter.is_empty:
+            return None
+        with self._lock:
+            allowed = self._metadata_columns().mask(search_filter, self._count)
+            allowed &= ~self._tombstones[:self._count]
+            return torch.nonzero(allowed).flatten()
+
+    def search_positions(self, query_embedding: torch.Tensor, top_k: int = 3, candidates: Optional[torch.Tensor] = None,
+                         **search_params) -> Tuple[List[int], List[float]]:
+        """Return positions and scores of the top_k most similar live rows
+
+        With candidates only those positions are scored, whichever index is used.
+        """
+        with self._lock:
+            exclude = self._tombstones[:self._count] if self._deleted else None
+            if self.ann_index is not None:
+                return self.ann_index.search(query_embedding, top_k=top_k, exclude=exclude, candidates=candidates, **search_params)
+            return self.vector_index.search(query_embedding, top_k=top_k, exclude=exclude, candidates=candidates)
+
+    def _best_documents(self, ranked: Callable[[int], Tuple[List[int], List[float]]], top_k: int,
+                        available: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Collapse a row ranking into its top_k documents, each scored by its best chunk
+
+        ranked(fetch) returns the best fetch rows; fetch grows until top_k
+        distinct documents are found or available rows are exhausted.
+        """
+        fetch = top_k
+        while True:
+            positions, scores = ranked(fetch)
+            best = {}
+            for position, score in zip(positions, scores):
+                record = self.get(position)
+                if record["id"] not in best:
+                    best[record["id"]] = (record, score)
+                    if len(best) == top_k:
+                        return list(best.values())
+            if len(positions) < fetch or fetch >= available:
+                return list(best.values())
+            fetch *= 4
+
+    def search(self, query_embedding: torch.Tensor, top_k: int = 3, search_filter: Optional[SearchFilter] = None,
+               **search_params) -> List[Tuple[Dict[str, Any], float]]:
+        """Return (record, similarity) pairs for the top_k most similar documents
+
+        A document scores as its best chunk (max-sim) and is returned with that
+        chunk's record. Rows are fetched in growing batches until top_k distinct
+        documents are found or the store is exhausted. A search_filter is turned
+        into a candidate set up front, so rows it excludes are never scored.
+        """
+        if top_k <= 0:
+            return []
+        with self._lock:
+            candidates = self.filter_candidates(search_filter)
+            return self._vector_documents(query_embedding, top_k, candidates, **search_params)
+
+    def _vector_documents(self, query_embedding: torch.Tensor, top_k: int, candidates: Optional[torch.Tensor],
+                          **search_params) -> List[Tuple[Dict[str, Any], float]]:
+        available = len(self) if candidates is None else len(candidates)
+        return self._best_documents(
+            lambda fetch: self.search_positions(query_embedding, top_k=fetch, candidates=candidates, **search_params),
+            top_k, available
+        )
+
+    def _lexical_index(self) -> BM25Index:
+        """The BM25 index, loaded from disk or built by one scan on first use
+
+        Rows added after the saved index was written are indexed here.
+        """
+        with self._lock:
+            if self._lexical is None:
+                self._lexical = BM25Index()
+                self._lexical_rows = self._lexical.load(self.directory, self._count) or 0
+            for position in range(self._lexical_rows, self._count):
+                if not self._tombstones[position]:
+                    self._lexical.add(position, lexical_text(self.get(position)))
+            self._lexical_rows = self._count
+            return self._lexical
+
+    def lexical_search_positions(self, query: str, top_k: int = 3,
+                                 candidates: Optional[torch.Tensor] = None) -> Tuple[List[int], List[float]]:
+        """Return positions and BM25 scores of the top_k live rows matching the query's keywords"""
+        with self._lock:
+            if candidates is None:
+                allowed = ~self._tombstones[:self._count].numpy()
+            else:
+                allowed = np.zeros(self._count, dtype=bool)
+                allowed[candidates.numpy()] = True
+            return self._lexical_index().search(query, top_k=top_k, allowed=allowed)
+
+    def _lexical_documents(self, query: str, top_k: int,
+                           candidates: Optional[torch.Tensor]) -> List[Tuple[Dict[str, Any], float]]:
+        available = len(self._lexical_index()) if candidates is None else len(candidates)
+        return self._best_documents(
+            lambda fetch: self.lexical_search_positions(query, top_k=fetch, candidates=candidates),
+            top_k, available
+        )
+
+    def lexical_search(self, query: str, top_k: int = 3,
+                       search_filter: Optional[SearchFilter] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Return (record, BM25 score) pairs for the top_k documents by keyword match"""
+        if top_k <= 0:
+            return []
+        with self._lock:
+            return self._lexical_documents(query, top_k, self.filter_candidates(search_filter))
+
+    def hybrid_search(self, query: str, query_embedding: torch.Tensor, top_k: int = 3,
+                      search_filter: Optional[SearchFilter] = None, depth: int = 50, rrf_k: int = 60,
+                      **search_params) -> List[Tuple[Dict[str, Any], float]]:
+        """Fuse the vector and keyword rankings of the top depth documents with reciprocal rank fusion
+
+        Scores are fused RRF scores. Each document is returned with the chunk
+        from whichever ranking placed it higher.
+        """
+        if top_k <= 0:
+            return []
+        with self._lock:
+            candidates = self.filter_candidates(search_filter)
+            depth = max(depth, top_k)
+            rankings = [
+                self._vector_documents(query_embedding, depth, candidates, **search_params),
+                self._lexical_documents(query, depth, candidates)
+            ]
+
+        chunks = {}
+        for ranking in rankings:
+            for rank, (record, _) in enumerate(ranking):
+                if record["id"] not in chunks or rank < chunks[record["id"]][0]:
+                    chunks[record["id"]] = (rank, record)
+        fused = reciprocal_rank_fusion([[record["id"] for record, _ in ranking] for ranking in rankings], k=rrf_k)
+        return [(chunks[doc_id][1], score) for doc_id, score in fused[:top_k]]
+
+    def flush(self):
+        """Flush embeddings and metadata to disk"""
+        if self.read_only:
+            return
+        with self._lock:
+            self.vector_index.flush()
+            if self.ann_index is not None:
+                self.ann_index.save(self.directory)
+            if self._lexical is not None:
+                self._lexical.save(self.directory, self._count)
+            self._metadata.flush()
+            self._offsets.flush()
+            self._tombstone_file.flush()
+            os.fsync(self._metadata.fileno())
+            os.fsync(self._offsets.fileno())
+            os.fsync(self._tombstone_file.fileno())
+            # Also commits ids allocated since the last add
+            self._write_header()
+            self._mark_saved()
+
+    def _mark_saved(self):
+        self._saved_changes, self._saved_count, self._saved_at = self._changes, self._count, time.monotonic()
+
+    def checkpoint(self, max_rows: int, max_age: float) -> bool:
+        """Flush, saving the ANN and BM25 indexes, once enough changed since the last save
+
+        Saving serializes whole indexes, so it waits until max_rows rows were
+        added since, or max_age seconds passed with unsaved changes. The BM25
+        index is built first if needed, so readers can load it rather than
+        each scanning the store. Returns whether it flushed.
+        """
+        self._check_writable()
+        with self._lock:
+            if self._changes == self._saved_changes:
+                return False
+            if self._count - self._saved_count < max_rows and time.monotonic() - self._saved_at < max_age:
+                return False
+            self._lexical_index()
+            self.flush()
+            return True
+
+    @classmethod
+    def read_snapshot(cls, directory: str) -> Optional[Dict[str, Any]]:
+        """The last published snapshot ({"version", "count", "documents", "generation", "published_at"}), if any"""
+        try:
+            with open(os.path.join(directory, cls.SNAPSHOT_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def publish_snapshot(self) -> int:
+        """Atomically record the committed rows as a new snapshot; returns its version
+
+        Rows, offsets and tombstones reach the files as they are written, so
+        this does not flush; the indexes are persisted by checkpoint().
+        """
+        self._check_writable()
+        with self._lock, self._file_lock(exclusive=True):
+            self._write_snapshot()
+            return self.snapshot_version
+
+    def _write_snapshot(self):
+        previous = self.read_snapshot(self.directory)
+        self.snapshot_version = (previous["version"] if previous else 0) + 1
+        tmp_path = self._path(self.SNAPSHOT_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": self.snapshot_version, "count": self._count, "documents": self._documents,
+                       "generation": self._generation, "published_at": time.time()}, f)
+        os.replace(tmp_path, self._path(self.SNAPSHOT_FILE))
+
+    def refresh(self) -> bool:
+        """Move a read-only store forward to the latest published snapshot in place
+
+        Between compactions the files only grow and positions are stable, so
+        only the rows appended since the served snapshot are mapped and
+        indexed, and the tombstone bytes are re-read for rows deleted since.
+        Returns False when a compaction renumbered the rows (its generation
+        changed); the store must then be reopened.
+        """
+        if not self.read_only:
+            raise RuntimeError("Only a read-only document store follows snapshots")
+        with self._lock, self._file_lock(exclusive=False):
+            snapshot = self.read_snapshot(self.directory)
+            if snapshot is None or snapshot["version"] == self.snapshot_version:
+                return True
+            if snapshot.get("generation", 0) != self._generation or snapshot["count"] < self._count:
+                return False
+
+            previous, count = self._count, snapshot["count"]
+            self.vector_index.follow(count)
+            flags = np.fromfile(self._path(self.TOMBSTONES_FILE), dtype=np.uint8, count=count)
+            tombstones = torch.zeros(max(1024, count), dtype=torch.bool)
+            tombstones[:len(flags)] = torch.from_numpy(flags.astype(bool))
+            deleted = np.flatnonzero((tombstones[:previous] & ~self._tombstones[:previous]).numpy()).tolist()
+
+            for position in deleted:
+                record = self.get(position)
+                if self._ids is not None:
+                    rows = self._ids.get(record["id"], [])
+                    if position in rows:
+                        rows.remove(position)
+                    if not rows:
+                        self._ids.pop(record["id"], None)
+                if self._lexical is not None and position < self._lexical_rows:
+                    self._lexical.remove(position, lexical_text(record))
+
+            self._count, self._documents = count, snapshot["documents"]
+            self._tombstones = tombstones
+            self._deleted = int(tombstones.sum())
+            if count:
+                offset, length = self._read_offset(count - 1)
+                self._metadata_end = offset + length
+            if self._ids is not None or self._columns is not None:
+                for position in range(previous, count):
+                    record = self.get(position)
+                    if self._ids is not None and not tombstones[position]:
+                        self._ids.setdefault(record["id"], []).append(position)
+                    if self._columns is not None:
+                        self._columns.add(position, record)
+            if self.ann_index is not None and count > previous:
+                self.ann_index.add(list(range(previous, count)))
+            if self._lexical is not None:
+                self._lexical_index()
+            self.snapshot_version = snapshot["version"]
+            return True
+
+    def close(self):
+        """Wait for a running compaction, then flush and release the underlying files"""
+        if self._compactor is not None:
+            self._compactor.join()
+        self.flush()
+        self._metadata.close()
+        self._offsets.close()
+        self._tombstone_file.close()
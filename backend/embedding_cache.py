@@ -0,0 +1,98 @@
+"""
+Embedding Cache Module
+Bounded LRU cache for query embeddings keyed on model id and normalized text
+"""
+
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import torch
+
+class EmbeddingCache:
+    """LRU cache evicting by entry count and by total tensor memory"""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], torch.Tensor]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Canonical form of a query: NFKC, lower case, collapsed whitespace
+
+        CLIP's tokenizer lower-cases and cleans whitespace itself, so queries
+        that differ only in these ways produce the same embedding.
+        """
+        return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+    @staticmethod
+    def _entry_bytes(key: Tuple[str, str], embedding: torch.Tensor) -> int:
+        return embedding.numel() * embedding.element_size() + len(key[1])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, model_id: str, text: str, record: bool = True) -> Optional[torch.Tensor]:
+        """Return the cached embedding and mark it most recently used
+
+        record=False skips the hit/miss counters, for internal re-checks of a
+        lookup that was already counted.
+        """
+        key = (model_id, self.normalize_text(text))
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                if record:
+                    self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if record:
+                self.hits += 1
+            return embedding
+
+    def put(self, model_id: str, text: str, embedding: torch.Tensor):
+        """Cache an embedding, evicting least recently used entries over the limits"""
+        key = (model_id, self.normalize_text(text))
+        # Clone so the cache does not pin the storage of a whole batch output
+        embedding = embedding.detach().clone()
+        size = self._entry_bytes(key, embedding)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._entry_bytes(key, previous)
+
+            self._entries[key] = embedding
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._entry_bytes(evicted_key, evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current occupancy"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,228 @@
+"""
+Inference Engine Module
+Shared model loading and forward passes: inference_mode, precision, thread
+configuration and optional traced / compiled CLIP encoders with cached artifacts
+"""
+
+import os
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+import torch
+from torch import nn
+from transformers import CLIPProcessor, CLIPModel, Speech2TextProcessor, Speech2TextForConditionalGeneration
+import logging
+from model_precision import apply_precision, autocast, resolve_precision
+import config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# eager: plain PyTorch; trace: TorchScript-traced CLIP encoders saved to the
+# cache directory; compile: torch.compile with inductor's on-disk graph cache
+COMPILE_MODES = ("eager", "trace", "compile")
+
+def configure_threads(intra_op_threads: int = 0, inter_op_threads: int = 0):
+    """Set torch's process-wide thread pools; 0 keeps torch's default"""
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            # Only allowed before the first inter-op parallel work
+            logger.warning(f"Could not set inter-op threads: {e}")
+
+class _TextEncoder(nn.Module):
+    def __init__(self, model: CLIPModel):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self.model.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+class _ImageEncoder(nn.Module):
+    def __init__(self, model: CLIPModel):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values: torch.Tensor) -> torch.Tensor:
+        return self.model.get_image_features(pixel_values=pixel_values)
+
+class CompiledCLIP:
+    """Stand-in for a CLIPModel whose text and image encoders run traced or compiled
+
+    Compiled graphs are specialized to input shapes, so text is padded to the
+    full context length and batches up to the next of batch_sizes (larger
+    batches run in chunks of the largest); outputs are sliced back. Padding
+    positions are masked, and CLIP pools at the first end-of-text token, so
+    results match eager inference.
+
+    In trace mode each (encoder, shape) graph is saved under cache_dir keyed
+    on the model, precision and torch version, and later processes load it
+    instead of tracing again. Other attributes are forwarded to the model.
+    """
+
+    def __init__(self, model: CLIPModel, mode: str, cache_dir: str, model_id: str, precision: str,
+                 batch_sizes: Sequence[int] = (1, 8, 32)):
+        self.model = model
+        self.mode = mode
+        self.cache_dir = cache_dir
+        self.precision = precision
+        self.batch_sizes = sorted(set(batch_sizes))
+        self.context_length = model.config.text_config.max_position_embeddings
+        self.image_size = model.config.vision_config.image_size
+        self._tag = f"{os.path.basename(model_id.rstrip('/'))}-{hashlib.sha1(model_id.encode()).hexdigest()[:8]}-{precision}"
+        self._encoders: Dict[Tuple[str, int], Callable[..., torch.Tensor]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def _artifact_path(self, kind: str, batch: int) -> str:
+        version = torch.__version__.replace("+", "_")
+        return os.path.join(self.cache_dir, f"clip-{kind}-{self._tag}-b{batch}-torch{version}.pt")
+
+    def _build(self, kind: str, batch: int) -> Callable[..., torch.Tensor]:
+        module = _TextEncoder(self.model) if kind == "text" else _ImageEncoder(self.model)
+        example = self._example(kind, batch)
+        if self.mode == "compile":
+            compiled = torch.compile(module, dynamic=False)
+            compiled(*example)
+            return compiled
+
+        path = self._artifact_path(kind, batch)
+        if os.path.exists(path):
+            try:
+                return torch.jit.load(path)
+            except Exception as e:
+                logger.warning(f"Could not load traced encoder {path}, tracing again: {e}")
+        traced = torch.jit.trace(module, example, check_trace=False)
+        tmp_path = path + ".tmp"
+        torch.jit.save(traced, tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"Traced CLIP {kind} encoder for batch {batch} -> {path}")
+        return traced
+
+    def _example(self, kind: str, batch: int) -> Tuple[torch.Tensor, ...]:
+        if kind == "text":
+            return (torch.zeros(batch, self.context_length, dtype=torch.long),
+                    torch.ones(batch, self.context_length, dtype=torch.long))
+        return (torch.zeros(batch, 3, self.image_size, self.image_size),)
+
+    def _encoder(self, kind: str, batch: int) -> Callable[..., torch.Tensor]:
+        with self._lock:
+            key = (kind, batch)
+            if key not in self._encoders:
+                try:
+                    # Built under the precision the encoder is served at
+                    with torch.inference_mode(), autocast(self.precision):
+                        self._encoders[key] = self._build(kind, batch)
+                except Exception as e:
+                    logger.warning(f"Compiling the CLIP {kind} encoder failed, running it eagerly: {e}")
+                    self._encoders[key] = _TextEncoder(self.model) if kind == "text" else _ImageEncoder(self.model)
+            return self._encoders[key]
+
+    def prepare(self):
+        """Build (or load) every encoder graph now rather than on first use"""
+        for kind in ("text", "image"):
+            for batch in self.batch_sizes:
+                self._encoder(kind, batch)
+
+    def _run(self, kind: str, inputs: Tuple[torch.Tensor, ...]) -> torch.Tensor:
+        count = inputs[0].shape[0]
+        largest = self.batch_sizes[-1]
+        outputs = []
+        for start in range(0, count, largest):
+            part = [tensor[start:start + largest] for tensor in inputs]
+            size = part[0].shape[0]
+            bucket = next(batch for batch in self.batch_sizes if batch >= size)
+            if bucket > size:
+                part = [torch.cat([tensor, tensor.new_zeros((bucket - size, *tensor.shape[1:]))]) for tensor in part]
+            outputs.append(self._encoder(kind, bucket)(*part)[:size])
+        return torch.cat(outputs)
+
+    def get_text_features(self, input_ids: torch.Tensor, attention_mask: Optional[torch.Tensor] = None, **_) -> torch.Tensor:
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        padding = self.context_length - input_ids.shape[1]
+        if padding > 0:
+            input_ids = nn.functional.pad(input_ids, (0, padding))
+            attention_mask = nn.functional.pad(attention_mask, (0, padding))
+        return self._run("text", (input_ids, attention_mask))
+
+    def get_image_features(self, pixel_values: torch.Tensor, **_) -> torch.Tensor:
+        return self._run("image", (pixel_values,))
+
+class InferenceEngine:
+    """Loads models at one precision and runs every forward pass under inference_mode
+
+    Used by both the API (through AIModelsManager) and main.py, so neither
+    builds autograd graphs. With compile_mode "trace" or "compile" the CLIP
+    encoders are wrapped in CompiledCLIP; Speech2Text generation stays eager.
+    """
+
+    def __init__(self, precision: str = "fp32", compile_mode: str = "eager", cache_dir: Optional[str] = None,
+                 batch_sizes: Sequence[int] = (1, 8, 32)):
+        if compile_mode not in COMPILE_MODES:
+            raise ValueError(f"Unknown compile mode: {compile_mode} (expected one of {', '.join(COMPILE_MODES)})")
+        self.precision = resolve_precision(precision)
+        if compile_mode == "trace" and self.precision == "bf16":
+            logger.warning("Tracing does not support bf16 autocast; CLIP runs eagerly")
+            compile_mode = "eager"
+        self.compile_mode = compile_mode
+        self.cache_dir = cache_dir or os.path.join(os.getcwd(), "compiled")
+        self.batch_sizes = batch_sizes
+
+        if compile_mode == "compile":
+            # Inductor reuses compiled kernels from this directory across processes
+            os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(self.cache_dir, "inductor"))
+            try:
+                import torch._inductor.config as inductor_config
+                inductor_config.fx_graph_cache = True
+            except (ImportError, AttributeError):
+                pass
+
+    @contextmanager
+    def context(self) -> Iterator[None]:
+        """No autograd tracking, plus autocast when running in bf16"""
+        with torch.inference_mode(), autocast(self.precision):
+            yield
+
+    def load_clip(self, name: str) -> Tuple[Any, CLIPProcessor]:
+        model = apply_precision(CLIPModel.from_pretrained(name), self.precision)
+        if self.compile_mode != "eager":
+            model = CompiledCLIP(model, self.compile_mode, self.cache_dir, name, self.precision, self.batch_sizes)
+        return model, CLIPProcessor.from_pretrained(name)
+
+    def load_speech(self, name: str) -> Tuple[Speech2TextForConditionalGeneration, Speech2TextProcessor]:
+        model = apply_precision(Speech2TextForConditionalGeneration.from_pretrained(name), self.precision)
+        return model, Speech2TextProcessor.from_pretrained(name)
+
+    def text_features(self, clip_model, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        with self.context():
+            features = clip_model.get_text_features(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+        # Cloned outside inference mode so callers may modify the result in place
+        return features.float().clone()
+
+    def image_features(self, clip_model, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        with self.context():
+            features = clip_model.get_image_features(pixel_values=inputs["pixel_values"])
+        return features.float().clone()
+
+    def generate(self, speech_model, inputs: Dict[str, torch.Tensor], **kwargs) -> torch.Tensor:
+        with self.context():
+            return speech_model.generate(inputs["input_features"], attention_mask=inputs["attention_mask"], **kwargs)
+
+# Global instance
+engine = InferenceEngine(
+    precision=config.MODEL_PRECISION,
+    compile_mode=config.COMPILE_MODE,
+    cache_dir=config.COMPILE_CACHE_DIR,
+    batch_sizes=config.COMPILE_BATCH_SIZES
+)
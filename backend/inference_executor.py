@@ -0,0 +1,55 @@
+"""
+Inference Executor Module
+Runs blocking model and decoding work off the asyncio event loop
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import logging
+from inference_engine import configure_threads
+from profiling import profiled_call
+import config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class InferenceExecutor:
+    """Dedicated thread pool for model forwards, audio/image decoding and search
+
+    PyTorch releases the GIL inside its kernels, so a small pool of threads
+    keeps heavy work off the event loop without duplicating models per process.
+    intra_op_threads bounds torch's per-operation parallelism so that
+    workers * intra_op_threads does not oversubscribe the CPU.
+    """
+
+    def __init__(self, max_workers: int = 2, intra_op_threads: Optional[int] = None, inter_op_threads: int = 0):
+        self.max_workers = max(1, max_workers)
+        self.intra_op_threads = intra_op_threads or max(1, (os.cpu_count() or 1) // self.max_workers)
+
+        # Thread pools are process-wide; set them once before any work runs
+        configure_threads(self.intra_op_threads, inter_op_threads)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        logger.info(f"Inference executor: {self.max_workers} workers x {self.intra_op_threads} torch threads")
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on the pool and await its result
+
+        The caller's context is carried over (as asyncio.to_thread does), so
+        work done on the pool is attributed to a profiled request.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, context.run, profiled_call, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and release the worker threads"""
+        self.executor.shutdown(wait=wait)
+
+# Global instance
+inference_executor = InferenceExecutor(config.INFERENCE_WORKERS, config.INFERENCE_TORCH_THREADS or None,
+                                       config.INFERENCE_INTEROP_THREADS)
@@ -0,0 +1,204 @@
+"""
+Job Queue Module
+Persistent SQLite-backed ingestion queue with a bounded pool of async workers
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+class JobQueue:
+    """Ingestion jobs stored in a local SQLite database
+
+    Each job points at an upload spooled to the payloads directory. Jobs
+    move queued -> running -> done | failed; jobs found running when the
+    queue is opened were interrupted by a restart and are queued again,
+    unless recover is False (a process that only submits jobs while another
+    runs them).
+    """
+
+    def __init__(self, directory: str, recover: bool = True):
+        self.directory = directory
+        self.payload_dir = os.path.join(directory, "payloads")
+        os.makedirs(self.payload_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "jobs.db"), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    modality TEXT NOT NULL,
+                    filename TEXT,
+                    content_type TEXT,
+                    payload_path TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            recovered = self._db.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'"
+            ).rowcount if recover else 0
+        if recovered:
+            logger.info(f"Re-queued {recovered} jobs interrupted by a restart")
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        del job["payload_path"]
+        return job
+
+    def new_payload_path(self, filename: Optional[str]) -> str:
+        """Path to spool an upload to before it is submitted"""
+        return os.path.join(self.payload_dir, uuid.uuid4().hex + os.path.splitext(filename or "")[1])
+
+    def submit(self, modality: str, filename: Optional[str], content_type: Optional[str], payload_path: str) -> Dict[str, Any]:
+        """Queue a spooled upload for ingestion"""
+        job_id = uuid.uuid4().hex
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO jobs (id, modality, filename, content_type, payload_path, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (job_id, modality, filename, content_type, payload_path, time.time())
+            )
+        return self.get(job_id)
+
+    def claim(self, limit: int) -> List[Dict[str, Any]]:
+        """Mark up to limit queued jobs running and return them (with payload paths)
+
+        The batch takes the modality of the oldest queued job, so one claim can
+        share encoder passes.
+        """
+        with self._lock, self._db:
+            oldest = self._db.execute(
+                "SELECT modality FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if oldest is None:
+                return []
+            rows = self._db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND modality = ? ORDER BY created_at LIMIT ?",
+                (oldest["modality"], limit)
+            ).fetchall()
+            now = time.time()
+            self._db.executemany(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                [(now, row["id"]) for row in rows]
+            )
+        return [{**dict(row), "status": "running", "started_at": now} for row in rows]
+
+    def finish(self, job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        """Record a job's outcome: done with a result, or failed with an error"""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                ("failed" if error else "done", json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent jobs first, optionally only those with the given status"""
+        with self._lock:
+            if status:
+                rows = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+                ).fetchall()
+            else:
+                rows = self._db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class JobWorkers:
+    """A fixed number of asyncio workers draining a JobQueue in modality batches
+
+    handler receives a list of claimed jobs (all of one modality) and returns
+    one (result, error) pair per job. Workers sleep until notify() is called
+    or poll_interval passes.
+    """
+
+    def __init__(self, queue: JobQueue,
+                 handler: Callable[[List[Dict[str, Any]]], Awaitable[List[tuple]]],
+                 workers: int = 2, batch_size: int = 16, poll_interval: float = 1.0):
+        self.queue = queue
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self._tasks = []
+        self._wakeup = None
+
+    def start(self):
+        """Start the worker tasks on the running event loop"""
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._work(n)) for n in range(self.workers)]
+        logger.info(f"Started {self.workers} ingestion workers")
+
+    def notify(self):
+        """Wake idle workers after a submit"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self):
+        """Cancel the workers; jobs they were running are re-queued on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self, worker: int):
+        while True:
+            jobs = self.queue.claim(self.batch_size)
+            if not jobs:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logger.info(f"Worker {worker} processing {len(jobs)} {jobs[0]['modality']} jobs")
+            try:
+                outcomes = await self.handler(jobs)
+            except Exception as e:
+                logger.error(f"Ingestion batch failed: {e}")
+                outcomes = [(None, str(e))] * len(jobs)
+
+            for job, (result, error) in zip(jobs, outcomes):
+                self.queue.finish(job["id"], result, error)
+                if os.path.exists(job["payload_path"]):
+                    os.remove(job["payload_path"])
@@ -0,0 +1,199 @@
+"""
+Lexical Index Module
+Incremental BM25 inverted index over stored text and transcriptions, plus rank fusion
+"""
+
+import os
+import re
+import math
+import heapq
+from collections import Counter
+from operator import itemgetter
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+import numpy as np
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; IDs such as "INV-2041" become ["inv", "2041"]"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+def lexical_text(record: Dict[str, Any]) -> str:
+    """The keyword-searchable text of a row: an audio transcription or text content"""
+    if "transcription" in record:
+        return record["transcription"] or ""
+    if record.get("modality") == "text":
+        return record.get("content") or ""
+    return ""
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Fuse several best-first rankings; each item scores sum(1 / (k + rank))"""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=itemgetter(1), reverse=True)
+
+class BM25Index:
+    """Inverted index from terms to the row positions containing them
+
+    Postings map term -> {position: term frequency}, so adding or removing a
+    row touches only that row's terms, and a query only reads the posting
+    lists of its own terms. Query terms are processed rarest first; once the
+    best score the remaining terms could still add is below the current k-th
+    best, rows not yet seen cannot reach the top k and the remaining
+    (common, long) posting lists are only probed for rows already scored.
+    """
+
+    STATE_FILE = "bm25_index.npz"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: Dict[int, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._postings)
+
+    def add(self, position: int, text: str):
+        """Index the text of a row; rows without any tokens are not indexed"""
+        terms = Counter(tokenize(text))
+        if not terms:
+            return
+        length = sum(terms.values())
+        self._lengths[position] = length
+        self._total_length += length
+        for term, frequency in terms.items():
+            self._postings.setdefault(term, {})[position] = frequency
+
+    def remove(self, position: int, text: str):
+        """Drop a row, given the same text it was indexed with"""
+        length = self._lengths.pop(position, None)
+        if length is None:
+            return
+        self._total_length -= length
+        for term in set(tokenize(text)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(position, None)
+            if not postings:
+                del self._postings[term]
+
+    def compact(self, keep: np.ndarray):
+        """Renumber positions after rows not in keep were dropped from the store"""
+        mapping = np.full(int(keep.max()) + 1 if len(keep) else 0, -1, dtype=np.int64)
+        mapping[keep] = np.arange(len(keep))
+
+        def moved(position: int) -> int:
+            return int(mapping[position]) if position < len(mapping) else -1
+
+        postings = {}
+        for term, entries in self._postings.items():
+            renumbered = {moved(position): frequency for position, frequency in entries.items()}
+            renumbered.pop(-1, None)
+            if renumbered:
+                postings[term] = renumbered
+        lengths = {moved(position): length for position, length in self._lengths.items()}
+        lengths.pop(-1, None)
+
+        self._postings = postings
+        self._lengths = lengths
+        self._total_length = sum(lengths.values())
+
+    def idf(self, term: str) -> float:
+        matching = len(self._postings.get(term, ()))
+        return math.log(1.0 + (len(self._lengths) - matching + 0.5) / (matching + 0.5))
+
+    def search(self, query: str, top_k: int = 10, allowed: Optional[np.ndarray] = None) -> Tuple[List[int], List[float]]:
+        """Return positions and BM25 scores of the top_k rows matching any query term
+
+        allowed, a bool array over positions, restricts which rows may match.
+        """
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term in self._postings]
+        if not terms or top_k <= 0:
+            return [], []
+
+        k1, b = self.k1, self.b
+        average_length = self._total_length / len(self._lengths)
+        weighted = sorted(((self.idf(term), term) for term in terms), reverse=True)
+        # A term adds at most idf * (k1 + 1), however often it occurs
+        remaining = [0.0] * (len(weighted) + 1)
+        for i in range(len(weighted) - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + weighted[i][0] * (k1 + 1)
+
+        scores: Dict[int, float] = {}
+        for i, (idf, term) in enumerate(weighted):
+            postings = self._postings[term]
+            if len(scores) >= top_k and remaining[i] < heapq.nlargest(top_k, scores.values())[-1]:
+                entries = ((position, postings.get(position)) for position in list(scores))
+            else:
+                entries = postings.items()
+
+            for position, frequency in entries:
+                if frequency is None or (allowed is not None and not allowed[position]):
+                    continue
+                norm = k1 * (1 - b + b * self._lengths[position] / average_length)
+                scores[position] = scores.get(position, 0.0) + idf * frequency * (k1 + 1) / (frequency + norm)
+
+        top = heapq.nlargest(top_k, scores.items(), key=itemgetter(1))
+        return [position for position, _ in top], [score for _, score in top]
+
+    def save(self, directory: str, count: int):
+        """Persist the postings as flat arrays, tagged with the store's row count"""
+        terms = list(self._postings)
+        sizes = np.fromiter((len(self._postings[term]) for term in terms), dtype=np.int64, count=len(terms))
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        positions = np.fromiter((p for term in terms for p in self._postings[term]), dtype=np.int64, count=int(offsets[-1]))
+        frequencies = np.fromiter((f for term in terms for f in self._postings[term].values()), dtype=np.int32,
+                                  count=int(offsets[-1]))
+
+        tmp_path = os.path.join(directory, "bm25_index.tmp.npz")
+        np.savez(tmp_path, count=count, terms=np.array(terms, dtype=str), offsets=offsets, positions=positions,
+                 frequencies=frequencies, rows=np.fromiter(self._lengths, dtype=np.int64, count=len(self._lengths)),
+                 lengths=np.fromiter(self._lengths.values(), dtype=np.int64, count=len(self._lengths)))
+        os.replace(tmp_path, os.path.join(directory, self.STATE_FILE))
+
+    def load(self, directory: str, count: int) -> Optional[int]:
+        """Restore a saved index, keeping only rows below the store's row count
+
+        Positions are stable between compactions (which save or discard the
+        index), so an index saved at another row count is still valid for the
+        rows both have. Returns how many leading rows the loaded index covers;
+        the caller adds the rest. None when nothing is saved.
+        """
+        path = os.path.join(directory, self.STATE_FILE)
+        if not os.path.exists(path):
+            return None
+
+        state = np.load(path)
+        covered = min(int(state["count"]), count)
+        offsets, positions, frequencies = state["offsets"], state["positions"].tolist(), state["frequencies"].tolist()
+        postings = {}
+        for i, term in enumerate(state["terms"].tolist()):
+            entries = {position: frequency for position, frequency
+                       in zip(positions[offsets[i]:offsets[i + 1]], frequencies[offsets[i]:offsets[i + 1]]) if position < covered}
+            if entries:
+                postings[term] = entries
+        self._postings = postings
+        self._lengths = {row: length for row, length in zip(state["rows"].tolist(), state["lengths"].tolist()) if row < covered}
+        self._total_length = sum(self._lengths.values())
+        return covered
+
+    @classmethod
+    def discard(cls, directory: str):
+        """Remove a saved index that no longer matches the store"""
+        path = os.path.join(directory, cls.STATE_FILE)
+        if os.path.exists(path):
+            os.remove(path)
@@ -1,19 +1,27 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 import torch
-from transformers import CLIPProcessor, CLIPModel, Speech2TextProcessor, Speech2TextForConditionalGeneration
 import numpy as np
 import io
 import wave
 from PIL import Image
-import base64
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import os
 import json
 from pydub import AudioSegment
 import tempfile
+from document_store import DocumentStore
+from blob_store import BlobStore
+from document_listing import InvalidCursor, json_page, ndjson_export, parse_fields, start_position
+from content_index import content_digest
+from model_lifecycle import ModelLifecycleManager
+from ai_models import warmup_clip, warmup_speech, MODALITY_MODELS
+from inference_engine import configure_threads, engine
+from text_chunker import chunk_text
+from audio_stream import AudioWindower, iter_pcm_blocks
+import config
 
 app = FastAPI(title="Multimodal RAG API", version="1.0.0")
 
@@ -26,15 +34,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variables for models
-clip_model = None
-clip_processor = None
-speech_model = None
-speech_processor = None
+# Models load in the background or on first use, and unload when idle; every
+# forward pass goes through the shared inference engine (inference_mode,
+# precision, optional compiled encoders)
+configure_threads(config.INFERENCE_TORCH_THREADS, config.INFERENCE_INTEROP_THREADS)
+models = ModelLifecycleManager(idle_ttl=config.MODEL_IDLE_TTL_S)
 
-# In-memory storage for documents and embeddings
-documents = []
-embeddings = []
+# Persistent storage for documents and embeddings
+document_store = DocumentStore(
+    config.DATA_DIR,
+    dim=config.EMBEDDING_DIM,
+    dtype=config.EMBEDDING_DTYPE,
+    ann_index=config.ANN_INDEX,
+    ann_params=config.ann_params(),
+    compact_ratio=config.COMPACT_RATIO,
+    compact_min_deleted=config.COMPACT_MIN_DELETED
+)
+
+# Raw uploads live in a content-addressed blob store; records only reference them
+blob_store = BlobStore(os.path.join(config.DATA_DIR, "blobs"))
 
 class QueryRequest(BaseModel):
     query: str
@@ -44,90 +62,125 @@ class DocumentResponse(BaseModel):
     content: str
     modality: str
     similarity_score: float
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
 
 class RAGResponse(BaseModel):
     answer: str
     relevant_documents: List[DocumentResponse]
 
+def load_clip():
+    """Load the CLIP model"""
+    return engine.load_clip("openai/clip-vit-base-patch32")
+
+def load_speech():
+    """Load the Speech-to-Text model"""
+    return engine.load_speech("facebook/s2t-medium-librispeech-asr")
+
+models.register("clip", load_clip, warmup_clip if config.MODEL_WARMUP else None)
+models.register("speech", load_speech, warmup_speech if config.MODEL_WARMUP else None)
+
 def load_models():
-    """Load CLIP and Speech-to-Text models"""
-    global clip_model, clip_processor, speech_model, speech_processor
+    """Load CLIP and Speech-to-Text models, blocking until both are ready"""
+    if models.load_all():
+        print("Models loaded successfully!")
+
+def process_audio(audio_file) -> List[Tuple[float, float, str]]:
+    """Convert audio to text using speech-to-text model, as (start, end, text) segments
     
-    print("Loading CLIP model...")
-    clip_model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-    clip_processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
+    The file is spooled to disk, decoded at 16000 Hz as a stream and cut into
+    overlapping windows that are transcribed in batches, so memory stays
+    bounded however long the recording is.
+    """
+    sampling_rate = 16000
+    segments = []
     
-    print("Loading Speech-to-Text model...")
-    speech_model = Speech2TextForConditionalGeneration.from_pretrained("facebook/s2t-medium-librispeech-asr")
-    speech_processor = Speech2TextProcessor.from_pretrained("facebook/s2t-medium-librispeech-asr")
+    def transcribe(windows):
+        with models.use("speech") as (speech_model, speech_processor):
+            inputs = speech_processor([window.samples for window in windows], sampling_rate=sampling_rate, return_tensors="pt", padding=True)
+            generated_ids = engine.generate(speech_model, inputs)
+            
+            # Decode to text
+            texts = speech_processor.batch_decode(generated_ids, skip_special_tokens=True)
+        segments.extend((window.start, window.end, text) for window, text in zip(windows, texts))
     
-    print("Models loaded successfully!")
-
-def process_audio(audio_file) -> str:
-    """Convert audio to text using speech-to-text model"""
     try:
-        # Read audio file
-        audio_data = audio_file.read()
+        # Spool the audio file to disk in chunks
+        with tempfile.NamedTemporaryFile(delete=False) as spooled:
+            for chunk in iter(lambda: audio_file.read(1024 * 1024), b""):
+                spooled.write(chunk)
         audio_file.seek(0)  # Reset file pointer
         
-        # Convert to AudioSegment
-        audio_segment = AudioSegment.from_file(io.BytesIO(audio_data))
+        try:
+            windower = AudioWindower(sampling_rate, config.AUDIO_WINDOW_S, config.AUDIO_WINDOW_OVERLAP_S)
+            pending = []
+            for block in iter_pcm_blocks(spooled.name, sampling_rate):
+                pending.extend(windower.feed(block))
+                while len(pending) >= config.AUDIO_BATCH_SIZE:
+                    transcribe(pending[:config.AUDIO_BATCH_SIZE])
+                    pending = pending[config.AUDIO_BATCH_SIZE:]
+            pending.extend(windower.finish())
+            for start in range(0, len(pending), config.AUDIO_BATCH_SIZE):
+                transcribe(pending[start:start + config.AUDIO_BATCH_SIZE])
+        finally:
+            os.remove(spooled.name)
         
-        # Downsample to 16000 Hz
-        sampling_rate = 16000
-        audio_segment = audio_segment.set_frame_rate(sampling_rate)
-        
-        # Convert to numpy array
-        audio_waveform = np.array(audio_segment.get_array_of_samples(), dtype=np.float32)
-        
-        # Process with speech-to-text model
-        inputs = speech_processor(audio_waveform, sampling_rate=sampling_rate, return_tensors="pt")
-        generated_ids = speech_model.generate(inputs["input_features"], attention_mask=inputs["attention_mask"])
-        
-        # Decode to text
-        transcription = speech_processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-        return transcription
+        return segments or [(0.0, 0.0, "")]
     except Exception as e:
         print(f"Error processing audio: {e}")
-        return "Error transcribing audio"
+        return [(0.0, 0.0, "Error transcribing audio")]
 
 def get_embeddings(texts: List[str], images: List[Image.Image] = None) -> torch.Tensor:
     """Get embeddings for texts and images using CLIP"""
     text_embeddings = None
     image_embeddings = None
     
-    if texts:
-        inputs = clip_processor(text=texts, return_tensors="pt", padding=True)
-        text_embeddings = clip_model.get_text_features(**inputs)
-    
-    if images:
-        inputs = clip_processor(images=images, return_tensors="pt")
-        image_embeddings = clip_model.get_image_features(**inputs)
+    with models.use("clip") as (clip_model, clip_processor):
+        if texts:
+            inputs = clip_processor(text=texts, return_tensors="pt", padding=True, truncation=True)
+            text_embeddings = engine.text_features(clip_model, inputs)
+        
+        if images:
+            inputs = clip_processor(images=images, return_tensors="pt")
+            image_embeddings = engine.image_features(clip_model, inputs)
     
     return text_embeddings, image_embeddings
 
-def calculate_similarity(query_embedding: torch.Tensor, doc_embeddings: torch.Tensor) -> List[float]:
-    """Calculate cosine similarity between query and document embeddings"""
-    from torch.nn.functional import cosine_similarity
-    
-    similarities = []
-    for i in range(doc_embeddings.shape[0]):
-        sim = cosine_similarity(
-            query_embedding.unsqueeze(0), 
-            doc_embeddings[i].unsqueeze(0)
-        ).item()
-        similarities.append(sim)
-    
-    return similarities
+def calculate_similarity(query_embedding: torch.Tensor, store: DocumentStore, top_k: int = 3) -> List[Tuple[Dict[str, Any], float]]:
+    """Calculate cosine similarity between the query and stored chunks, returning the top_k documents"""
+    return store.search(query_embedding, top_k=top_k)
+
+def chunk_document(text: str) -> List[Any]:
+    """Split a text into overlapping windows that fit CLIP's 77-token context"""
+    with models.use("clip") as (_, clip_processor):
+        return chunk_text(text, clip_processor.tokenizer, config.TEXT_CHUNK_TOKENS, config.TEXT_CHUNK_OVERLAP)
 
 @app.on_event("startup")
 async def startup_event():
-    load_models()
+    models.start(config.PRELOAD_MODELS)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    models.shutdown()
+    document_store.flush()
 
 @app.get("/")
 async def root():
     return {"message": "Multimodal RAG API is running!"}
 
+@app.get("/health")
+async def health_check():
+    """Per-modality model readiness"""
+    return {
+        "status": "healthy",
+        "documents_count": document_store.document_count,
+        "modalities": {
+            modality: all(models.is_ready(name) for name in names)
+            for modality, names in MODALITY_MODELS.items()
+        },
+        "models": models.status()
+    }
+
 @app.post("/upload/text")
 async def upload_text(file: UploadFile = File(...)):
     """Upload and process text document"""
@@ -135,20 +188,25 @@ async def upload_text(file: UploadFile = File(...)):
         content = await file.read()
         text_content = content.decode('utf-8')
         
-        # Get embedding
-        text_embeddings, _ = get_embeddings([text_content])
+        # Embed the document chunk by chunk, in batches
+        windows = chunk_document(text_content)
+        doc_id = document_store.allocate_id("text")
+        for start in range(0, len(windows), config.UPLOAD_BATCH_SIZE):
+            batch = windows[start:start + config.UPLOAD_BATCH_SIZE]
+            text_embeddings, _ = get_embeddings([window.text for window in batch])
+            
+            # Store the batch's chunks against the document
+            document_store.add_many([{
+                "id": doc_id,
+                "content": window.text,
+                "modality": "text",
+                "filename": file.filename,
+                "chunk": window.index,
+                "start": window.start,
+                "end": window.end
+            } for window in batch], text_embeddings)
         
-        # Store document
-        doc_id = f"text_{len(documents)}"
-        documents.append({
-            "id": doc_id,
-            "content": text_content,
-            "modality": "text",
-            "filename": file.filename
-        })
-        embeddings.append(text_embeddings[0])
-        
-        return {"message": "Text document uploaded successfully", "doc_id": doc_id}
+        return {"message": "Text document uploaded successfully", "doc_id": doc_id, "chunks": len(windows)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -162,16 +220,24 @@ async def upload_image(file: UploadFile = File(...)):
         # Get embedding
         _, image_embeddings = get_embeddings(texts=[], images=[image])
         
-        # Store document
-        doc_id = f"image_{len(documents)}"
-        documents.append({
-            "id": doc_id,
-            "content": f"Image: {file.filename}",
-            "modality": "image",
-            "filename": file.filename,
-            "image_data": base64.b64encode(content).decode()
-        })
-        embeddings.append(image_embeddings[0])
+        # Store the image bytes out of line, with a thumbnail for list views
+        digest = content_digest([content])
+        blob_store.add_bytes(digest, content)
+        try:
+            doc_id = document_store.allocate_id("image")
+            document_store.add({
+                "id": doc_id,
+                "content": f"Image: {file.filename}",
+                "modality": "image",
+                "filename": file.filename,
+                "mime_type": file.content_type,
+                "blob": digest,
+                "thumbnail": blob_store.save_thumbnail(digest, image)
+            }, image_embeddings[0])
+        except Exception:
+            # Only a stored document keeps its reference to the blob
+            blob_store.release(digest)
+            raise
         
         return {"message": "Image document uploaded successfully", "doc_id": doc_id}
     except Exception as e:
@@ -181,27 +247,30 @@ async def upload_image(file: UploadFile = File(...)):
 async def upload_audio(file: UploadFile = File(...)):
     """Upload and process audio document"""
     try:
-        # Transcribe audio
-        transcription = process_audio(file.file)
+        # Transcribe audio, window by window
+        segments = process_audio(file.file)
         
-        # Get embedding for transcription
-        text_embeddings, _ = get_embeddings([transcription])
+        # Get embedding for each segment's transcription
+        text_embeddings, _ = get_embeddings([text for _, _, text in segments])
         
-        # Store document
-        doc_id = f"audio_{len(documents)}"
-        documents.append({
+        # Store each segment against the document, with its timestamps
+        doc_id = document_store.allocate_id("audio")
+        document_store.add_many([{
             "id": doc_id,
-            "content": f"Audio transcription: {transcription}",
+            "content": f"Audio transcription: {text}",
             "modality": "audio",
             "filename": file.filename,
-            "transcription": transcription
-        })
-        embeddings.append(text_embeddings[0])
+            "transcription": text,
+            "chunk": index,
+            "start_time": round(start, 3),
+            "end_time": round(end, 3)
+        } for index, (start, end, text) in enumerate(segments)], text_embeddings)
         
         return {
             "message": "Audio document uploaded successfully", 
             "doc_id": doc_id,
-            "transcription": transcription
+            "transcription": " ".join(text for _, _, text in segments if text),
+            "segments": [{"start": round(start, 3), "end": round(end, 3), "text": text} for start, end, text in segments]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -210,7 +279,7 @@ async def upload_audio(file: UploadFile = File(...)):
 async def query_documents(request: QueryRequest):
     """Query documents using multimodal RAG"""
     try:
-        if not documents:
+        if not len(document_store):
             return RAGResponse(
                 answer="No documents available. Please upload some documents first.",
                 relevant_documents=[]
@@ -220,20 +289,16 @@ async def query_documents(request: QueryRequest):
         query_embeddings, _ = get_embeddings([request.query])
         query_embedding = query_embeddings[0]
         
-        # Calculate similarities
-        doc_embeddings = torch.stack(embeddings)
-        similarities = calculate_similarity(query_embedding, doc_embeddings)
-        
-        # Get top 3 most similar documents
-        top_indices = sorted(range(len(similarities)), key=lambda i: similarities[i], reverse=True)[:3]
-        
+        # Calculate similarities and keep the top 3 most similar documents
         relevant_docs = []
-        for idx in top_indices:
+        for doc, score in calculate_similarity(query_embedding, document_store, top_k=3):
             relevant_docs.append(DocumentResponse(
-                id=documents[idx]["id"],
-                content=documents[idx]["content"],
-                modality=documents[idx]["modality"],
-                similarity_score=similarities[idx]
+                id=doc["id"],
+                content=doc["content"],
+                modality=doc["modality"],
+                similarity_score=score,
+                start_time=doc.get("start_time"),
+                end_time=doc.get("end_time")
             ))
         
         # Simple RAG response (in a real system, you'd use a proper LLM)
@@ -251,20 +316,40 @@ async def query_documents(request: QueryRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/documents")
-async def get_documents():
-    """Get all uploaded documents"""
-    return {"documents": documents}
+async def get_documents(limit: int = 100, cursor: Optional[str] = None, fields: Optional[str] = None, format: str = "json"):
+    """List documents a page at a time (format=ndjson exports all of them)"""
+    try:
+        start = start_position(document_store, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    selected = parse_fields(fields)
+    if format == "ndjson":
+        return StreamingResponse(ndjson_export(document_store, start, selected), media_type="application/x-ndjson")
+    return StreamingResponse(json_page(document_store, start, max(1, min(limit, 1000)), selected), media_type="application/json")
+
+@app.get("/documents/{doc_id}/blob")
+async def get_document_blob(doc_id: str):
+    """Stream a document's original upload (supports Range requests)"""
+    position = document_store.find(doc_id)
+    record = document_store.get(position) if position is not None else {}
+    if not record.get("blob") or not blob_store.exists(record["blob"]):
+        raise HTTPException(status_code=404, detail="Document has no stored upload")
+    return FileResponse(blob_store.path(record["blob"]), media_type=record.get("mime_type"), filename=record.get("filename"))
 
 @app.delete("/documents/{doc_id}")
 async def delete_document(doc_id: str):
     """Delete a specific document"""
     try:
-        for i, doc in enumerate(documents):
-            if doc["id"] == doc_id:
-                documents.pop(i)
-                embeddings.pop(i)
-                return {"message": f"Document {doc_id} deleted successfully"}
+        position = document_store.find(doc_id)
+        record = document_store.get(position) if position is not None else {}
+        if document_store.delete_document(doc_id):
+            if record.get("blob"):
+                blob_store.release(record["blob"])
+            return {"message": f"Document {doc_id} deleted successfully"}
         raise HTTPException(status_code=404, detail="Document not found")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,208 @@
+"""
+Model Lifecycle Module
+Background and on-demand model loading, warmup and idle unloading
+"""
+
+import gc
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ManagedModel:
+    """One lazily loaded model: loader() builds it, warmup(model) primes it
+
+    States move unloaded -> loading -> ready, or to failed if the loader or
+    warmup raises; a failed model is retried on the first use after
+    retry_interval seconds, and uses before that fail fast. Callers hold the
+    model through use(), and a model in use is never unloaded.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None,
+                 idle_ttl: float = 0.0, retry_interval: float = 30.0):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.idle_ttl = idle_ttl
+        self.retry_interval = retry_interval
+
+        self.state = "unloaded"
+        self.model = None
+        self.error = None
+        self.load_seconds = None
+        self.last_used = None
+        self.failed_at = None
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    def _begin_load(self) -> bool:
+        """Claim the load if nobody else is loading; call with the condition held"""
+        if self.state in ("loading", "ready"):
+            return False
+        if self.state == "failed" and time.monotonic() - self.failed_at < self.retry_interval:
+            return False
+        self.state = "loading"
+        self.error = None
+        return True
+
+    def _load(self):
+        logger.info(f"Loading {self.name} model...")
+        started = time.perf_counter()
+        try:
+            model = self.loader()
+            if self.warmup is not None:
+                self.warmup(model)
+        except Exception as e:
+            logger.error(f"Error loading {self.name} model: {e}")
+            with self._condition:
+                self.state = "failed"
+                self.error = str(e)
+                self.failed_at = time.monotonic()
+                self._condition.notify_all()
+            return
+
+        with self._condition:
+            self.model = model
+            self.state = "ready"
+            self.load_seconds = time.perf_counter() - started
+            self.last_used = time.monotonic()
+            self._condition.notify_all()
+        logger.info(f"{self.name} model ready in {self.load_seconds:.1f}s")
+
+    def load_in_background(self):
+        """Start loading on a daemon thread unless already loading or loaded"""
+        with self._condition:
+            if not self._begin_load():
+                return
+        threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True).start()
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        """Load the model if needed (on this thread), wait until ready and pin it"""
+        with self._condition:
+            load_here = self._begin_load()
+        if load_here:
+            self._load()
+
+        with self._condition:
+            self._condition.wait_for(lambda: self.state != "loading", timeout)
+            if self.state != "ready":
+                raise RuntimeError(f"Model {self.name} is not available: {self.error or self.state}")
+            self._in_use += 1
+            self.last_used = time.monotonic()
+            return self.model
+
+    def release(self):
+        with self._condition:
+            self._in_use -= 1
+            self.last_used = time.monotonic()
+
+    @contextmanager
+    def use(self, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Context manager yielding the loaded model"""
+        model = self.acquire(timeout)
+        try:
+            yield model
+        finally:
+            self.release()
+
+    def unload(self, idle_for: float = 0.0) -> bool:
+        """Drop the model if it is not in use and has been idle for idle_for seconds"""
+        with self._condition:
+            if self.state != "ready" or self._in_use:
+                return False
+            if time.monotonic() - self.last_used < idle_for:
+                return False
+            self.model = None
+            self.state = "unloaded"
+
+        gc.collect()
+        logger.info(f"Unloaded {self.name} model")
+        return True
+
+    def status(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "state": self.state,
+                "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+                "idle_seconds": round(time.monotonic() - self.last_used, 1) if self.last_used is not None else None,
+                "in_use": self._in_use,
+                "error": self.error,
+            }
+
+class ModelLifecycleManager:
+    """Registry of managed models with a reaper that unloads idle ones
+
+    With idle_ttl > 0, start() launches a daemon thread that unloads any model
+    unused for idle_ttl seconds; the next use loads it again.
+    """
+
+    def __init__(self, idle_ttl: float = 0.0, retry_interval: float = 30.0):
+        self.idle_ttl = idle_ttl
+        self.retry_interval = retry_interval
+        self.models: Dict[str, ManagedModel] = {}
+        self._stop = threading.Event()
+        self._reaper = None
+
+    def register(self, name: str, loader: Callable[[], Any], warmup: Optional[Callable[[Any], None]] = None) -> ManagedModel:
+        self.models[name] = ManagedModel(name, loader, warmup, self.idle_ttl, self.retry_interval)
+        return self.models[name]
+
+    def use(self, name: str, timeout: Optional[float] = None):
+        """Context manager yielding the named model, loading it on demand"""
+        return self.models[name].use(timeout)
+
+    def is_ready(self, name: str) -> bool:
+        return self.models[name].is_ready
+
+    def load_all(self) -> bool:
+        """Load every registered model on the calling thread"""
+        for model in self.models.values():
+            try:
+                model.acquire()
+                model.release()
+            except RuntimeError:
+                return False
+        return True
+
+    def start(self, preload: Iterable[str] = ()):
+        """Begin background loads of the preload models and start the idle reaper"""
+        for name in preload:
+            if name not in self.models:
+                logger.warning(f"Unknown model '{name}' in preload list")
+                continue
+            self.models[name].load_in_background()
+
+        if self.idle_ttl > 0 and self._reaper is None:
+            self._stop.clear()
+            self._reaper = threading.Thread(target=self._reap, name="model-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        interval = min(max(self.idle_ttl / 4, 1.0), 60.0)
+        while not self._stop.wait(interval):
+            self.unload_idle()
+
+    def unload_idle(self) -> int:
+        """Unload models idle longer than idle_ttl; returns how many were unloaded"""
+        if self.idle_ttl <= 0:
+            return 0
+        return sum(model.unload(self.idle_ttl) for model in self.models.values())
+
+    def shutdown(self):
+        """Stop the idle reaper"""
+        self._stop.set()
+        if self._reaper is not None:
+            self._reaper.join()
+            self._reaper = None
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: model.status() for name, model in self.models.items()}
@@ -0,0 +1,58 @@
+"""
+Model Precision Module
+Opt-in CPU int8 dynamic quantization and bf16 autocast for the inference models
+"""
+
+import contextlib
+import torch
+from torch import nn
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# fp32: eager float32; int8: Linear weights quantized to int8, activations
+# quantized on the fly per batch; bf16: float32 weights under bfloat16 autocast
+PRECISIONS = ("fp32", "int8", "bf16")
+
+def bf16_supported() -> bool:
+    """Whether this CPU has native bfloat16 kernels (AVX512-BF16 / AMX); emulated bf16 is slower than fp32"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+def resolve_precision(precision: str) -> str:
+    """Validate a precision name, falling back to fp32 where the CPU cannot run it"""
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown model precision: {precision} (expected one of {', '.join(PRECISIONS)})")
+    if precision == "bf16" and not bf16_supported():
+        logger.warning("bf16 requested but this CPU has no native bf16 support; using fp32")
+        return "fp32"
+    if precision == "int8" and not set(torch.backends.quantized.supported_engines) - {"none"}:
+        logger.warning("int8 requested but no quantized CPU engine is available; using fp32")
+        return "fp32"
+    return precision
+
+def quantize_linear_int8(model: nn.Module) -> nn.Module:
+    """Replace every nn.Linear with a dynamically quantized int8 Linear
+
+    Weights are quantized once here; activations are quantized per batch at
+    run time, so no calibration data is needed. Embedding and convolution
+    layers (CLIP's patch embedding, Speech2Text's subsampler) stay float32.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+def apply_precision(model: nn.Module, precision: str) -> nn.Module:
+    """Prepare a loaded float32 model for inference at the given (resolved) precision"""
+    model.eval()
+    if precision == "int8":
+        return quantize_linear_int8(model)
+    return model
+
+def autocast(precision: str):
+    """Context manager to wrap forward passes in: bf16 autocast on CPU, otherwise a no-op"""
+    if precision == "bf16":
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return contextlib.nullcontext()
@@ -0,0 +1,195 @@
+"""
+Perceptual Hash Module
+64-bit pHash of images and a persistent Hamming-distance index for near-duplicate lookup
+"""
+
+import os
+import json
+import threading
+from typing import Dict, Hashable, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PHASH_SIZE = 32  # side of the grayscale thumbnail the DCT is taken of
+PHASH_BITS = 8   # side of the low-frequency block kept, giving 8 x 8 = 64 bits
+FLAT_THRESHOLD = 1.0  # images whose low AC coefficients are all smaller are flat
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so a 2-D DCT is dct @ block @ dct.T"""
+    k = np.arange(n)[:, None]
+    basis = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    basis[0] /= np.sqrt(2.0)
+    return basis
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+def phash(image: Image.Image) -> Optional[int]:
+    """Perceptual hash: signs of the low DCT frequencies of a 32x32 grayscale thumbnail
+
+    Resizing, recompression and small colour changes flip few of the 64 bits,
+    so copies of one picture land within a small Hamming distance. A flat
+    image has no structure to hash and returns None.
+    """
+    pixels = np.asarray(image.convert("L").resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:PHASH_BITS, :PHASH_BITS].flatten()
+    if np.abs(low[1:]).max() < FLAT_THRESHOLD:
+        return None
+    # The DC term is the mean brightness; it is left out of the median
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes under Hamming distance
+
+    Each node keeps children keyed by their distance to it; by the triangle
+    inequality a search within radius r only descends into children whose
+    key is within r of the query's distance to the node. Values are removed
+    in place and emptied nodes stay as routing nodes.
+    """
+
+    def __init__(self):
+        self._root = None  # [hash, values, children]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, key: int, value: Hashable):
+        if self._root is None:
+            self._root = [key, {value}, {}]
+            self._size += 1
+            return
+        node = self._root
+        while True:
+            distance = hamming(key, node[0])
+            if distance == 0:
+                if value not in node[1]:
+                    node[1].add(value)
+                    self._size += 1
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [key, {value}, {}]
+                self._size += 1
+                return
+            node = child
+
+    def remove(self, key: int, value: Hashable):
+        node = self._root
+        while node is not None:
+            distance = hamming(key, node[0])
+            if distance == 0:
+                if value in node[1]:
+                    node[1].discard(value)
+                    self._size -= 1
+                return
+            node = node[2].get(distance)
+
+    def within(self, key: int, max_distance: int) -> List[Tuple[int, Hashable]]:
+        """(distance, value) pairs within max_distance of key, nearest first"""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= max_distance:
+                found.extend((distance, value) for value in node[1])
+            for edge, child in node[2].items():
+                if abs(edge - distance) <= max_distance:
+                    stack.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+class PerceptualHashIndex:
+    """Maps image document ids to perceptual hashes, searchable by Hamming distance
+
+    Entries are appended to image_hashes.jsonl and a removal appends a line
+    with a null hash; the log is rewritten on open once stale lines outnumber
+    the live entries (unless compact is False), like the content hash index.
+    """
+
+    FILE = "image_hashes.jsonl"
+
+    def __init__(self, directory: str, compact: bool = True):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, self.FILE)
+        self._lock = threading.Lock()
+        self._hashes: Dict[str, int] = {}
+        self._tree = BKTree()
+
+        lines = self._load()
+        if compact and lines > 2 * len(self._hashes) + 64:
+            self._compact()
+        self._log = open(self.path, "a", encoding="utf-8")
+
+    def _load(self) -> int:
+        """Replay the log and return how many lines it had"""
+        if not os.path.exists(self.path):
+            return 0
+
+        lines = 0
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping corrupt line in {self.path}")
+                    continue
+                lines += 1
+                self._discard(entry["id"])
+                if entry.get("hash") is not None:
+                    self._set(entry["id"], int(entry["hash"], 16))
+        return lines
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for doc_id, image_hash in self._hashes.items():
+                f.write(json.dumps({"id": doc_id, "hash": f"{image_hash:016x}"}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _set(self, doc_id: str, image_hash: int):
+        self._hashes[doc_id] = image_hash
+        self._tree.add(image_hash, doc_id)
+
+    def _discard(self, doc_id: str) -> bool:
+        image_hash = self._hashes.pop(doc_id, None)
+        if image_hash is None:
+            return False
+        self._tree.remove(image_hash, doc_id)
+        return True
+
+    def _append(self, doc_id: str, image_hash: Optional[int]):
+        self._log.write(json.dumps({"id": doc_id, "hash": None if image_hash is None else f"{image_hash:016x}"}) + "\n")
+        self._log.flush()
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def nearest(self, image_hash: int, max_distance: int) -> List[Tuple[int, str]]:
+        """(distance, doc id) of every stored image within max_distance, nearest first"""
+        with self._lock:
+            return self._tree.within(image_hash, max_distance)
+
+    def add(self, image_hash: int, doc_id: str):
+        with self._lock:
+            self._discard(doc_id)
+            self._set(doc_id, image_hash)
+            self._append(doc_id, image_hash)
+
+    def remove_document(self, doc_id: str):
+        with self._lock:
+            if self._discard(doc_id):
+                self._append(doc_id, None)
+
+    def close(self):
+        with self._lock:
+            self._log.close()
@@ -0,0 +1,153 @@
+"""
+Profiling Module
+Opt-in per-request profiles: stage timings, tensor shapes and optional cProfile / torch profiler dumps
+"""
+
+import os
+import time
+import uuid
+import cProfile
+import pstats
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# none: stage timings and shapes only; cprofile: also a .pstats file of the
+# Python calls made for the request; torch: also a Chrome trace of torch ops
+PROFILERS = ("none", "cprofile", "torch")
+
+class RequestProfile:
+    """Stage timings and tensor shapes recorded while one request is handled
+
+    Stages and shapes are appended from whichever thread does the work
+    (the context is copied into the inference executor), in completion order.
+    """
+
+    def __init__(self, profiler: str = "none", directory: Optional[str] = None):
+        if profiler not in PROFILERS:
+            raise ValueError(f"Unknown profiler: {profiler} (expected one of {', '.join(PROFILERS)})")
+        self.id = uuid.uuid4().hex
+        self.profiler = profiler
+        self.directory = directory
+        self.started = time.perf_counter()
+        self.stages: List[Dict[str, Any]] = []
+        self.shapes: List[Dict[str, Any]] = []
+        self.dump_path: Optional[str] = None
+        self._profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages.append({"stage": stage, "ms": round(seconds * 1000, 3)})
+
+    def add_shapes(self, stage: str, values: Dict[str, Any]):
+        with self._lock:
+            self.shapes.append({"stage": stage, **values})
+
+    def add_profiler(self, profiler: cProfile.Profile):
+        with self._lock:
+            self._profilers.append(profiler)
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-ready breakdown: every stage in order, per-stage totals, shapes and the dump file"""
+        totals: Dict[str, float] = {}
+        for entry in self.stages:
+            totals[entry["stage"]] = round(totals.get(entry["stage"], 0.0) + entry["ms"], 3)
+        return {
+            "id": self.id,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "stage_totals_ms": totals,
+            "stages": list(self.stages),
+            "shapes": list(self.shapes),
+            "dump": self.dump_path,
+        }
+
+    def _dump_cprofile(self):
+        if not self._profilers:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        stats = pstats.Stats(self._profilers[0])
+        for profiler in self._profilers[1:]:
+            stats.add(profiler)
+        self.dump_path = os.path.join(self.directory, f"{self.id}.pstats")
+        stats.dump_stats(self.dump_path)
+
+_active: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+# The torch profiler is process-wide; only one request can hold it at a time
+_torch_profiler_lock = threading.Lock()
+
+def current_profile() -> Optional[RequestProfile]:
+    return _active.get()
+
+def record_stage(stage: str, seconds: float):
+    """Add a stage timing to the active profile; a no-op outside profiled requests"""
+    profile = _active.get()
+    if profile is not None:
+        profile.add_stage(stage, seconds)
+
+def record_shapes(stage: str, **values: Any):
+    """Note tensor shapes (tensors become their shape lists) and sizes for the active profile"""
+    profile = _active.get()
+    if profile is None:
+        return
+    profile.add_shapes(stage, {name: list(value.shape) if hasattr(value, "shape") else value
+                               for name, value in values.items()})
+
+def profiled_call(fn: Callable[[], Any]) -> Any:
+    """Run fn, under a thread-local cProfile when the active profile asked for one
+
+    cProfile only sees the thread it is enabled in, so work handed to other
+    threads is profiled there and merged into one stats file at the end.
+    """
+    profile = _active.get()
+    if profile is None or profile.profiler != "cprofile":
+        return fn()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler already runs in this thread
+        return fn()
+    try:
+        return fn()
+    finally:
+        profiler.disable()
+        profile.add_profiler(profiler)
+
+@contextmanager
+def profile_request(profiler: str = "none", directory: Optional[str] = None) -> Iterator[RequestProfile]:
+    """Make a new RequestProfile active for the enclosed (async) work and write its dump at the end"""
+    profile = RequestProfile(profiler, directory)
+    token = _active.set(profile)
+    torch_profiler = None
+    if profiler == "torch":
+        if _torch_profiler_lock.acquire(blocking=False):
+            import torch
+            torch_profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU], record_shapes=True)
+            torch_profiler.__enter__()
+        else:
+            logger.warning("The torch profiler is busy with another request; recording stage timings only")
+    try:
+        yield profile
+    finally:
+        _active.reset(token)
+        try:
+            if torch_profiler is not None:
+                torch_profiler.__exit__(None, None, None)
+                os.makedirs(directory, exist_ok=True)
+                profile.dump_path = os.path.join(directory, f"{profile.id}.trace.json")
+                torch_profiler.export_chrome_trace(profile.dump_path)
+            elif profiler == "cprofile":
+                profile._dump_cprofile()
+        except Exception as e:
+            logger.error(f"Could not write the profile of request {profile.id}: {e}")
+        finally:
+            if torch_profiler is not None:
+                _torch_profiler_lock.release()
@@ -0,0 +1,297 @@
+"""
+Embedding Quantization Module
+Compressed embedding codes (int8 scalar and product quantization) with exact re-ranking
+"""
+
+import os
+import numpy as np
+import torch
+from typing import Dict, List, Optional, Tuple
+import logging
+from vector_index import VectorIndex
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCORE_CHUNK_ROWS = 8192
+
+class ScalarQuantizer:
+    """Per-dimension 8-bit quantization: codes 4x smaller than float32 rows"""
+
+    name = "sq8"
+
+    def __init__(self):
+        self.minimum = None
+        self.scale = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.scale is not None
+
+    def code_size(self, dim: int) -> int:
+        return dim
+
+    def train(self, data: torch.Tensor):
+        self.minimum = data.min(dim=0).values
+        self.scale = ((data.max(dim=0).values - self.minimum) / 255).clamp_min(1e-12)
+
+    def encode(self, vectors: torch.Tensor) -> torch.Tensor:
+        codes = torch.round((vectors.to(torch.float32) - self.minimum) / self.scale)
+        return codes.clamp_(0, 255).to(torch.uint8)
+
+    def decode(self, codes: torch.Tensor) -> torch.Tensor:
+        return codes.to(torch.float32) * self.scale + self.minimum
+
+    def scorer(self, query: torch.Tensor):
+        """Return a function scoring a (dim, n) block of codes against the query (inner product)"""
+        weights = query * self.scale
+        offset = float(query @ self.minimum)
+        return lambda codes: weights @ codes.to(torch.float32) + offset
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"minimum": self.minimum.numpy(), "scale": self.scale.numpy()}
+
+    def load_state(self, state):
+        self.minimum = torch.from_numpy(state["minimum"])
+        self.scale = torch.from_numpy(state["scale"])
+
+class ProductQuantizer:
+    """Splits vectors into m sub-vectors, each replaced by one of 256 centroids (1 byte)
+
+    Scoring uses asymmetric distance computation: the query stays in float and
+    is compared against a per-query lookup table of sub-centroid products.
+    """
+
+    name = "pq"
+
+    def __init__(self, m: int = 64, iterations: int = 15, seed: int = 0):
+        self.m = m
+        self.iterations = iterations
+        self.seed = seed
+        self.codebooks = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    def code_size(self, dim: int) -> int:
+        return self.m
+
+    def _split(self, vectors: torch.Tensor) -> torch.Tensor:
+        """Reshape (n, dim) into (m, n, dim / m)"""
+        n, dim = vectors.shape
+        if dim % self.m:
+            raise ValueError(f"Dimension {dim} is not divisible by m={self.m}")
+        return vectors.to(torch.float32).reshape(n, self.m, dim // self.m).transpose(0, 1)
+
+    def train(self, data: torch.Tensor):
+        generator = torch.Generator().manual_seed(self.seed)
+        subspaces = self._split(data)
+        ksub = min(256, data.shape[0])
+        codebooks = []
+        for sub in subspaces:
+            centroids = sub[torch.randperm(sub.shape[0], generator=generator)[:ksub]].clone()
+            for _ in range(self.iterations):
+                assignments = torch.cdist(sub, centroids).argmin(dim=1)
+                sums = torch.zeros_like(centroids).index_add_(0, assignments, sub)
+                counts = torch.bincount(assignments, minlength=ksub).unsqueeze(1)
+                centroids = torch.where(counts > 0, sums / counts.clamp_min(1), centroids)
+            codebooks.append(centroids)
+        self.codebooks = torch.stack(codebooks)
+
+    def encode(self, vectors: torch.Tensor) -> torch.Tensor:
+        codes = [torch.cdist(sub, codebook).argmin(dim=1) for sub, codebook in zip(self._split(vectors), self.codebooks)]
+        return torch.stack(codes, dim=1).to(torch.uint8)
+
+    def decode(self, codes: torch.Tensor) -> torch.Tensor:
+        parts = [self.codebooks[i][codes[:, i].long()] for i in range(self.m)]
+        return torch.cat(parts, dim=1)
+
+    def scorer(self, query: torch.Tensor):
+        """Build the (m, ksub) lookup table once; each code then costs m table reads"""
+        table = torch.bmm(self.codebooks, self._split(query.unsqueeze(0)).transpose(1, 2)).squeeze(2)
+        return lambda codes: torch.gather(table, 1, codes.long()).sum(dim=0)
+
+    def state(self) -> Dict[str, np.ndarray]:
+        return {"codebooks": self.codebooks.numpy()}
+
+    def load_state(self, state):
+        self.codebooks = torch.from_numpy(state["codebooks"])
+        self.m = self.codebooks.shape[0]
+
+class QuantizedIndex:
+    """Keeps compact codes for every row and scores them instead of the float matrix
+
+    Codes are stored code-major, shape (code_size, rows), so each scoring chunk
+    reads contiguous runs of one code byte across many rows.
+
+    The float embeddings stay in the vector index. Over a memory-mapped
+    index they are left on disk: their pages are dropped once encoded, and
+    with rerank_factor > 0 only the top_k * rerank_factor approximate
+    candidates are read back to be re-scored exactly, so the codes are the
+    only per-vector data held in memory (see bytes_per_vector).
+    """
+
+    def __init__(self, vector_index: VectorIndex, quantizer, train_threshold: int = 10000,
+                 max_training_points: int = 16384, rerank_factor: int = 4):
+        self.vector_index = vector_index
+        self.quantizer = quantizer
+        self.train_threshold = train_threshold
+        self.max_training_points = max_training_points
+        self.rerank_factor = rerank_factor
+        self._codes = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.quantizer.is_trained
+
+    @property
+    def codes(self) -> torch.Tensor:
+        """Codes of the stored rows, shape (code_size, rows)"""
+        return self._codes[:, :len(self.vector_index)]
+
+    @property
+    def code_bytes(self) -> int:
+        """Bytes of code per row: what a search scans for every row"""
+        return self.quantizer.code_size(self.vector_index.dim)
+
+    @property
+    def bytes_per_vector(self) -> int:
+        """Bytes held in memory per row: the code, plus the float row if the vector index keeps rows in RAM"""
+        float_bytes = self.vector_index.dim * self.vector_index.matrix.element_size() if self.vector_index.in_memory else 0
+        return self.code_bytes + float_bytes
+
+    def train(self):
+        """Fit the quantizer on a sample of stored rows and encode the whole corpus"""
+        size = len(self.vector_index)
+        if size == 0:
+            return
+
+        matrix = self.vector_index.matrix
+        sample = torch.randperm(size)[:self.max_training_points]
+        self.quantizer.train(matrix[sample].to(torch.float32))
+
+        self._codes = torch.empty((self.code_bytes, max(16, size)), dtype=torch.uint8)
+        for start in range(0, size, SCORE_CHUNK_ROWS):
+            self._codes[:, start:start + SCORE_CHUNK_ROWS] = self.quantizer.encode(matrix[start:start + SCORE_CHUNK_ROWS]).T
+        self.vector_index.evict()
+        logger.info(f"Trained {self.quantizer.name} codes: {size} vectors, {self.code_bytes} bytes each")
+
+    def add(self, positions: List[int]):
+        """Encode rows that were just appended to the vector index"""
+        if not self.is_trained:
+            if len(self.vector_index) >= self.train_threshold:
+                self.train()
+            return
+
+        required = max(positions) + 1
+        capacity = self._codes.shape[1]
+        if required > capacity:
+            grown = torch.empty((self._codes.shape[0], max(required, 2 * capacity)), dtype=torch.uint8)
+            grown[:, :capacity] = self._codes
+            self._codes = grown
+        self._codes[:, positions] = self.quantizer.encode(self.vector_index.matrix[positions]).T
+        self.vector_index.evict(min(positions), max(positions) + 1)
+
+    def compact(self, keep: np.ndarray):
+        """Keep only the codes of the rows in keep, after the vector index did the same"""
+        if not self.is_trained:
+            return
+        # A new tensor, so a copy of this index can be compacted while the original takes new rows
+        self._codes = self._codes[:, torch.from_numpy(keep)]
+        self.vector_index.evict()
+
+    def approximate_scores(self, query: torch.Tensor) -> torch.Tensor:
+        """Approximate similarity of every stored row, computed from codes in chunks"""
+        score = self.quantizer.scorer(query)
+        codes = self.codes
+        return torch.cat([score(codes[:, start:start + SCORE_CHUNK_ROWS]) for start in range(0, codes.shape[1], SCORE_CHUNK_ROWS)])
+
+    def search(self, query_embedding: torch.Tensor, top_k: int = 3, rerank_factor: Optional[int] = None,
+               exclude: Optional[torch.Tensor] = None,
+               candidates: Optional[torch.Tensor] = None) -> Tuple[List[int], List[float]]:
+        """Top-k by approximate scores, optionally re-ranked with exact float scores
+
+        Rows masked by exclude (e.g. deleted ones) are never returned; with
+        candidates (positions passing a filter) only their codes are scored.
+        """
+        if not self.is_trained:
+            return self.vector_index.search(query_embedding, top_k=top_k, exclude=exclude, candidates=candidates)
+
+        size = len(self.vector_index)
+        if size == 0 or top_k <= 0:
+            return [], []
+
+        query = VectorIndex.normalize(query_embedding.reshape(-1))
+        if candidates is not None:
+            score = self.quantizer.scorer(query)
+            positions = candidates
+            scores = torch.cat([
+                score(self._codes[:, candidates[start:start + SCORE_CHUNK_ROWS]])
+                for start in range(0, len(candidates), SCORE_CHUNK_ROWS)
+            ]) if len(candidates) else torch.empty(0)
+            size = len(candidates)
+        else:
+            positions = torch.arange(size)
+            scores = self.approximate_scores(query)
+            if exclude is not None:
+                scores[exclude[:size]] = float("-inf")
+                size -= int(exclude[:size].sum())
+        if size <= 0:
+            return [], []
+
+        rerank_factor = self.rerank_factor if rerank_factor is None else rerank_factor
+        if rerank_factor <= 0:
+            top = torch.topk(scores, min(top_k, size))
+            return positions[top.indices].tolist(), top.values.tolist()
+
+        shortlist = positions[torch.topk(scores, min(top_k * rerank_factor, size)).indices]
+        rows = self.vector_index.read_rows(shortlist)
+        exact = (rows @ query.to(rows.dtype)).float()
+        top = torch.topk(exact, min(top_k, len(shortlist)))
+        return shortlist[top.indices].tolist(), top.values.tolist()
+
+    def _state_file(self, directory: str) -> str:
+        return os.path.join(directory, f"{self.quantizer.name}_index.npz")
+
+    def save(self, directory: str):
+        """Persist quantizer parameters and codes"""
+        if not self.is_trained:
+            return
+        tmp_path = os.path.join(directory, f"{self.quantizer.name}_index.tmp.npz")
+        np.savez(tmp_path, codes=self.codes.numpy(), **self.quantizer.state())
+        os.replace(tmp_path, self._state_file(directory))
+
+    def discard(self, directory: str):
+        """Remove saved codes that no longer match the store"""
+        path = self._state_file(directory)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def load(self, directory: str) -> bool:
+        """Restore saved codes, encoding rows appended since the save (see IVFFlatIndex.load)"""
+        path = self._state_file(directory)
+        if not os.path.exists(path):
+            return False
+
+        state = np.load(path)
+        size = len(self.vector_index)
+        codes = state["codes"][:, :size]
+        self.quantizer.load_state(state)
+        self._codes = torch.from_numpy(np.ascontiguousarray(codes))
+        if codes.shape[1] < size:
+            self.add(list(range(codes.shape[1], size)))
+        return True
+
+class ScalarQuantizedIndex(QuantizedIndex):
+    """QuantizedIndex with int8 scalar codes (4x smaller than float32 rows)"""
+
+    def __init__(self, vector_index: VectorIndex, **params):
+        super().__init__(vector_index, ScalarQuantizer(), **params)
+
+class ProductQuantizedIndex(QuantizedIndex):
+    """QuantizedIndex with product quantization codes (dim * 4 / m times smaller than float32 rows)"""
+
+    def __init__(self, vector_index: VectorIndex, m: int = 64, **params):
+        super().__init__(vector_index, ProductQuantizer(m=m), **params)
@@ -0,0 +1,156 @@
+"""
+Shared Store Module
+Multi-process serving over one store directory: writer election, snapshot publishing and reader refresh
+"""
+
+import os
+import fcntl
+import asyncio
+import threading
+from typing import Callable, Optional
+import logging
+from document_store import DocumentStore
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+WRITER_LOCK_FILE = "writer.lock"
+
+class WriterLease:
+    """Non-blocking exclusive flock on writer.lock; the process holding it is the store's writer
+
+    The lock lives as long as the open file, so it is released when the
+    process exits and a restarted worker can take it over.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(os.path.join(directory, WRITER_LOCK_FILE), "a")
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.held = True
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            self.held = False
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+            self.held = False
+
+class SnapshotPublisher:
+    """Publishes a new store snapshot every interval seconds while the writer's store is changing
+
+    Publishing only records the committed counts. The store's indexes are
+    checkpointed after checkpoint_rows new rows or checkpoint_interval
+    seconds of unsaved changes (see DocumentStore.checkpoint).
+    """
+
+    def __init__(self, store: DocumentStore, interval: float = 1.0, checkpoint_rows: int = 50000,
+                 checkpoint_interval: float = 300.0):
+        self.store = store
+        self.interval = interval
+        self.checkpoint_rows = checkpoint_rows
+        self.checkpoint_interval = checkpoint_interval
+        self._published = None
+        self._task = None
+
+    def publish(self) -> bool:
+        """Publish if anything changed since the last snapshot, then checkpoint if due; returns whether it published"""
+        changes = self.store.changes
+        if changes == self._published:
+            return False
+        version = self.store.publish_snapshot()
+        self._published = changes
+        logger.debug(f"Published store snapshot {version} ({len(self.store)} rows)")
+        if self.store.checkpoint(self.checkpoint_rows, self.checkpoint_interval):
+            logger.debug(f"Checkpointed store indexes at {len(self.store)} rows")
+        return True
+
+    def start(self, run: Optional[Callable] = None):
+        """Publish now, then keep publishing from a task on the running event loop
+
+        run(fn) awaits fn off the event loop (e.g. the inference executor);
+        without it publishing runs on a worker thread.
+        """
+        if self._task is not None:
+            return
+        self.publish()
+        self._task = asyncio.ensure_future(self._loop(run or asyncio.to_thread))
+        logger.info(f"Publishing store snapshots every {self.interval}s")
+
+    async def stop(self):
+        """Stop the task and publish whatever changed since (the caller flushes the store)"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.publish()
+
+    async def _loop(self, run: Callable):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run(self.publish)
+            except Exception as e:
+                logger.error(f"Publishing a store snapshot failed: {e}")
+
+class SnapshotFollower:
+    """Keeps a read-only store on the latest published snapshot, from a background task
+
+    Every check_interval seconds the task reads snapshot.json and moves the
+    served store forward in place (DocumentStore.refresh), indexing only the
+    rows appended since; requests never wait on it beyond the store lock.
+    Only after a compaction is a new store opened and swapped in with a
+    single reference assignment; requests already holding the previous store
+    finish on it, and its files and mapping are released once they drop it.
+    """
+
+    def __init__(self, open_store: Callable[[], DocumentStore], check_interval: float = 1.0):
+        self.open_store = open_store
+        self.check_interval = check_interval
+        self.store = open_store()
+        self._lock = threading.Lock()
+        self._task = None
+
+    def refresh(self) -> DocumentStore:
+        """Move to the latest snapshot, reopening only after a compaction; returns the current store"""
+        with self._lock:
+            version = self.store.snapshot_version
+            if not self.store.refresh():
+                self.store = self.open_store()
+            if self.store.snapshot_version != version:
+                logger.info(f"Serving store snapshot {self.store.snapshot_version} ({len(self.store)} rows)")
+            return self.store
+
+    def start(self, run: Optional[Callable] = None, on_swap: Optional[Callable[[DocumentStore], None]] = None):
+        """Keep refreshing from a task on the running event loop
+
+        run(fn) awaits fn off the event loop, as for SnapshotPublisher.start;
+        on_swap(store) is called when a reopened store replaces the served one.
+        """
+        if self._task is not None:
+            return
+        self._task = asyncio.ensure_future(self._loop(run or asyncio.to_thread, on_swap))
+        logger.info(f"Following store snapshots every {self.check_interval}s")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self, run: Callable, on_swap: Optional[Callable[[DocumentStore], None]]):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                served = self.store
+                store = await run(self.refresh)
+                if store is not served and on_swap is not None:
+                    on_swap(store)
+            except Exception as e:
+                logger.error(f"Following the store snapshot failed: {e}")
@@ -0,0 +1,109 @@
+"""
+Test script for the ANN Index
+Tests IVF-flat training, incremental inserts, deletes and persistence
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import torch
+from vector_index import VectorIndex
+from ann_index import IVFFlatIndex, create_ann_index
+from document_store import DocumentStore
+
+def make_index(count=500, dim=16):
+    torch.manual_seed(0)
+    index = VectorIndex(dim=dim)
+    index.add(torch.randn(count, dim))
+    return index
+
+def test_untrained_falls_back_to_exact():
+    """Below the training threshold searches are exact"""
+    index = make_index(50)
+    ivf = IVFFlatIndex(index, train_threshold=100)
+    ivf.add([49])
+    assert not ivf.is_trained
+    query = torch.randn(16)
+    assert ivf.search(query, top_k=5) == index.search(query, top_k=5)
+
+def test_full_probe_matches_exact():
+    """Probing every list returns the exact top-k"""
+    index = make_index()
+    ivf = IVFFlatIndex(index, nlist=8, train_threshold=0)
+    ivf.train()
+    query = torch.randn(16)
+    positions, _ = ivf.search(query, top_k=10, nprobe=8)
+    assert positions == index.search(query, top_k=10)[0]
+
+def test_incremental_add_and_exclude():
+    """Inserted rows become searchable and excluded (deleted) rows are skipped"""
+    index = make_index()
+    ivf = IVFFlatIndex(index, nlist=8, train_threshold=0)
+    ivf.train()
+
+    vector = torch.randn(16)
+    positions = index.add(vector)
+    ivf.add(positions)
+    assert ivf.search(vector, top_k=1, nprobe=8)[0] == positions
+
+    exclude = torch.zeros(len(index), dtype=torch.bool)
+    exclude[positions[0]] = True
+    assert positions[0] not in ivf.search(vector, top_k=5, nprobe=8, exclude=exclude)[0]
+
+def test_auto_train_at_threshold():
+    """Crossing the threshold trains the index"""
+    index = make_index(99)
+    ivf = create_ann_index("ivf", index, nlist=4, train_threshold=100)
+    ivf.add(index.add(torch.randn(16)))
+    assert ivf.is_trained
+
+def test_store_delete_and_reopen():
+    """The store keeps IVF lists aligned across deletes and restarts"""
+    directory = tempfile.mkdtemp()
+    params = {"nlist": 4, "train_threshold": 20}
+    store = DocumentStore(directory, dim=8, ann_index="ivf", ann_params=params)
+    vectors = torch.randn(40, 8)
+    for i in range(40):
+        store.add({"id": f"text_{i}", "content": "", "modality": "text"}, vectors[i])
+    assert store.ann_index.is_trained
+
+    store.delete(store.find("text_5"))
+    results = store.search(vectors[30], top_k=1, nprobe=4)
+    assert results[0][0]["id"] == "text_30"
+    store.close()
+
+    reopened = DocumentStore(directory, dim=8, ann_index="ivf", ann_params=params)
+    assert reopened.ann_index.is_trained
+    results = reopened.search(vectors[30], top_k=1, nprobe=4)
+    assert results[0][0]["id"] == "text_30"
+
+def test_store_compaction_renumbers_lists():
+    """After compaction the IVF lists point at the moved rows"""
+    params = {"nlist": 4, "train_threshold": 20}
+    store = DocumentStore(tempfile.mkdtemp(), dim=8, ann_index="ivf", ann_params=params)
+    vectors = torch.randn(40, 8)
+    for i in range(40):
+        store.add({"id": f"text_{i}", "content": "", "modality": "text"}, vectors[i])
+
+    store.delete_where(lambda record: int(record["id"].split("_")[1]) < 10)
+    store.compact()
+    results = store.search(vectors[30], top_k=1, nprobe=4)
+    assert results[0][0]["id"] == "text_30"
+    assert len(store) == 30
+
+def test_filtered_search_scores_only_candidates():
+    """IVF search restricted to candidate rows never returns other rows"""
+    index = make_index(400)
+    ivf = IVFFlatIndex(index, nlist=8, nprobe=8, train_threshold=0)
+    ivf.train()
+
+    candidates = torch.arange(0, 400, 2)
+    positions, _ = ivf.search(index.matrix[1], top_k=10, candidates=candidates)
+    assert len(positions) == 10
+    assert all(position % 2 == 0 for position in positions)
+
+    # A filter leaving only a few rows is scored exactly
+    positions, scores = ivf.search(index.matrix[7], top_k=1, nprobe=1, candidates=torch.tensor([3, 7, 11]))
+    assert positions == [7]
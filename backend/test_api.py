@@ -10,13 +10,30 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 import pytest
 import asyncio
 from fastapi.testclient import TestClient
-from api_endpoints import app, documents, embeddings
+import api_endpoints
+from api_endpoints import app
+from document_store import DocumentStore
+from content_index import ContentHashIndex
+from perceptual_hash import PerceptualHashIndex
+from blob_store import BlobStore
+from job_queue import JobQueue
 import io
 from PIL import Image
 
 # Create test client
 client = TestClient(app)
 
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    """The api_endpoints module serving an empty store, indexes, blob store and job queue under tmp_path"""
+    directory = str(tmp_path)
+    monkeypatch.setattr(api_endpoints, "document_store", DocumentStore(directory))
+    monkeypatch.setattr(api_endpoints, "content_index", ContentHashIndex(directory))
+    monkeypatch.setattr(api_endpoints, "image_hashes", PerceptualHashIndex(directory))
+    monkeypatch.setattr(api_endpoints, "blob_store", BlobStore(os.path.join(directory, "blobs")))
+    monkeypatch.setattr(api_endpoints, "job_queue", JobQueue(os.path.join(directory, "jobs")))
+    return api_endpoints
+
 def test_root_endpoint():
     """Test root endpoint"""
     response = client.get("/")
@@ -32,6 +49,56 @@ def test_health_endpoint():
     assert "models_loaded" in data
     assert "documents_count" in data
 
+def test_stats_endpoint():
+    """Test batching statistics endpoint"""
+    response = client.get("/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert "query_batcher" in data
+    assert "mean_batch_size" in data["query_batcher"]
+    assert "queue_wait_ms" in data["query_batcher"]
+
+def test_metrics_endpoint():
+    """Metrics are exposed in the Prometheus text format, with requests counted per route template"""
+    client.get("/health")
+    client.delete("/documents/nonexistent")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert "# TYPE rag_stage_seconds histogram" in text
+    assert 'rag_requests_total{route="/health",method="GET",status="200"}' in text
+    assert 'route="/documents/{doc_id}",method="DELETE",status="404"' in text
+    assert "rag_index_rows " in text
+    assert 'rag_model_loaded{model="clip"}' in text
+
+def test_profiled_query(monkeypatch):
+    """X-Profile needs the admin token and adds a profile to the response; other requests are untouched"""
+    query = {"query": "profiling test", "mode": "lexical"}
+    assert client.post("/query", json=query, headers={"X-Profile": "guess"}).status_code == 403
+    monkeypatch.setattr(api_endpoints.config, "PROFILE_TOKEN", "admin-token")
+    response = client.post("/query", json=query, headers={"X-Profile": "admin-token"})
+    assert response.status_code == 200
+    profile = response.json()["profile"]
+    assert profile["id"] == response.headers["x-profile-id"]
+    assert profile["total_ms"] >= 0 and isinstance(profile["stages"], list)
+    assert "profile" not in client.post("/query", json=query).json()
+    assert client.post("/query", json=query, headers={"X-Profile": "admin-token", "X-Profile-Dump": "gprof"}).status_code == 400
+
+def test_middleware_forwards_streamed_bodies():
+    """Response chunks pass through the request middleware as they are sent, not buffered"""
+    async def streaming_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"first\n", "more_body": True})
+        await send({"type": "http.response.body", "body": b"second\n"})
+
+    sent = []
+    async def send(message):
+        sent.append(message)
+    scope = {"type": "http", "method": "GET", "path": "/stream", "headers": [], "query_string": b""}
+    asyncio.run(api_endpoints.RequestMiddleware(streaming_app)(scope, None, send))
+    assert [message.get("body") for message in sent] == [None, b"first\n", b"second\n"]
+
 def test_upload_text():
     """Test text upload endpoint"""
     # Create a test text file
@@ -60,6 +127,65 @@ def test_upload_image():
     assert "message" in data
     assert "doc_id" in data
 
+def test_upload_batch():
+    """Test batch upload endpoint with mixed and unsupported files"""
+    test_image = Image.new('RGB', (100, 100), color='blue')
+    img_byte_arr = io.BytesIO()
+    test_image.save(img_byte_arr, format='PNG')
+    img_byte_arr.seek(0)
+    
+    files = [
+        ("files", ("a.txt", "First batch document.", "text/plain")),
+        ("files", ("b.txt", "Second batch document.", "text/plain")),
+        ("files", ("c.png", img_byte_arr, "image/png")),
+        ("files", ("d.bin", b"\x00\x01", "application/octet-stream")),
+    ]
+    
+    response = client.post("/upload/batch?batch_size=2", files=files)
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["results"]) == 4
+    assert data["uploaded"] + data["failed"] == 4
+    assert [r["modality"] for r in data["results"]] == ["text", "text", "image", None]
+    assert data["results"][3]["error"] == "Unsupported file type"
+
+def test_batch_failure_rolls_back_only_that_file(api, monkeypatch):
+    """A file that fails to store or commit is reported alone; the files stored before it keep their ids"""
+    import torch
+    from text_chunker import TextWindow
+    
+    dim = api.document_store.dim
+    monkeypatch.setattr(api.ai_models, "get_image_embeddings", lambda images: torch.randn(len(images), dim))
+    monkeypatch.setattr(api.ai_models, "get_text_embeddings", lambda texts: torch.randn(len(texts), dim))
+    monkeypatch.setattr(api.ai_models, "chunk_texts", lambda texts, *args: [[TextWindow(0, 0, len(text), text)] for text in texts])
+    
+    store_document, commit_document = api.store_document, api.commit_document
+    def failing_store(record, *args):
+        if record["filename"] == "b.png":
+            raise RuntimeError("disk full")
+        return store_document(record, *args)
+    def failing_commit(modality, digest, doc_id, payload):
+        if api.document_store.get(api.document_store.find(doc_id))["filename"] == "b.txt":
+            raise RuntimeError("disk full")
+        return commit_document(modality, digest, doc_id, payload)
+    monkeypatch.setattr(api, "store_document", failing_store)
+    monkeypatch.setattr(api, "commit_document", failing_commit)
+    
+    def png(color):
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 64), color).save(buffer, format="PNG")
+        return buffer.getvalue()
+    files = [("files", ("a.png", png("red"), "image/png")), ("files", ("b.png", png("blue"), "image/png")),
+             ("files", ("a.txt", b"first text", "text/plain")), ("files", ("b.txt", b"second text", "text/plain"))]
+    results = client.post("/upload/batch?batch_size=2", files=files).json()["results"]
+    
+    assert [(result["filename"], result["error"]) for result in results if result["doc_id"] is None] == [
+        ("b.png", "disk full"), ("b.txt", "disk full")
+    ]
+    stored = {doc["filename"]: doc["id"] for doc in api.document_store.iter_documents()}
+    assert stored == {result["filename"]: result["doc_id"] for result in results if result["doc_id"]}
+    assert set(stored) == {"a.png", "a.txt"}
+
 def test_query_documents():
     """Test document query endpoint"""
     # First upload a test document
@@ -83,6 +209,27 @@ def test_get_documents():
     assert "documents" in data
     assert isinstance(data["documents"], list)
 
+def test_get_documents_paginated(api):
+    """Pages follow next_cursor, fields= projects and format=ndjson streams"""
+    import torch
+    
+    for i in range(3):
+        api.document_store.add(
+            {"id": f"text_{i}", "content": "body", "modality": "text", "filename": f"{i}.txt"},
+            torch.randn(api.document_store.dim)
+        )
+    
+    page = client.get("/documents?limit=2&fields=filename").json()
+    assert page["documents"] == [{"id": "text_0", "filename": "0.txt"}, {"id": "text_1", "filename": "1.txt"}]
+    page = client.get(f"/documents?limit=2&cursor={page['next_cursor']}").json()
+    assert [doc["id"] for doc in page["documents"]] == ["text_2"]
+    assert page["next_cursor"] is None
+    
+    response = client.get("/documents?format=ndjson")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert len(response.text.splitlines()) == 3
+    assert client.get("/documents?cursor=bogus").status_code == 400
+
 def test_delete_document():
     """Test delete document endpoint"""
     # First upload a test document
@@ -102,63 +249,179 @@ def test_delete_nonexistent_document():
     response = client.delete("/documents/nonexistent")
     assert response.status_code == 404
 
-def test_query_empty_documents():
-    """Test querying when no documents exist"""
-    # Clear documents for this test
-    global documents, embeddings
-    original_docs = documents.copy()
-    original_embeddings = embeddings.copy()
+def test_duplicate_upload_skips_models(monkeypatch):
+    """Byte-identical uploads alias the stored document, or are rejected with 409"""
+    import torch
+    from content_index import content_digest
+    
+    content = b"A document that has already been embedded."
+    doc_id = api_endpoints.store_document(
+        {"content": content.decode("utf-8"), "modality": "text", "filename": "first.txt"},
+        torch.randn(api_endpoints.document_store.dim),
+        content_digest([content])
+    )
+    
+    files = {"file": ("again.txt", content, "text/plain")}
+    response = client.post("/upload/text", files=files)
+    assert response.status_code == 200
+    assert response.json()["doc_id"] == doc_id
+    assert response.json()["duplicate"] is True
     
-    documents.clear()
-    embeddings.clear()
+    batch = [("files", ("a.txt", content, "text/plain")), ("files", ("b.txt", content, "text/plain"))]
+    response = client.post("/upload/batch", files=batch)
+    assert [result["doc_id"] for result in response.json()["results"]] == [doc_id, doc_id]
     
+    monkeypatch.setattr(api_endpoints.config, "DEDUP_MODE", "reject")
+    response = client.post("/upload/text", files=files)
+    assert response.status_code == 409
+
+def test_background_upload_returns_job(api):
+    """Uploads with ?background=true return 202 and are processed as a queued job"""
+    import torch
+    from content_index import content_digest
+    
+    # A duplicate of a stored document is processed without the models
+    content = b"Queued for later."
+    doc_id = api.store_document(
+        {"content": content.decode("utf-8"), "modality": "text", "filename": "first.txt"},
+        torch.randn(api.document_store.dim),
+        content_digest([content])
+    )
+    
+    response = client.post("/upload/text?background=true", files={"file": ("again.txt", content, "text/plain")})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "queued"
+    
+    jobs = api.job_queue.claim(16)
+    for job, (result, error) in zip(jobs, asyncio.run(api.process_jobs(jobs))):
+        api.job_queue.finish(job["id"], result, error)
+    
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "done"
+    assert job["result"]["doc_id"] == doc_id
+    assert job["result"]["duplicate"] is True
+    assert client.get("/jobs?status=done").json()["counts"]["done"] == 1
+    assert client.get("/jobs/missing").status_code == 404
+
+def test_bulk_delete_by_filter(api):
+    """Documents matching a filter are deleted together; an empty filter is refused"""
+    import torch
+    
+    for name, modality in [("a.wav", "audio"), ("b.wav", "audio"), ("c.txt", "text")]:
+        api.store_document(
+            {"content": name, "modality": modality, "filename": name},
+            torch.randn(api.document_store.dim),
+            name
+        )
+    
+    assert client.post("/documents/delete", json={}).status_code == 400
+    response = client.post("/documents/delete", json={"filename": "*.wav"})
+    assert response.status_code == 200
+    assert response.json()["deleted"] == ["audio_0", "audio_1"]
+    assert [doc["id"] for doc in client.get("/documents").json()["documents"]] == ["text_2"]
+    assert api.content_index.lookup("audio", "a.wav") is None
+    
+    # Ids are not reused after a delete
+    assert api.new_doc_id("audio") == "audio_3"
+
+def test_document_blob_supports_ranges(api):
+    """The original upload is served from the blob store, in full or by byte range"""
+    import torch
+    from content_index import content_digest
+    
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 200), "blue").save(buffer, format="PNG")
+    content = buffer.getvalue()
+    digest = content_digest([content])
+    doc_id = api.store_document(
+        {"content": "Image: blue.png", "modality": "image", "filename": "blue.png", "mime_type": "image/png"},
+        torch.randn(api.document_store.dim),
+        digest,
+        content,
+        Image.open(io.BytesIO(content))
+    )
+    
+    response = client.get(f"/documents/{doc_id}/blob")
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["content-type"] == "image/png"
+    
+    response = client.get(f"/documents/{doc_id}/blob", headers={"Range": "bytes=0-7"})
+    assert response.status_code == 206
+    assert response.content == content[:8]
+    
+    response = client.get(f"/documents/{doc_id}/thumbnail")
+    assert response.status_code == 200
+    assert Image.open(io.BytesIO(response.content)).size == (128, 85)
+    
+    client.delete(f"/documents/{doc_id}")
+    assert not api.blob_store.exists(digest)
+    assert client.get(f"/documents/{doc_id}/blob").status_code == 404
+
+def test_query_empty_documents(api):
+    """Test querying when no documents exist"""
     query_data = {"query": "test query"}
     response = client.post("/query", json=query_data)
     assert response.status_code == 200
     data = response.json()
     assert "No documents available" in data["answer"]
+
+def test_query_lexical_mode(api):
+    """Keyword-mode queries rank by BM25 without the text encoder; unknown modes are rejected"""
+    import torch
+    
+    for name, content in [("a.txt", "ticket RAG-512 is resolved"), ("b.txt", "ticket RAG-77 is open")]:
+        api.store_document(
+            {"content": content, "modality": "text", "filename": name},
+            torch.randn(api.document_store.dim),
+            name
+        )
+    
+    response = client.post("/query", json={"query": "RAG-77", "mode": "lexical"})
+    assert response.status_code == 200
+    assert [doc["id"] for doc in response.json()["relevant_documents"]] == ["text_1", "text_0"]
+    assert client.post("/query", json={"query": "RAG-77", "mode": "fuzzy"}).status_code == 422
+
+def test_near_duplicate_image_skips_models(api):
+    """A resized copy of a stored image is aliased to it without running CLIP"""
+    import torch
+    import numpy as np
+    from perceptual_hash import phash
+    
+    pixels = np.random.default_rng(0).random((8, 8, 3)) * 255
+    image = Image.fromarray(pixels.astype("uint8")).resize((256, 256), Image.BICUBIC)
+    doc_id = api.store_document(
+        {"content": "Image: big.png", "modality": "image", "filename": "big.png",
+         "image_hash": api.image_hash_field(phash(image))},
+        torch.randn(api.document_store.dim),
+        "big.png"
+    )
+    
+    buffer = io.BytesIO()
+    image.resize((96, 96)).save(buffer, format="JPEG", quality=60)
+    response = client.post("/upload/image", files={"file": ("small.jpg", buffer.getvalue(), "image/jpeg")})
+    assert response.status_code == 200
+    assert response.json()["doc_id"] == doc_id
+    assert response.json()["near_duplicate"] is True
     
-    # Restore original state
-    documents.extend(original_docs)
-    embeddings.extend(original_embeddings)
+    batch = [("files", ("copy.jpg", buffer.getvalue(), "image/jpeg"))]
+    response = client.post("/upload/batch", files=batch)
+    assert [result["doc_id"] for result in response.json()["results"]] == [doc_id]
 
 def run_tests():
-    """Run all API tests"""
+    """Run all API tests (through pytest, which provides the fixtures some of them take)"""
     print("🧪 Running Backend API Tests...")
     print("=" * 50)
     
-    tests = [
-        test_root_endpoint,
-        test_health_endpoint,
-        test_upload_text,
-        test_upload_image,
-        test_query_documents,
-        test_get_documents,
-        test_delete_document,
-        test_delete_nonexistent_document,
-        test_query_empty_documents
-    ]
-    
-    passed = 0
-    total = len(tests)
-    
-    for test in tests:
-        try:
-            test()
-            print(f"✅ {test.__name__}")
-            passed += 1
-        except Exception as e:
-            print(f"❌ {test.__name__}: {e}")
+    success = pytest.main([__file__, "-v"]) == 0
     
     print("\n" + "=" * 50)
-    print(f"📊 Test Results: {passed}/{total} tests passed")
-    
-    if passed == total:
+    if success:
         print("🎉 All API tests passed!")
-        return True
     else:
         print("⚠️ Some tests failed. Check the output above.")
-        return False
+    return success
 
 if __name__ == "__main__":
     success = run_tests()
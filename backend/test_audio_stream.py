@@ -0,0 +1,54 @@
+"""
+Test script for the Audio Stream
+Tests block decoding and overlapping transcription windows
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import wave
+import numpy as np
+from audio_stream import AudioWindower, iter_pcm_blocks, split_waveform
+
+def test_windows_overlap_with_timestamps():
+    """Windows have fixed length, overlap and carry start/end times"""
+    windows = split_waveform(np.zeros(16000 * 45, dtype=np.float32), 16000, window_seconds=20, overlap_seconds=2)
+    assert [(window.start, window.end) for window in windows] == [(0.0, 20.0), (18.0, 38.0), (36.0, 45.0)]
+    assert [len(window.samples) for window in windows] == [320000, 320000, 144000]
+
+def test_streaming_matches_whole_waveform():
+    """Feeding arbitrary blocks yields the same windows as the whole waveform"""
+    waveform = np.random.randn(16000 * 30).astype(np.float32)
+    windower = AudioWindower(16000, window_seconds=10, overlap_seconds=1)
+    windows = []
+    for start in range(0, len(waveform), 7777):
+        windows.extend(windower.feed(waveform[start:start + 7777]))
+    windows.extend(windower.finish())
+
+    expected = split_waveform(waveform, 16000, window_seconds=10, overlap_seconds=1)
+    assert [(window.start, window.end) for window in windows] == [(window.start, window.end) for window in expected]
+    for window, other in zip(windows, expected):
+        assert np.array_equal(window.samples, other.samples)
+
+def test_no_trailing_window_for_overlap_only():
+    """A recording ending exactly on a window boundary gets no extra window"""
+    windows = split_waveform(np.zeros(16000 * 38, dtype=np.float32), 16000, window_seconds=20, overlap_seconds=2)
+    assert [(window.start, window.end) for window in windows] == [(0.0, 20.0), (18.0, 38.0)]
+    assert split_waveform(np.zeros(0, dtype=np.float32)) == []
+
+def test_decode_wav_in_blocks():
+    """A stereo 8 kHz WAV decodes to mono 16 kHz float blocks"""
+    path = os.path.join(tempfile.mkdtemp(), "tone.wav")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(8000)
+        f.writeframes((np.ones((8000 * 3, 2)) * 16384).astype("<i2").tobytes())
+
+    blocks = list(iter_pcm_blocks(path, 16000, block_seconds=1.0))
+    assert len(blocks) == 3
+    assert abs(sum(len(block) for block in blocks) - 48000) <= 2
+    assert all(block.dtype == np.float32 for block in blocks)
+    assert abs(float(blocks[1].mean()) - 0.5) < 0.01
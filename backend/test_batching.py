@@ -0,0 +1,72 @@
+"""
+Test script for Dynamic Batching
+Tests that concurrent submissions share batched calls
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+from batching import DynamicBatcher
+
+def test_concurrent_requests_share_a_batch():
+    """Requests arriving within the window run as one batch"""
+    calls = []
+    def double(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    async def run():
+        batcher = DynamicBatcher(double, max_batch_size=32, max_wait_ms=20)
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+        return batcher, results
+
+    batcher, results = asyncio.run(run())
+    assert results == [i * 2 for i in range(10)]
+    assert calls == [list(range(10))]
+    assert batcher.stats()["batch_size_counts"] == {10: 1}
+
+def test_max_batch_size_splits_batches():
+    """A full batch is dispatched without waiting for the window"""
+    sizes = []
+    def identity(items):
+        sizes.append(len(items))
+        return items
+
+    async def run():
+        batcher = DynamicBatcher(identity, max_batch_size=4, max_wait_ms=1000)
+        return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+
+    assert asyncio.run(run()) == list(range(10))
+    assert sizes[:2] == [4, 4]
+    assert sum(sizes) == 10
+
+def test_errors_reach_every_caller():
+    """A failing batch raises in each waiting request"""
+    def fail(items):
+        raise RuntimeError("model not loaded")
+
+    async def run():
+        batcher = DynamicBatcher(fail, max_wait_ms=1)
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+def test_in_flight_batches_are_held():
+    """A running batch survives garbage collection and is released once done"""
+    import gc
+    from concurrent.futures import ThreadPoolExecutor
+
+    async def run():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = DynamicBatcher(lambda items: [item + 1 for item in items], max_wait_ms=1, executor=executor)
+            waiter = asyncio.ensure_future(batcher.submit(1))
+            await asyncio.sleep(0.01)
+            gc.collect()
+            result = await waiter
+            await asyncio.sleep(0)
+            return result, len(batcher._running)
+
+    assert asyncio.run(run()) == (2, 0)
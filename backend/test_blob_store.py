@@ -0,0 +1,61 @@
+"""
+Test script for the Blob Store
+Tests content-addressed storage, reference counting and thumbnails
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import io
+import tempfile
+from PIL import Image
+from blob_store import BlobStore
+from content_index import content_digest
+
+def test_blob_is_stored_once_and_freed_with_last_reference():
+    """Identical content shares one file that outlives all but the last release"""
+    store = BlobStore(tempfile.mkdtemp())
+    content = b"raw upload bytes"
+    digest = content_digest([content])
+    store.add_bytes(digest, content)
+    store.add_fileobj(digest, io.BytesIO(content))
+
+    assert store.refs(digest) == 2
+    with open(store.path(digest), "rb") as f:
+        assert f.read() == content
+
+    store.release(digest)
+    assert store.exists(digest)
+    store.release(digest)
+    assert not store.exists(digest)
+
+def test_references_survive_reopen():
+    """Reference counts are replayed from the log"""
+    directory = tempfile.mkdtemp()
+    store = BlobStore(directory)
+    path = os.path.join(directory, "upload.wav")
+    with open(path, "wb") as f:
+        f.write(b"audio")
+    store.add_file("abc123", path)
+    store.add_bytes("def456", b"text")
+    store.release("def456")
+    store.close()
+
+    reopened = BlobStore(directory)
+    assert reopened.refs("abc123") == 1
+    assert reopened.refs("def456") == 0
+    assert reopened.size("abc123") == 5
+
+def test_thumbnail_is_small_jpeg():
+    """Thumbnails fit in THUMBNAIL_SIZE and are removed with their blob"""
+    store = BlobStore(tempfile.mkdtemp())
+    store.add_bytes("img", b"png bytes")
+    assert store.save_thumbnail("img", Image.new("RGBA", (640, 320), "red"))
+
+    thumbnail = Image.open(store.thumbnail_path("img"))
+    assert thumbnail.format == "JPEG"
+    assert thumbnail.size == (128, 64)
+
+    store.release("img")
+    assert not os.path.exists(store.thumbnail_path("img"))
@@ -0,0 +1,52 @@
+"""
+Test script for the Content Index
+Tests content hashing and persistence of the hash to doc-id index
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+from content_index import ContentHashIndex, content_digest
+
+def test_digest_is_independent_of_chunking():
+    """Streaming chunks hash the same as the whole content"""
+    assert content_digest([b"hello ", b"world"]) == content_digest([b"hello world"])
+    assert content_digest([b"hello"]) != content_digest([b"hello!"])
+
+def test_lookup_is_per_modality():
+    """The same bytes uploaded as another modality are not a duplicate"""
+    index = ContentHashIndex(tempfile.mkdtemp())
+    index.add("text", "abc", "text_0")
+    assert index.lookup("text", "abc") == "text_0"
+    assert index.lookup("image", "abc") is None
+
+def test_reopen_replays_adds_and_removals():
+    """Entries and tombstones survive a restart"""
+    directory = tempfile.mkdtemp()
+    index = ContentHashIndex(directory)
+    index.add("text", "a", "text_0")
+    index.add("image", "b", "image_1")
+    index.remove_document("text_0")
+    index.close()
+
+    reopened = ContentHashIndex(directory)
+    assert reopened.lookup("text", "a") is None
+    assert reopened.lookup("image", "b") == "image_1"
+    assert len(reopened) == 1
+
+def test_reopen_compacts_log():
+    """A log dominated by tombstones is rewritten on open"""
+    directory = tempfile.mkdtemp()
+    index = ContentHashIndex(directory)
+    for i in range(100):
+        index.add("text", str(i), f"text_{i}")
+        index.remove_document(f"text_{i}")
+    index.add("text", "kept", "text_kept")
+    index.close()
+
+    reopened = ContentHashIndex(directory)
+    assert reopened.lookup("text", "kept") == "text_kept"
+    with open(reopened.path) as f:
+        assert len(f.readlines()) == 1
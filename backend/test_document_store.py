@@ -0,0 +1,329 @@
+"""
+Test script for the Document Store
+Tests persistence of records and memory-mapped embeddings across reopen
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import torch
+from document_store import DocumentStore
+
+def make_record(i):
+    return {"id": f"text_{i}", "content": f"document {i}", "modality": "text", "filename": f"{i}.txt"}
+
+def test_add_and_get():
+    """Records are stored in order and fetched by position"""
+    store = DocumentStore(tempfile.mkdtemp(), dim=8)
+    for i in range(3):
+        assert store.add(make_record(i), torch.randn(8)) == i
+    assert len(store) == 3
+    assert store.get(1)["id"] == "text_1"
+    assert [doc["id"] for doc in store] == ["text_0", "text_1", "text_2"]
+
+def test_reopen_preserves_corpus():
+    """Reopening a store maps the same embeddings and metadata"""
+    directory = tempfile.mkdtemp()
+    store = DocumentStore(directory, dim=8)
+    vectors = torch.randn(5, 8)
+    for i in range(5):
+        store.add(make_record(i), vectors[i])
+    store.close()
+
+    reopened = DocumentStore(directory, dim=8)
+    assert len(reopened) == 5
+    assert reopened.get(4) == make_record(4)
+    results = reopened.search(vectors[2], top_k=1)
+    assert results[0][0]["id"] == "text_2"
+    assert abs(results[0][1] - 1.0) < 1e-5
+
+def test_reopen_grows_past_capacity():
+    """Appends after reopen extend the embedding file in place"""
+    directory = tempfile.mkdtemp()
+    store = DocumentStore(directory, dim=4)
+    store.vector_index.initial_capacity = 2
+    for i in range(3):
+        store.add(make_record(i), torch.randn(4))
+    store.close()
+
+    reopened = DocumentStore(directory, dim=4)
+    for i in range(3, 2000):
+        reopened.add(make_record(i), torch.randn(4))
+    assert len(reopened) == 2000
+    assert reopened.get(1999)["id"] == "text_1999"
+
+def test_delete_and_find():
+    """Deleting a document keeps positions aligned with embeddings"""
+    directory = tempfile.mkdtemp()
+    store = DocumentStore(directory, dim=3)
+    for i in range(3):
+        store.add(make_record(i), torch.eye(3)[i])
+
+    store.delete(store.find("text_1"))
+    assert store.find("text_1") is None
+    assert len(store) == 2
+
+    reopened = DocumentStore(directory, dim=3)
+    results = reopened.search(torch.eye(3)[2], top_k=1)
+    assert results[0][0]["id"] == "text_2"
+
+def test_float16_storage():
+    """Half-precision storage still ranks documents correctly"""
+    store = DocumentStore(tempfile.mkdtemp(), dim=3, dtype="float16")
+    for i in range(3):
+        store.add(make_record(i), torch.eye(3)[i])
+    results = store.search(torch.tensor([0.0, 0.1, 1.0]), top_k=2)
+    assert [doc["id"] for doc, _ in results] == ["text_2", "text_1"]
+
+def test_chunked_documents_aggregate_by_max_sim():
+    """Chunks share a document id; search returns each document once, scored by its best chunk"""
+    store = DocumentStore(tempfile.mkdtemp(), dim=4)
+    basis = torch.eye(4)
+    for chunk in range(3):
+        store.add({"id": "text_0", "content": f"part {chunk}", "modality": "text", "chunk": chunk}, basis[chunk])
+    store.add({"id": "text_1", "content": "other", "modality": "text"}, basis[3] + 0.5 * basis[1])
+
+    assert len(store) == 4
+    assert store.document_count == 2
+    assert [doc["id"] for doc in store] == ["text_0", "text_1"]
+
+    results = store.search(basis[1], top_k=2)
+    assert [(doc["id"], doc["content"]) for doc, _ in results] == [("text_0", "part 1"), ("text_1", "other")]
+    assert abs(results[0][1] - 1.0) < 1e-5
+
+def test_delete_many_removes_every_chunk():
+    """Deleting a document's rows keeps the other documents and the document count intact"""
+    directory = tempfile.mkdtemp()
+    store = DocumentStore(directory, dim=8)
+    store.add(make_record(0), torch.randn(8))
+    for chunk in range(3):
+        store.add({**make_record(1), "chunk": chunk}, torch.randn(8))
+    store.add(make_record(2), torch.randn(8))
+
+    store.delete_many(store.find_all("text_1"))
+    assert [doc["id"] for doc in store.iter_rows()] == ["text_0", "text_2"]
+    store.close()
+
+    reopened = DocumentStore(directory, dim=8)
+    assert len(reopened) == 2
+    assert reopened.document_count == 2
+
+def test_add_many_commits_the_header_once():
+    """A batch of rows is appended and committed with a single header write"""
+    directory = tempfile.mkdtemp()
+    store = DocumentStore(directory, dim=4)
+    writes = []
+    original = store._write_header
+    store._write_header = lambda: (writes.append(1), original())
+    records = [{**make_record(0), "chunk": chunk} for chunk in range(50)]
+    assert store.add_many(records, torch.randn(50, 4)) == list(range(50))
+    assert len(writes) == 1
+
+    reopened = DocumentStore(directory, dim=4)
+    assert len(reopened) == 50 and reopened.document_count == 1
+    assert reopened.get(49) == records[49]
+
+def test_allocated_ids_are_never_reused():
+    """Ids keep counting up across deletes and restarts"""
+    directory = tempfile.mkdtemp()
+    store = DocumentStore(directory, dim=4)
+    first = store.allocate_id("text")
+    store.add({**make_record(0), "id": first}, torch.randn(4))
+    store.delete_document(first)
+    second = store.allocate_id("text")
+    store.close()
+
+    reopened = DocumentStore(directory, dim=4)
+    assert len({first, second, reopened.allocate_id("text")}) == 3
+
+def test_tombstones_are_masked_and_compacted():
+    """Deleted rows drop out of search at once and are reclaimed by compaction"""
+    directory = tempfile.mkdtemp()
+    store = DocumentStore(directory, dim=4)
+    for i in range(4):
+        store.add(make_record(i), torch.eye(4)[i])
+
+    assert store.delete_document("text_1") == 1
+    assert len(store) == 3 and store.deleted_count == 1
+    assert "text_1" not in [doc["id"] for doc, _ in store.search(torch.eye(4)[1], top_k=4)]
+    store.close()
+
+    reopened = DocumentStore(directory, dim=4)
+    assert reopened.deleted_count == 1
+    assert reopened.compact() == 1
+    assert reopened.deleted_count == 0
+    assert [doc["id"] for doc in reopened] == ["text_0", "text_2", "text_3"]
+    assert reopened.find("text_3") == 2
+    assert reopened.search(torch.eye(4)[3], top_k=1)[0][0]["id"] == "text_3"
+
+def test_compaction_carries_over_changes_made_during_the_build():
+    """Rows added and deleted while the compacted files are built survive the swap"""
+    directory = tempfile.mkdtemp()
+    params = {"nlist": 2, "train_threshold": 4}
+    store = DocumentStore(directory, dim=8, ann_index="ivf", ann_params=params, compact_min_deleted=10**6)
+    vectors = torch.randn(7, 8)
+    for i in range(5):
+        store.add({**make_record(i), "content": f"document {i} word{i}"}, vectors[i])
+    store.delete_document("text_0")
+    store.lexical_search("document")
+
+    build = store._build_compacted
+    def build_while_writing(*args):
+        ids = build(*args)
+        store.delete_document("text_2")
+        for i in range(5, 7):
+            store.add({**make_record(i), "content": f"document {i} word{i}"}, vectors[i])
+        store.delete_document("text_5")
+        return ids
+    store._build_compacted = build_while_writing
+
+    assert store.compact() == 1
+    assert [doc["id"] for doc in store] == ["text_1", "text_3", "text_4", "text_6"]
+    assert store.deleted_count == 2 and store.find("text_6") == 5 and store.find("text_2") is None
+    assert store.search(vectors[6], top_k=1, nprobe=2)[0][0]["id"] == "text_6"
+    assert [doc["id"] for doc, _ in store.lexical_search("word6 word2", top_k=2)] == ["text_6"]
+    store.close()
+
+    reopened = DocumentStore(directory, dim=8, ann_index="ivf", ann_params=params)
+    assert [doc["id"] for doc in reopened] == ["text_1", "text_3", "text_4", "text_6"]
+    assert reopened.search(vectors[4], top_k=1, nprobe=2)[0][0]["id"] == "text_4"
+    assert not os.path.exists(os.path.join(directory, DocumentStore.STAGING_DIR))
+
+def test_delete_where_removes_matching_documents():
+    """Bulk deletes take every row of each document whose head matches"""
+    store = DocumentStore(tempfile.mkdtemp(), dim=4, compact_min_deleted=1)
+    store.add(make_record(0), torch.randn(4))
+    for chunk in range(2):
+        store.add({"id": "audio_1", "content": "", "modality": "audio", "chunk": chunk}, torch.randn(4))
+
+    deleted = store.delete_where(lambda record: record["modality"] == "audio")
+    assert [record["id"] for record in deleted] == ["audio_1"]
+    assert [doc["id"] for doc in store.iter_rows()] == ["text_0"]
+    assert store.document_count == 1
+    store.close()  # waits for the background compaction the deletes triggered
+    assert store.deleted_count == 0
+
+def test_search_filters_by_metadata():
+    """Modality, filename and upload-time filters restrict results before ranking"""
+    from document_store import SearchFilter
+    store = DocumentStore(tempfile.mkdtemp(), dim=4)
+    rows = [("text_0", "text", "notes.txt", 100.0), ("image_1", "image", "cat.png", 200.0),
+            ("audio_2", "audio", "talk.wav", 300.0), ("image_3", "image", "dog.jpg", 400.0)]
+    for i, (doc_id, modality, filename, uploaded_at) in enumerate(rows):
+        store.add({"id": doc_id, "content": "", "modality": modality, "filename": filename, "uploaded_at": uploaded_at},
+                  torch.eye(4)[0] + 0.1 * torch.eye(4)[i])
+
+    def ids(search_filter):
+        return [doc["id"] for doc, _ in store.search(torch.eye(4)[0], top_k=4, search_filter=search_filter)]
+
+    assert sorted(ids(SearchFilter(modalities=["image"]))) == ["image_1", "image_3"]
+    assert ids(SearchFilter(filename="*.wav")) == ["audio_2"]
+    assert sorted(ids(SearchFilter(uploaded_after=150, uploaded_before=350))) == ["audio_2", "image_1"]
+    assert ids(SearchFilter(modalities=["image"], filename="c*")) == ["image_1"]
+
+    # Rows added or deleted after the columns were built are reflected
+    store.add({"id": "image_4", "content": "", "modality": "image", "filename": "cow.png", "uploaded_at": 500.0}, torch.eye(4)[0])
+    store.delete_document("image_1")
+    assert ids(SearchFilter(filename="c*")) == ["image_4"]
+
+def test_hybrid_search_finds_keyword_matches():
+    """Keyword and hybrid searches find exact terms and track deletes and reopens"""
+    directory = tempfile.mkdtemp()
+    store = DocumentStore(directory, dim=4)
+    store.add({"id": "text_0", "content": "order 7731 shipped", "modality": "text"}, torch.eye(4)[1])
+    store.add({"id": "text_1", "content": "unrelated notes", "modality": "text"}, torch.eye(4)[0])
+    store.add({"id": "audio_2", "content": "Audio transcription: call about order 9120", "transcription": "call about order 9120",
+               "modality": "audio", "chunk": 0}, torch.eye(4)[2])
+
+    assert [doc["id"] for doc, _ in store.lexical_search("9120")] == ["audio_2"]
+    hybrid = store.hybrid_search("order 7731", torch.eye(4)[0], top_k=3)
+    assert hybrid[0][0]["id"] == "text_0"
+    assert {doc["id"] for doc, _ in hybrid} == {"text_0", "text_1", "audio_2"}
+
+    store.delete_document("text_0")
+    store.add({"id": "text_3", "content": "order 7731 returned", "modality": "text"}, torch.eye(4)[3])
+    assert [doc["id"] for doc, _ in store.lexical_search("7731")] == ["text_3"]
+    store.close()
+
+    reopened = DocumentStore(directory, dim=4)
+    assert [doc["id"] for doc, _ in reopened.lexical_search("7731 returned", top_k=3)] == ["text_3"]
+
+def test_read_only_store_serves_published_snapshot():
+    """A reader sees only published rows and keeps its snapshot through a compaction"""
+    directory = tempfile.mkdtemp()
+    writer = DocumentStore(directory, dim=8, compact_min_deleted=10**6)
+    vectors = torch.randn(6, 8)
+    for i in range(4):
+        writer.add(make_record(i), vectors[i])
+    writer.publish_snapshot()
+    writer.add(make_record(4), vectors[4])
+
+    reader = DocumentStore(directory, dim=8, read_only=True)
+    assert len(reader) == 4
+    assert reader.search(vectors[2], top_k=1)[0][0]["id"] == "text_2"
+    assert [doc["id"] for doc, _ in reader.lexical_search("document")] != []
+
+    # Compaction replaces the files; the open reader still serves its old rows
+    writer.delete_document("text_0")
+    writer.compact()
+    writer.add(make_record(5), vectors[5])
+    assert reader.get(0)["id"] == "text_0"
+    assert reader.search(vectors[3], top_k=1)[0][0]["id"] == "text_3"
+
+    writer.publish_snapshot()
+    refreshed = DocumentStore(directory, dim=8, read_only=True)
+    assert [doc["id"] for doc in refreshed] == ["text_1", "text_2", "text_3", "text_4", "text_5"]
+    assert refreshed.search(vectors[5], top_k=1)[0][0]["id"] == "text_5"
+
+def test_reader_catches_up_on_rows_after_the_checkpoint():
+    """Indexes saved at an earlier row count are extended with the rows published since"""
+    directory = tempfile.mkdtemp()
+    params = {"nlist": 2, "train_threshold": 4}
+    writer = DocumentStore(directory, dim=8, ann_index="ivf", ann_params=params)
+    vectors = torch.randn(6, 8)
+    for i in range(4):
+        writer.add({**make_record(i), "content": f"document {i} word{i}"}, vectors[i])
+    assert writer.checkpoint(max_rows=1, max_age=float("inf"))
+    for i in range(4, 6):
+        writer.add({**make_record(i), "content": f"document {i} word{i}"}, vectors[i])
+    assert not writer.checkpoint(max_rows=10, max_age=float("inf"))
+    writer.publish_snapshot()
+
+    reader = DocumentStore(directory, dim=8, ann_index="ivf", ann_params=params, read_only=True)
+    assert len(reader) == 6
+    assert reader.search(vectors[5], top_k=1, nprobe=2)[0][0]["id"] == "text_5"
+    assert [doc["id"] for doc, _ in reader.lexical_search("word5", top_k=1)] == ["text_5"]
+    assert [doc["id"] for doc, _ in reader.lexical_search("word1", top_k=1)] == ["text_1"]
+
+def test_reader_refreshes_in_place_between_compactions():
+    """refresh() indexes only the rows published since and picks up deletes, until a compaction needs a reopen"""
+    directory = tempfile.mkdtemp()
+    params = {"nlist": 2, "train_threshold": 4}
+    writer = DocumentStore(directory, dim=8, ann_index="ivf", ann_params=params, compact_min_deleted=10**6)
+    vectors = torch.randn(8, 8)
+    for i in range(4):
+        writer.add({**make_record(i), "content": f"document {i} word{i}"}, vectors[i])
+    writer.publish_snapshot()
+
+    reader = DocumentStore(directory, dim=8, ann_index="ivf", ann_params=params, read_only=True)
+    assert reader.find("text_1") == 1 and reader.lexical_search("word1", top_k=1)
+    assert reader.refresh() and len(reader) == 4
+
+    for i in range(4, 7):
+        writer.add({**make_record(i), "content": f"document {i} word{i}"}, vectors[i])
+    writer.delete_document("text_1")
+    writer.publish_snapshot()
+    assert reader.refresh()
+    assert len(reader) == 6 and reader.document_count == 6
+    assert reader.find("text_1") is None and reader.find("text_6") == 6
+    assert reader.search(vectors[6], top_k=1, nprobe=2)[0][0]["id"] == "text_6"
+    assert [doc["id"] for doc, _ in reader.lexical_search("word5", top_k=1)] == ["text_5"]
+    assert reader.lexical_search("word1", top_k=1) == []
+
+    writer.compact()
+    writer.add(make_record(7), vectors[7])
+    writer.publish_snapshot()
+    assert not reader.refresh()
+    assert reader.get(1)["id"] == "text_1"
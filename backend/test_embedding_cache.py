@@ -0,0 +1,53 @@
+"""
+Test script for the Embedding Cache
+Tests LRU eviction, memory limits and query normalization
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+from embedding_cache import EmbeddingCache
+
+def test_hit_after_put_with_normalized_text():
+    """Queries differing only in case and whitespace share an entry"""
+    cache = EmbeddingCache()
+    cache.put("clip", "Red  Car", torch.ones(4))
+    assert torch.equal(cache.get("clip", "  red car "), torch.ones(4))
+    assert cache.get("other-model", "red car") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+def test_entry_limit_evicts_least_recently_used():
+    """The least recently used entry goes first"""
+    cache = EmbeddingCache(max_entries=2)
+    cache.put("clip", "a", torch.zeros(4))
+    cache.put("clip", "b", torch.zeros(4))
+    cache.get("clip", "a")
+    cache.put("clip", "c", torch.zeros(4))
+    assert cache.get("clip", "b") is None
+    assert cache.get("clip", "a") is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_memory_limit():
+    """Total tensor bytes stay under max_bytes"""
+    cache = EmbeddingCache(max_entries=100, max_bytes=3 * (512 * 4 + 16))
+    for i in range(5):
+        cache.put("clip", f"query {i}", torch.zeros(512))
+    assert len(cache) == 3
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+def test_cached_rows_do_not_share_batch_storage():
+    """Cached rows are copies, not views of the batch output"""
+    cache = EmbeddingCache()
+    batch = torch.zeros(8, 4)
+    cache.put("clip", "x", batch[0])
+    batch[0] += 1
+    assert torch.equal(cache.get("clip", "x"), torch.zeros(4))
+
+def test_disabled_cache():
+    """max_entries=0 stores nothing"""
+    cache = EmbeddingCache(max_entries=0)
+    cache.put("clip", "x", torch.zeros(4))
+    assert cache.get("clip", "x") is None
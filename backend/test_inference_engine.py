@@ -0,0 +1,91 @@
+"""
+Test script for Inference Engine
+Tests inference_mode forwards and traced CLIP encoders with cached artifacts
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import torch
+from transformers import CLIPConfig, CLIPModel
+from inference_engine import CompiledCLIP, InferenceEngine
+
+def make_clip() -> CLIPModel:
+    torch.manual_seed(0)
+    config = CLIPConfig(
+        text_config={"vocab_size": 100, "hidden_size": 32, "intermediate_size": 64, "num_hidden_layers": 2,
+                     "num_attention_heads": 4, "max_position_embeddings": 16, "eos_token_id": 99},
+        vision_config={"hidden_size": 32, "intermediate_size": 64, "num_hidden_layers": 2,
+                       "num_attention_heads": 4, "image_size": 32, "patch_size": 8},
+        projection_dim=16
+    )
+    return CLIPModel(config).eval()
+
+def text_inputs():
+    # Two texts of different lengths, end-of-text (99) then padding, as the processor pads them
+    input_ids = torch.tensor([[5, 6, 7, 99, 0], [8, 99, 0, 0, 0]])
+    return {"input_ids": input_ids, "attention_mask": (torch.arange(5) <= torch.tensor([[3], [1]])).long()}
+
+def test_features_need_no_grad():
+    """Embeddings come back without autograd history and can be modified in place"""
+    engine = InferenceEngine()
+    features = engine.text_features(make_clip(), text_inputs())
+    assert not features.requires_grad and features.grad_fn is None
+    features /= features.norm(dim=-1, keepdim=True)
+
+def test_traced_encoders_match_eager():
+    """Padded, bucketed traced encoders give the eager embeddings"""
+    model = make_clip()
+    engine = InferenceEngine()
+    expected_text = engine.text_features(model, text_inputs())
+    pixels = {"pixel_values": torch.randn(3, 3, 32, 32)}
+    expected_images = engine.image_features(model, pixels)
+
+    compiled = CompiledCLIP(model, "trace", tempfile.mkdtemp(), "tiny-clip", "fp32", batch_sizes=(1, 2))
+    assert torch.allclose(engine.text_features(compiled, text_inputs()), expected_text, atol=1e-5)
+    assert torch.allclose(engine.image_features(compiled, pixels), expected_images, atol=1e-5)
+    assert compiled.config is model.config
+
+def test_traced_artifacts_are_reused():
+    """A second process loads saved graphs instead of tracing again"""
+    cache_dir = tempfile.mkdtemp()
+    model = make_clip()
+    CompiledCLIP(model, "trace", cache_dir, "tiny-clip", "fp32", batch_sizes=(1, 4)).prepare()
+    artifacts = sorted(os.listdir(cache_dir))
+    assert len(artifacts) == 4
+
+    reloaded = CompiledCLIP(model, "trace", cache_dir, "tiny-clip", "fp32", batch_sizes=(1, 4))
+    reloaded.prepare()
+    assert sorted(os.listdir(cache_dir)) == artifacts
+    assert all(isinstance(encoder, torch.jit.ScriptModule) for encoder in reloaded._encoders.values())
+
+def test_warmup_runs_in_the_engine_context():
+    """Warmup forwards run under the engine's context (inference_mode and its precision), as serving does"""
+    from contextlib import contextmanager
+    from ai_models import warmup_clip
+
+    class RecordingEngine(InferenceEngine):
+        active = False
+
+        @contextmanager
+        def context(self):
+            with super().context():
+                self.active = True
+                yield
+                self.active = False
+
+    engine = RecordingEngine()
+    seen = []
+
+    class Model:
+        def get_text_features(self, **_):
+            seen.append(engine.active and torch.is_inference_mode_enabled())
+
+        def get_image_features(self, **_):
+            seen.append(engine.active)
+
+    processor = lambda **_: {"input_ids": None, "attention_mask": None, "pixel_values": None}
+    warmup_clip((Model(), processor), engine)
+    assert seen == [True, True]
@@ -0,0 +1,45 @@
+"""
+Test script for the Inference Executor
+Tests that blocking work runs off the event loop
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import threading
+import time
+from inference_executor import InferenceExecutor
+
+def test_run_returns_result_from_worker_thread():
+    """Work runs on a pool thread and its result is returned"""
+    executor = InferenceExecutor(max_workers=1, intra_op_threads=1)
+
+    async def run():
+        return await executor.run(lambda x, y=0: (x + y, threading.current_thread().name), 2, y=3)
+
+    value, thread_name = asyncio.run(run())
+    assert value == 5
+    assert thread_name.startswith("inference")
+    executor.shutdown()
+
+def test_event_loop_stays_responsive():
+    """A cheap coroutine finishes while blocking work is still running"""
+    executor = InferenceExecutor(max_workers=1, intra_op_threads=1)
+    finished = []
+
+    async def run():
+        async def cheap():
+            await asyncio.sleep(0)
+            finished.append("cheap")
+
+        async def heavy():
+            await executor.run(time.sleep, 0.2)
+            finished.append("heavy")
+
+        await asyncio.gather(heavy(), cheap())
+
+    asyncio.run(run())
+    assert finished == ["cheap", "heavy"]
+    executor.shutdown()
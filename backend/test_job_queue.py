@@ -0,0 +1,74 @@
+"""
+Test script for the Job Queue
+Tests job persistence, restart recovery and batched processing by modality
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import tempfile
+from job_queue import JobQueue, JobWorkers
+
+def submit(queue: JobQueue, modality: str, content: bytes = b"data"):
+    path = queue.new_payload_path(f"upload.{modality}")
+    with open(path, "wb") as f:
+        f.write(content)
+    return queue.submit(modality, f"upload.{modality}", None, path)
+
+def test_claim_batches_one_modality():
+    """A claim takes the oldest job's modality and only jobs of that modality"""
+    queue = JobQueue(tempfile.mkdtemp())
+    first = submit(queue, "audio")
+    submit(queue, "text")
+    third = submit(queue, "audio")
+
+    claimed = queue.claim(10)
+    assert [job["id"] for job in claimed] == [first["id"], third["id"]]
+    assert queue.get(first["id"])["status"] == "running"
+    assert [job["modality"] for job in queue.claim(10)] == ["text"]
+    assert queue.claim(10) == []
+
+def test_queue_survives_restart():
+    """Queued jobs persist and interrupted running jobs are queued again"""
+    directory = tempfile.mkdtemp()
+    queue = JobQueue(directory)
+    running = submit(queue, "text")
+    queue.claim(1)
+    waiting = submit(queue, "text")
+    queue.close()
+
+    reopened = JobQueue(directory)
+    assert reopened.get(running["id"])["status"] == "queued"
+    assert reopened.get(waiting["id"])["status"] == "queued"
+    assert reopened.counts()["queued"] == 2
+
+def test_workers_record_outcomes():
+    """Workers hand same-modality batches to the handler and store each outcome"""
+    queue = JobQueue(tempfile.mkdtemp())
+    jobs = [submit(queue, "text", b"ok"), submit(queue, "text", b"bad"), submit(queue, "image", b"ok")]
+    batches = []
+
+    async def handler(claimed):
+        batches.append([job["modality"] for job in claimed])
+        outcomes = []
+        for job in claimed:
+            with open(job["payload_path"], "rb") as f:
+                content = f.read()
+            outcomes.append(({"size": len(content)}, None) if content == b"ok" else (None, "Could not decode file"))
+        return outcomes
+
+    async def run():
+        workers = JobWorkers(queue, handler, workers=1, batch_size=8, poll_interval=0.01)
+        workers.start()
+        while queue.counts()["queued"] or queue.counts()["running"]:
+            await asyncio.sleep(0.01)
+        await workers.stop()
+
+    asyncio.run(run())
+    assert batches == [["text", "text"], ["image"]]
+    assert queue.get(jobs[0]["id"])["result"] == {"size": 2}
+    assert queue.get(jobs[1]["id"])["status"] == "failed"
+    assert queue.get(jobs[1]["id"])["error"] == "Could not decode file"
+    assert os.listdir(queue.payload_dir) == []
@@ -0,0 +1,69 @@
+"""
+Test script for Lexical Index
+Tests BM25 ranking, incremental updates, persistence and rank fusion
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import numpy as np
+from lexical_index import BM25Index, tokenize, lexical_text, reciprocal_rank_fusion
+
+TEXTS = [
+    "the quarterly report for invoice INV-2041 is attached",
+    "the weather report says rain tomorrow",
+    "the the the the report",
+    "minutes of the planning meeting",
+]
+
+def make_index():
+    index = BM25Index()
+    for position, text in enumerate(TEXTS):
+        index.add(position, text)
+    return index
+
+def test_rare_terms_rank_first():
+    """Exact IDs and rare terms outrank rows that only share common words"""
+    index = make_index()
+    assert tokenize("INV-2041") == ["inv", "2041"]
+    assert index.search("invoice INV-2041 report", top_k=2)[0] == [0, 2]
+    assert index.search("rain", top_k=5)[0] == [1]
+    assert index.search("unknownword", top_k=5) == ([], [])
+    assert lexical_text({"modality": "image", "content": "Image: cat.png"}) == ""
+    assert lexical_text({"modality": "audio", "content": "Audio transcription: hi", "transcription": "hi"}) == "hi"
+
+    # Pruned and exhaustive scoring agree on the top row
+    positions, scores = index.search("the report weather", top_k=1)
+    assert positions == [1]
+    allowed = np.array([True, False, True, True])
+    assert 1 not in index.search("the report weather", top_k=4, allowed=allowed)[0]
+
+def test_remove_and_compact():
+    """Removed rows stop matching and compaction renumbers the rest"""
+    index = make_index()
+    index.remove(1, TEXTS[1])
+    assert index.search("rain", top_k=5)[0] == []
+    assert len(index) == 3
+
+    index.compact(np.array([0, 2, 3]))
+    assert index.search("planning", top_k=5)[0] == [2]
+    assert index.search("invoice", top_k=5)[0] == [0]
+
+def test_persistence_and_fusion():
+    """A saved index reloads the rows it covers at any row count; RRF rewards agreement"""
+    directory = tempfile.mkdtemp()
+    index = make_index()
+    index.save(directory, count=4)
+
+    assert BM25Index().load(tempfile.mkdtemp(), count=4) is None
+    assert BM25Index().load(directory, count=5) == 4
+    truncated = BM25Index()
+    assert truncated.load(directory, count=2) == 2 and len(truncated) == 2
+    reloaded = BM25Index()
+    assert reloaded.load(directory, count=4) == 4
+    assert reloaded.search("planning meeting", top_k=1) == index.search("planning meeting", top_k=1)
+
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    assert [key for key, _ in fused][:2] == ["b", "a"]
@@ -0,0 +1,48 @@
+"""
+Test script for the Metrics module
+Tests counters, histograms and callback gauges in the Prometheus text format
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import MetricsRegistry
+
+def test_counter_labels_are_escaped():
+    """Counters accumulate per label set and escape label values"""
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ["route"])
+    counter.inc(route="/query")
+    counter.inc(2, route="/query")
+    counter.inc(route='say "hi"')
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/query"} 3' in text
+    assert 'requests_total{route="say \\"hi\\""} 1' in text
+
+def test_histogram_buckets_are_cumulative():
+    """Bucket counts include every smaller bucket, and +Inf equals the count"""
+    registry = MetricsRegistry()
+    histogram = registry.histogram("stage_seconds", "Stages", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, stage="search")
+    lines = registry.render().splitlines()
+    assert 'stage_seconds_bucket{stage="search",le="0.1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="search",le="1"} 3' in lines
+    assert 'stage_seconds_bucket{stage="search",le="+Inf"} 4' in lines
+    assert 'stage_seconds_count{stage="search"} 4' in lines
+    assert 'stage_seconds_sum{stage="search"} 4.25' in lines
+
+def test_callback_gauges_are_read_at_scrape():
+    """Callback gauges report the current value; a failing callback leaves the family empty"""
+    registry = MetricsRegistry()
+    size = {"rows": 1}
+    registry.gauge("index_rows", "Rows", callback=lambda: size["rows"])
+    registry.gauge("models", "Loaded", ["model"], callback=lambda: {("clip",): 1.0, ("speech",): 0.0})
+    registry.gauge("broken", "Fails", callback=lambda: 1 / 0)
+    size["rows"] = 42
+    text = registry.render()
+    assert "index_rows 42" in text
+    assert 'models{model="clip"} 1' in text and 'models{model="speech"} 0' in text
+    assert "# TYPE broken gauge" in text
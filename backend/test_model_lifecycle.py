@@ -0,0 +1,82 @@
+"""
+Test script for the Model Lifecycle Manager
+Tests lazy and background loading, warmup, failures and idle unloading
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import threading
+import time
+import pytest
+from model_lifecycle import ManagedModel, ModelLifecycleManager
+
+def test_loads_on_first_use_and_warms_up():
+    """A model is built on first use, warmed once and then reused"""
+    calls = []
+    model = ManagedModel("fake", lambda: calls.append("load") or "weights", lambda m: calls.append(f"warm {m}"))
+    assert model.state == "unloaded"
+    with model.use() as weights:
+        assert weights == "weights"
+    with model.use():
+        pass
+    assert calls == ["load", "warm weights"]
+    assert model.status()["state"] == "ready"
+
+def test_background_load_is_shared_with_waiting_callers():
+    """Callers arriving during a background load wait for it instead of loading again"""
+    release = threading.Event()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        release.wait(5)
+        return "weights"
+
+    manager = ModelLifecycleManager()
+    manager.register("fake", loader)
+    manager.start(["fake"])
+    assert manager.models["fake"].state == "loading"
+    assert not manager.is_ready("fake")
+
+    threading.Timer(0.05, release.set).start()
+    with manager.use("fake", timeout=5) as weights:
+        assert weights == "weights"
+    assert loads == [1]
+
+def test_failed_load_is_retried():
+    """A failing loader surfaces an error, fails fast, then is retried after the interval"""
+    attempts = []
+
+    def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("hub unreachable")
+        return "weights"
+
+    model = ManagedModel("fake", loader, retry_interval=0.05)
+    with pytest.raises(RuntimeError, match="hub unreachable"):
+        model.acquire()
+    with pytest.raises(RuntimeError, match="hub unreachable"):
+        model.acquire()
+    assert len(attempts) == 1
+    assert model.status()["error"] == "hub unreachable"
+    time.sleep(0.06)
+    with model.use() as weights:
+        assert weights == "weights"
+
+def test_idle_unload_skips_models_in_use():
+    """Idle models are unloaded after the TTL, but never while in use"""
+    manager = ModelLifecycleManager(idle_ttl=0.01)
+    manager.register("fake", lambda: "weights")
+    model = manager.models["fake"]
+
+    with manager.use("fake"):
+        time.sleep(0.02)
+        assert manager.unload_idle() == 0
+    time.sleep(0.02)
+    assert manager.unload_idle() == 1
+    assert model.state == "unloaded"
+    with manager.use("fake") as weights:
+        assert weights == "weights"
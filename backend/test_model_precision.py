@@ -0,0 +1,45 @@
+"""
+Test script for Model Precision
+Tests int8 dynamic quantization, bf16 fallback and autocast selection
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+import torch
+from torch import nn
+from model_precision import apply_precision, autocast, bf16_supported, resolve_precision
+
+def make_model():
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Linear(64, 128), nn.GELU(), nn.Linear(128, 32))
+
+def test_int8_quantizes_linear_layers():
+    """Linear layers become dynamic int8 modules whose outputs stay close to fp32"""
+    model = make_model()
+    inputs = torch.randn(16, 64)
+    with torch.no_grad():
+        expected = model(inputs)
+        quantized = apply_precision(make_model(), "int8")
+        actual = quantized(inputs)
+
+    assert not any(type(module) is nn.Linear for module in quantized.modules())
+    cosine = torch.nn.functional.cosine_similarity(expected, actual)
+    assert cosine.min() > 0.99
+
+def test_resolve_precision():
+    """Unknown names are rejected and bf16 falls back to fp32 without CPU support"""
+    with pytest.raises(ValueError):
+        resolve_precision("fp8")
+    assert resolve_precision("fp32") == "fp32"
+    assert resolve_precision("bf16") == ("bf16" if bf16_supported() else "fp32")
+
+def test_autocast_only_for_bf16():
+    """bf16 runs matmuls in bfloat16; fp32 and int8 leave dtypes alone"""
+    a, b = torch.randn(4, 4), torch.randn(4, 4)
+    with autocast("bf16"):
+        assert (a @ b).dtype == torch.bfloat16
+    with autocast("int8"):
+        assert (a @ b).dtype == torch.float32
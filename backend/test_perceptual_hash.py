@@ -0,0 +1,64 @@
+"""
+Test script for Perceptual Hash
+Tests pHash robustness, BK-tree range search and the persistent hash index
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import io
+import random
+import tempfile
+import numpy as np
+from PIL import Image, ImageFilter
+from perceptual_hash import BKTree, PerceptualHashIndex, hamming, phash
+
+def make_picture(seed: int) -> Image.Image:
+    """A smooth random picture, closer to a photo than pixel noise"""
+    pixels = np.random.default_rng(seed).random((8, 8, 3)) * 255
+    return Image.fromarray(pixels.astype("uint8")).resize((256, 256), Image.BICUBIC).filter(ImageFilter.GaussianBlur(4))
+
+def test_phash_survives_resize_and_recompression():
+    """A resized JPEG copy hashes close to the original; other pictures do not"""
+    original = make_picture(1)
+    buffer = io.BytesIO()
+    original.resize((120, 120)).save(buffer, format="JPEG", quality=40)
+    copy = Image.open(buffer)
+
+    assert hamming(phash(original), phash(copy)) <= 4
+    assert all(hamming(phash(original), phash(make_picture(seed))) > 12 for seed in range(2, 8))
+    assert phash(Image.new("RGB", (64, 64), "green")) is None
+
+def test_bk_tree_matches_brute_force():
+    """Range queries return exactly the hashes a linear scan finds, nearest first"""
+    rng = random.Random(0)
+    hashes = [rng.getrandbits(64) for _ in range(500)]
+    base = hashes[0]
+    hashes += [base ^ (1 << bit) ^ (1 << (bit + 7)) for bit in range(20)]
+    tree = BKTree()
+    for value, key in enumerate(hashes):
+        tree.add(key, value)
+
+    found = tree.within(base, 10)
+    expected = sorted(value for value, key in enumerate(hashes) if hamming(key, base) <= 10)
+    assert sorted(value for _, value in found) == expected
+    assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+    tree.remove(base, 0)
+    assert 0 not in [value for _, value in tree.within(base, 10)]
+    assert len(tree) == len(hashes) - 1
+
+def test_index_persists_and_forgets_documents():
+    """Hashes survive a reopen and removed documents stop matching"""
+    directory = tempfile.mkdtemp()
+    index = PerceptualHashIndex(directory)
+    index.add(0xFFFF0000FFFF0000, "image_0")
+    index.add(0x0F0F0F0F0F0F0F0F, "image_1")
+    index.remove_document("image_1")
+    index.close()
+
+    reopened = PerceptualHashIndex(directory)
+    assert len(reopened) == 1
+    assert reopened.nearest(0xFFFF0000FFFF0001, 2) == [(1, "image_0")]
+    assert reopened.nearest(0x0F0F0F0F0F0F0F0F, 2) == []
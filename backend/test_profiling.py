@@ -0,0 +1,61 @@
+"""
+Test script for the Profiling Module
+Tests per-request stage timings, shape notes and cProfile dumps
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import tempfile
+import pytest
+import torch
+from profiling import current_profile, profile_request, record_shapes
+from metrics import stage_timer
+from inference_executor import InferenceExecutor
+
+def test_stages_are_recorded_only_inside_a_profile():
+    """Stage timers and shape notes feed the active profile and are ignored outside one"""
+    with stage_timer("outside"):
+        pass
+    record_shapes("outside", input_ids=torch.zeros(2, 5))
+    with profile_request() as profile:
+        with stage_timer("tokenize"):
+            pass
+        with stage_timer("tokenize"):
+            pass
+        record_shapes("clip_text", input_ids=torch.zeros(2, 5), samples=16000)
+    assert current_profile() is None
+    summary = profile.summary()
+    assert [entry["stage"] for entry in summary["stages"]] == ["tokenize", "tokenize"]
+    assert list(summary["stage_totals_ms"]) == ["tokenize"]
+    assert summary["shapes"] == [{"stage": "clip_text", "input_ids": [2, 5], "samples": 16000}]
+    assert summary["dump"] is None
+
+def test_executor_work_is_attributed_and_dumped():
+    """Work run on the inference executor lands in the request's profile and its cProfile dump"""
+    executor = InferenceExecutor(max_workers=1, intra_op_threads=1)
+
+    def encode():
+        with stage_timer("clip_text_forward"):
+            return sum(range(1000))
+
+    async def request():
+        with profile_request("cprofile", tempfile.mkdtemp()) as profile:
+            await executor.run(encode)
+        return profile
+
+    try:
+        profile = asyncio.run(request())
+    finally:
+        executor.shutdown()
+    summary = profile.summary()
+    assert [entry["stage"] for entry in summary["stages"]] == ["clip_text_forward"]
+    assert summary["dump"].endswith(".pstats") and os.path.exists(summary["dump"])
+
+def test_unknown_profiler_is_rejected():
+    """Only the known dump kinds are accepted"""
+    with pytest.raises(ValueError):
+        with profile_request("gprof"):
+            pass
@@ -0,0 +1,102 @@
+"""
+Test script for Embedding Quantization
+Tests int8 scalar and product quantization codes and exact re-ranking
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tempfile
+import torch
+from vector_index import MemmapVectorIndex, VectorIndex
+from quantization import ScalarQuantizer, ProductQuantizer, ScalarQuantizedIndex, ProductQuantizedIndex
+from document_store import DocumentStore
+
+def make_index(count=600, dim=32):
+    torch.manual_seed(0)
+    index = VectorIndex(dim=dim)
+    index.add(torch.randn(count, dim))
+    return index
+
+def test_scalar_quantizer_roundtrip():
+    """Decoded int8 codes stay within half a quantization step"""
+    data = VectorIndex.normalize(torch.randn(200, 32))
+    quantizer = ScalarQuantizer()
+    quantizer.train(data)
+    codes = quantizer.encode(data)
+    assert codes.dtype == torch.uint8
+    assert torch.all((quantizer.decode(codes) - data).abs() <= quantizer.scale / 2 + 1e-6)
+
+def test_product_quantizer_code_size():
+    """PQ codes use one byte per sub-vector"""
+    data = torch.randn(300, 32)
+    quantizer = ProductQuantizer(m=8, iterations=5)
+    quantizer.train(data)
+    assert quantizer.encode(data).shape == (300, 8)
+    assert quantizer.decode(quantizer.encode(data)).shape == (300, 32)
+
+def test_scalar_index_matches_exact_with_rerank():
+    """Re-ranked sq8 search returns the exact top-k"""
+    index = make_index()
+    sq8 = ScalarQuantizedIndex(index, train_threshold=0)
+    sq8.train()
+    assert sq8.code_bytes == 32
+    assert sq8.bytes_per_vector == 32 + 32 * 4
+    query = torch.randn(32)
+    assert sq8.search(query, top_k=5, rerank_factor=8)[0] == index.search(query, top_k=5)[0]
+
+def test_memory_mapped_rows_stay_on_disk():
+    """Over an embedding file only the codes count as memory; re-ranking reads rows back from the file"""
+    torch.manual_seed(0)
+    index = MemmapVectorIndex(os.path.join(tempfile.mkdtemp(), "embeddings.float32"), dim=32)
+    index.add(torch.randn(600, 32))
+    sq8 = ScalarQuantizedIndex(index, train_threshold=0)
+    sq8.train()
+    assert sq8.bytes_per_vector == sq8.code_bytes == 32
+
+    exact = VectorIndex(dim=32)
+    exact.add(index.matrix.clone())
+    query = torch.randn(32)
+    assert sq8.search(query, top_k=5, rerank_factor=8)[0] == exact.search(query, top_k=5)[0]
+    sq8.add(index.add(query))
+    assert sq8.search(query, top_k=1)[0] == [600]
+
+def test_product_index_finds_stored_vector():
+    """A stored vector is its own nearest neighbour after PQ + re-rank"""
+    index = make_index()
+    pq = ProductQuantizedIndex(index, m=8, train_threshold=0)
+    pq.train()
+    assert pq.code_bytes == 8
+
+    vector = torch.randn(32)
+    pq.add(index.add(vector))
+    positions, scores = pq.search(vector, top_k=1)
+    assert positions == [len(index) - 1]
+    assert abs(scores[0] - 1.0) < 1e-5
+
+def test_store_persists_codes():
+    """Codes saved on flush are restored on reopen"""
+    directory = tempfile.mkdtemp()
+    params = {"m": 4, "train_threshold": 20}
+    store = DocumentStore(directory, dim=16, ann_index="pq", ann_params=params)
+    vectors = torch.randn(30, 16)
+    for i in range(30):
+        store.add({"id": f"text_{i}", "content": "", "modality": "text"}, vectors[i])
+    store.delete(store.find("text_0"))
+    store.close()
+
+    reopened = DocumentStore(directory, dim=16, ann_index="pq", ann_params=params)
+    assert reopened.ann_index.is_trained
+    assert reopened.search(vectors[12], top_k=1)[0][0]["id"] == "text_12"
+
+def test_filtered_search_scores_only_candidates():
+    """Quantized search restricted to candidate rows re-ranks only those rows"""
+    index = make_index()
+    pq = ProductQuantizedIndex(index, m=8, train_threshold=0)
+    pq.train()
+
+    candidates = torch.arange(1, 600, 3)
+    positions, _ = pq.search(index.matrix[4], top_k=5, candidates=candidates)
+    assert positions[0] == 4
+    assert all(position % 3 == 1 for position in positions)
@@ -0,0 +1,93 @@
+"""
+Test script for the Shared Store
+Tests writer election, snapshot publishing and read-only snapshot refresh
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import asyncio
+import tempfile
+import torch
+from document_store import DocumentStore
+from shared_store import SnapshotFollower, SnapshotPublisher, WriterLease
+
+def make_record(i):
+    return {"id": f"text_{i}", "content": f"document {i}", "modality": "text"}
+
+def test_only_one_writer_lease():
+    """A second lease on the same directory is refused until the first is released"""
+    directory = tempfile.mkdtemp()
+    first = WriterLease(directory)
+    second = WriterLease(directory)
+    assert first.held and not second.held
+    first.release()
+    assert WriterLease(directory).held
+
+def test_publisher_skips_unchanged_store():
+    """A snapshot is published only when rows were added or deleted since the last one"""
+    store = DocumentStore(tempfile.mkdtemp(), dim=4)
+    publisher = SnapshotPublisher(store)
+    assert publisher.publish()
+    assert not publisher.publish()
+    store.add(make_record(0), torch.randn(4))
+    assert publisher.publish()
+    assert DocumentStore.read_snapshot(store.directory)["count"] == 1
+
+def test_follower_refreshes_in_place_and_reopens_after_compaction():
+    """The follower moves its store forward in place, and opens a new one only once the writer compacted"""
+    directory = tempfile.mkdtemp()
+    writer = DocumentStore(directory, dim=4, compact_min_deleted=10**6)
+    publisher = SnapshotPublisher(writer)
+    publisher.publish()
+    follower = SnapshotFollower(lambda: DocumentStore(directory, dim=4, read_only=True), check_interval=0)
+    served = follower.store
+    assert len(served) == 0
+
+    writer.add(make_record(0), torch.randn(4))
+    writer.add(make_record(1), torch.randn(4))
+    assert follower.refresh() is served and len(served) == 0
+    publisher.publish()
+    assert follower.refresh() is served and [doc["id"] for doc in served] == ["text_0", "text_1"]
+
+    writer.delete_document("text_0")
+    writer.compact()
+    publisher.publish()
+    reopened = follower.refresh()
+    assert reopened is not served and reopened is follower.store
+    assert [doc["id"] for doc in reopened] == ["text_1"] and reopened.get(0)["id"] == "text_1"
+
+def test_follower_task_swaps_in_reopened_stores():
+    """The background task refreshes off the request path and reports reopened stores"""
+    directory = tempfile.mkdtemp()
+    writer = DocumentStore(directory, dim=4, compact_min_deleted=10**6)
+    writer.add(make_record(0), torch.randn(4))
+    writer.publish_snapshot()
+    follower = SnapshotFollower(lambda: DocumentStore(directory, dim=4, read_only=True), check_interval=0.01)
+    swapped = []
+
+    async def follow():
+        follower.start(on_swap=swapped.append)
+        writer.add(make_record(1), torch.randn(4))
+        writer.publish_snapshot()
+        await asyncio.sleep(0.2)
+        assert len(follower.store) == 2 and swapped == []
+        writer.delete_document("text_0")
+        writer.compact()
+        writer.publish_snapshot()
+        await asyncio.sleep(0.2)
+        await follower.stop()
+
+    asyncio.run(follow())
+    assert swapped == [follower.store] and len(follower.store) == 1
+
+def test_publisher_checkpoints_past_the_row_threshold():
+    """Publishing alone does not save the indexes; they are saved once enough rows were added"""
+    store = DocumentStore(tempfile.mkdtemp(), dim=4)
+    publisher = SnapshotPublisher(store, checkpoint_rows=2, checkpoint_interval=float("inf"))
+    bm25_path = os.path.join(store.directory, "bm25_index.npz")
+    store.add(make_record(0), torch.randn(4))
+    assert publisher.publish() and not os.path.exists(bm25_path)
+    store.add(make_record(1), torch.randn(4))
+    assert publisher.publish() and os.path.exists(bm25_path)
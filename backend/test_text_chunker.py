@@ -0,0 +1,44 @@
+"""
+Test script for the Text Chunker
+Tests overlapping token windows and streaming input
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import re
+from text_chunker import TextChunker, chunk_text
+
+class WordTokenizer:
+    """Stand-in fast tokenizer: one token per word, with character offsets"""
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=True):
+        return {"offset_mapping": [match.span() for match in re.finditer(r"\S+", text)]}
+
+TEXT = " ".join(f"w{i}" for i in range(100))
+
+def test_windows_overlap_and_cover_text():
+    """Windows have window_tokens tokens, share overlap_tokens and cover every token"""
+    windows = chunk_text(TEXT, WordTokenizer(), window_tokens=10, overlap_tokens=3)
+    assert [window.index for window in windows] == list(range(len(windows)))
+    assert windows[0].text == " ".join(f"w{i}" for i in range(10))
+    assert windows[1].text.split()[:3] == ["w7", "w8", "w9"]
+    assert windows[-1].text.split()[-1] == "w99"
+    for window in windows:
+        assert TEXT[window.start:window.end] == window.text
+        assert len(window.text.split()) <= 10
+
+def test_streaming_matches_whole_text():
+    """Feeding arbitrary blocks gives the same windows as chunking at once"""
+    chunker = TextChunker(WordTokenizer(), window_tokens=10, overlap_tokens=3)
+    windows = []
+    for start in range(0, len(TEXT), 7):
+        windows.extend(chunker.feed(TEXT[start:start + 7]))
+    windows.extend(chunker.finish())
+    assert windows == chunk_text(TEXT, WordTokenizer(), window_tokens=10, overlap_tokens=3)
+
+def test_short_and_empty_text_give_one_window():
+    """Texts shorter than a window, or empty, are a single chunk"""
+    assert [window.text for window in chunk_text("hello world", WordTokenizer())] == ["hello world"]
+    assert len(chunk_text("", WordTokenizer())) == 1
@@ -0,0 +1,66 @@
+"""
+Test script for the Vector Index
+Tests growth, search and compaction on the contiguous embedding matrix
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import torch
+from vector_index import VectorIndex
+
+def test_add_grows_capacity():
+    """Appending past capacity doubles the allocation"""
+    index = VectorIndex(dim=8, initial_capacity=2)
+    positions = index.add(torch.randn(5, 8))
+    assert positions == [0, 1, 2, 3, 4]
+    assert len(index) == 5
+    assert index.capacity >= 5
+    assert torch.allclose(index.matrix.norm(dim=1), torch.ones(5))
+
+def test_search_matches_cosine_similarity():
+    """Top-k search agrees with a brute-force cosine ranking"""
+    torch.manual_seed(0)
+    vectors = torch.randn(100, 16)
+    query = torch.randn(16)
+    index = VectorIndex()
+    index.add(vectors)
+
+    positions, scores = index.search(query, top_k=5)
+    expected = torch.nn.functional.cosine_similarity(vectors, query.unsqueeze(0))
+    expected_top = torch.topk(expected, 5)
+    assert positions == expected_top.indices.tolist()
+    assert torch.allclose(torch.tensor(scores), expected_top.values, atol=1e-5)
+
+def test_search_caps_top_k():
+    """Asking for more results than stored returns everything"""
+    index = VectorIndex()
+    index.add(torch.randn(2, 4))
+    positions, scores = index.search(torch.randn(4), top_k=3)
+    assert len(positions) == 2
+    assert len(scores) == 2
+
+def test_search_empty_index():
+    """An empty index returns no results"""
+    index = VectorIndex(dim=4)
+    assert index.search(torch.randn(4)) == ([], [])
+
+def test_compact_keeps_rows_in_order():
+    """Compaction moves the kept rows to the front, in order"""
+    index = VectorIndex()
+    vectors = torch.eye(3)
+    index.add(vectors)
+    index.compact(np.array([0, 2]))
+    assert len(index) == 2
+    assert torch.equal(index.matrix, vectors[[0, 2]])
+
+def test_dimension_mismatch():
+    """Embeddings of the wrong width are rejected"""
+    index = VectorIndex(dim=4)
+    try:
+        index.add(torch.randn(1, 5))
+        assert False, "Expected ValueError"
+    except ValueError:
+        pass
@@ -0,0 +1,112 @@
+"""
+Text Chunker Module
+Streams text into overlapping token windows that fit the CLIP text encoder
+"""
+
+from typing import List, NamedTuple
+
+WHITESPACE = " \n\t\r"
+# Longest run without whitespace held back before it is tokenized anyway
+MAX_UNTOKENIZED_CHARS = 65536
+BLOCK_CHARS = 65536
+
+class TextWindow(NamedTuple):
+    """One chunk of a document: its index, character span and text"""
+    index: int
+    start: int
+    end: int
+    text: str
+
+class TextChunker:
+    """Incrementally splits text into windows of window_tokens tokens, consecutive
+    windows sharing overlap_tokens tokens.
+
+    Text is fed in blocks (e.g. as an upload is decoded); each block is
+    tokenized up to its last whitespace, so only the unfinished tail and the
+    tokens of the window in progress are held in memory. The tokenizer must be
+    a fast tokenizer, as windows are mapped back to the text through its
+    character offsets.
+    """
+
+    def __init__(self, tokenizer, window_tokens: int = 75, overlap_tokens: int = 16):
+        if not 0 <= overlap_tokens < window_tokens:
+            raise ValueError("overlap_tokens must be smaller than window_tokens")
+        self.tokenizer = tokenizer
+        self.window_tokens = window_tokens
+        self.overlap_tokens = overlap_tokens
+
+        self._text = ""        # text from _text_start on that is still needed
+        self._text_start = 0   # absolute character offset of _text
+        self._untokenized = 0  # characters at the end of _text not yet tokenized
+        self._spans = []       # (start, end) absolute offsets of pending tokens
+        self._fresh = 0        # pending tokens not covered by an emitted window
+        self._emitted = 0
+
+    def _tokenize(self, text: str, offset: int):
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        spans = [(offset + start, offset + end) for start, end in encoding["offset_mapping"]]
+        self._spans.extend(spans)
+        self._fresh += len(spans)
+
+    def _window(self, count: int) -> TextWindow:
+        start, end = self._spans[0][0], self._spans[count - 1][1]
+        window = TextWindow(self._emitted, start, end, self._text[start - self._text_start:end - self._text_start])
+        self._emitted += 1
+        return window
+
+    def _drain(self) -> List[TextWindow]:
+        windows = []
+        step = self.window_tokens - self.overlap_tokens
+        while len(self._spans) >= self.window_tokens:
+            windows.append(self._window(self.window_tokens))
+            del self._spans[:step]
+            self._fresh = len(self._spans) - self.overlap_tokens
+
+        # Drop text that no pending token refers to any more
+        keep_from = self._spans[0][0] if self._spans else len(self._text) + self._text_start - self._untokenized
+        self._text = self._text[keep_from - self._text_start:]
+        self._text_start = keep_from
+        return windows
+
+    def feed(self, text: str) -> List[TextWindow]:
+        """Add a block of text and return the windows it completes"""
+        self._text += text
+        self._untokenized += len(text)
+
+        # Tokenize up to the last whitespace; a word may continue in the next block
+        tail_start = len(self._text) - self._untokenized
+        cut = max(self._text.rfind(char, tail_start) for char in WHITESPACE)
+        if cut < 0:
+            if self._untokenized <= MAX_UNTOKENIZED_CHARS:
+                return []
+            cut = len(self._text) - 1
+
+        self._tokenize(self._text[tail_start:cut + 1], self._text_start + tail_start)
+        self._untokenized = len(self._text) - cut - 1
+        return self._drain()
+
+    def finish(self, text: str = "") -> List[TextWindow]:
+        """Flush the remaining text, returning the last (possibly shorter) windows"""
+        self._text += text
+        tail_start = len(self._text) - len(text) - self._untokenized
+        self._tokenize(self._text[tail_start:], self._text_start + tail_start)
+        self._untokenized = 0
+
+        windows = self._drain()
+        if self._fresh > 0 or (self._emitted == 0 and self._spans):
+            windows.append(self._window(len(self._spans)))
+        elif self._emitted == 0:
+            # Empty or whitespace-only text is still one (empty) document chunk
+            windows.append(TextWindow(0, self._text_start, self._text_start + len(self._text), self._text))
+            self._emitted = 1
+        self._spans = []
+        self._fresh = 0
+        return windows
+
+def chunk_text(text: str, tokenizer, window_tokens: int = 75, overlap_tokens: int = 16) -> List[TextWindow]:
+    """Split an in-memory text into overlapping token windows, tokenizing it block by block"""
+    chunker = TextChunker(tokenizer, window_tokens, overlap_tokens)
+    windows = []
+    for start in range(0, len(text), BLOCK_CHARS):
+        windows.extend(chunker.feed(text[start:start + BLOCK_CHARS]))
+    return windows + chunker.finish()
@@ -0,0 +1,320 @@
+"""
+Vector Index Module
+Keeps document embeddings in one contiguous, L2-normalized matrix for fast search
+"""
+
+import os
+import mmap
+import numpy as np
+import torch
+import torch.nn.functional as F
+from typing import List, Optional, Tuple
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+GATHER_CHUNK_ROWS = 65536
+
+class VectorIndex:
+    """Growable embedding matrix scored with a single matrix-vector product"""
+
+    # Rows are held in RAM; MemmapVectorIndex keeps them in a file instead
+    in_memory = True
+
+    def __init__(self, dim: Optional[int] = None, initial_capacity: int = 1024, dtype: torch.dtype = torch.float32):
+        self.dim = dim
+        self.dtype = dtype
+        self.initial_capacity = max(1, initial_capacity)
+        self._matrix = None
+        self._size = 0
+
+        if dim is not None:
+            self._matrix = torch.empty((self.initial_capacity, dim), dtype=dtype)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        """Number of rows allocated for the matrix"""
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    @property
+    def matrix(self) -> torch.Tensor:
+        """View of the stored (normalized) embeddings"""
+        if self._matrix is None:
+            return torch.empty((0, self.dim or 0), dtype=self.dtype)
+        return self._matrix[:self._size]
+
+    @staticmethod
+    def normalize(vectors: torch.Tensor) -> torch.Tensor:
+        """L2-normalize vectors along the last dimension"""
+        return F.normalize(vectors.detach().to(torch.float32), dim=-1)
+
+    def _reserve(self, required: int):
+        """Grow the matrix by doubling so appends stay amortized O(1)"""
+        if required <= self.capacity:
+            return
+
+        new_capacity = max(required, self.capacity * 2, self.initial_capacity)
+        grown = torch.empty((new_capacity, self.dim), dtype=self.dtype)
+        if self._matrix is not None:
+            grown[:self._size] = self._matrix[:self._size]
+        self._matrix = grown
+
+    def add(self, embeddings: torch.Tensor) -> List[int]:
+        """Append one or more embeddings and return their row positions"""
+        vectors = embeddings.reshape(-1, embeddings.shape[-1])
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}, got {vectors.shape[1]}")
+
+        count = vectors.shape[0]
+        self._reserve(self._size + count)
+        self._matrix[self._size:self._size + count] = self.normalize(vectors).to(self.dtype)
+
+        positions = list(range(self._size, self._size + count))
+        self._size += count
+        return positions
+
+    def compact(self, keep: np.ndarray):
+        """Keep only the rows at the (ascending) positions in keep, moving them to the front
+
+        Rows are gathered in chunks; since keep[i] >= i, a chunk never
+        overwrites rows a later chunk still has to read.
+        """
+        for start in range(0, len(keep), GATHER_CHUNK_ROWS):
+            rows = torch.from_numpy(keep[start:start + GATHER_CHUNK_ROWS])
+            self._matrix[start:start + len(rows)] = self._matrix[rows]
+        self._size = len(keep)
+
+    def clear(self):
+        """Drop all stored embeddings, keeping the allocation"""
+        self._size = 0
+
+    def read_rows(self, positions: torch.Tensor) -> torch.Tensor:
+        """Copy of the rows at positions"""
+        return self._matrix[positions]
+
+    def evict(self, start: int = 0, stop: Optional[int] = None):
+        """Release the memory of rows start..stop where they can be read back later (a no-op here)"""
+
+    def scores(self, query_embedding: torch.Tensor) -> torch.Tensor:
+        """Cosine similarity of the query against every stored embedding"""
+        query = self.normalize(query_embedding.reshape(-1)).to(self.dtype)
+        return (self.matrix @ query).float()
+
+    def candidate_scores(self, query_embedding: torch.Tensor, candidates: torch.Tensor) -> torch.Tensor:
+        """Cosine similarity of the query against only the rows at positions candidates"""
+        query = self.normalize(query_embedding.reshape(-1)).to(self.dtype)
+        return torch.cat([
+            (self._matrix[candidates[start:start + GATHER_CHUNK_ROWS]] @ query).float()
+            for start in range(0, len(candidates), GATHER_CHUNK_ROWS)
+        ]) if len(candidates) else torch.empty(0)
+
+    def search(self, query_embedding: torch.Tensor, top_k: int = 3,
+               exclude: Optional[torch.Tensor] = None,
+               candidates: Optional[torch.Tensor] = None) -> Tuple[List[int], List[float]]:
+        """Return positions and scores of the top_k most similar embeddings
+
+        exclude is an optional boolean mask of rows (e.g. deleted ones) to skip.
+        With candidates (positions, e.g. the rows passing a metadata filter)
+        only those rows are scored.
+        """
+        if self._size == 0 or top_k <= 0:
+            return [], []
+
+        if candidates is not None:
+            similarities = self.candidate_scores(query_embedding, candidates)
+            if len(similarities) == 0:
+                return [], []
+            top = torch.topk(similarities, min(top_k, len(similarities)))
+            return candidates[top.indices].tolist(), top.values.tolist()
+
+        similarities = self.scores(query_embedding)
+        available = self._size
+        if exclude is not None:
+            excluded = exclude[:self._size]
+            similarities[excluded] = float("-inf")
+            available -= int(excluded.sum())
+        if available <= 0:
+            return [], []
+
+        top = torch.topk(similarities, min(top_k, available))
+        return top.indices.tolist(), top.values.tolist()
+
+class MemmapVectorIndex(VectorIndex):
+    """VectorIndex whose matrix lives in a fixed-width file opened with numpy.memmap
+
+    A read_only index maps the file copy-on-write and never extends it, so
+    several processes can map one file and share its pages. Compaction writes
+    the kept rows to a new file that replaces the old one; processes still
+    mapping the old file keep reading it unchanged.
+    """
+
+    NUMPY_DTYPES = {torch.float32: np.float32, torch.float16: np.float16}
+    in_memory = False
+
+    def __init__(self, path: str, dim: int, size: int = 0, initial_capacity: int = 1024, dtype: torch.dtype = torch.float32,
+                 read_only: bool = False):
+        if dtype not in self.NUMPY_DTYPES:
+            raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+        super().__init__(dim=None, initial_capacity=initial_capacity, dtype=dtype)
+        self.path = path
+        self.dim = dim
+        self.read_only = read_only
+        self._array = None
+        self._reader = None  # handle for row reads and page cache advice, see read_rows
+
+        existing_rows = self._file_rows(size)
+        # Mapping the file is O(1): pages are only read when a search touches them
+        if not read_only:
+            self._map(max(existing_rows, self.initial_capacity))
+        elif existing_rows:
+            self._map_read_only(existing_rows)
+        self._size = size
+
+    def _file_rows(self, size: int) -> int:
+        """Number of rows the backing file holds, checked to cover size"""
+        row_bytes = self.dim * np.dtype(self.NUMPY_DTYPES[self.dtype]).itemsize
+        existing_rows = os.path.getsize(self.path) // row_bytes if os.path.exists(self.path) else 0
+        if size > existing_rows:
+            raise ValueError(f"Embedding file {self.path} holds {existing_rows} rows, expected at least {size}")
+        return existing_rows
+
+    def _map_read_only(self, rows: int):
+        self._array = np.memmap(self.path, dtype=self.NUMPY_DTYPES[self.dtype], mode="c", shape=(rows, self.dim))
+        self._matrix = torch.from_numpy(self._array)
+        self._open_reader()
+
+    def follow(self, size: int):
+        """Serve the first size rows of a read-only index's file, remapping it if the writer has grown it since
+
+        Only valid while the file at path is the one mapped (no compaction
+        replaced it); rows already mapped keep their positions.
+        """
+        if not self.read_only:
+            raise RuntimeError("Only a read-only embedding index follows its file")
+        if size > self.capacity:
+            self._map_read_only(self._file_rows(size))
+        self._size = size
+
+    def _map(self, capacity: int):
+        """(Re)map the backing file, extending it to hold capacity rows"""
+        numpy_dtype = self.NUMPY_DTYPES[self.dtype]
+        required_bytes = capacity * self.dim * np.dtype(numpy_dtype).itemsize
+        with open(self.path, "ab") as f:
+            if f.tell() < required_bytes:
+                f.truncate(required_bytes)
+
+        self._array = np.memmap(self.path, dtype=numpy_dtype, mode="r+", shape=(capacity, self.dim))
+        self._matrix = torch.from_numpy(self._array)
+        self._open_reader()
+
+    def _open_reader(self):
+        """(Re)open the handle on the mapped file that read_rows and evict go through
+
+        Kept open so a read-only index keeps reading its own file after a
+        compaction replaced the one at path.
+        """
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = open(self.path, "rb")
+        # Rows are read one at a time; readahead would only cache their neighbours
+        os.posix_fadvise(self._reader.fileno(), 0, 0, os.POSIX_FADV_RANDOM)
+
+    def _reserve(self, required: int):
+        """Grow the backing file by doubling; existing rows stay in place"""
+        if required <= self.capacity:
+            return
+        if self.read_only:
+            raise RuntimeError(f"Embedding file {self.path} is mapped read-only")
+
+        self.flush()
+        self._map(max(required, self.capacity * 2))
+
+    def compact(self, keep: np.ndarray):
+        """Write the rows at the (ascending) positions in keep to a new file that replaces the old one"""
+        if self.read_only:
+            raise RuntimeError(f"Embedding file {self.path} is mapped read-only")
+
+        tmp_path = self.path + ".tmp"
+        self.write_rows(keep, tmp_path)
+        self.replace_file(tmp_path, len(keep))
+
+    def write_rows(self, positions: np.ndarray, path: str, start: int = 0):
+        """Copy the rows at positions into the embedding file at path, from row start on
+
+        The file is created anew when start is 0. Only the mapping current at
+        the call is read, so rows can be copied while new ones are appended.
+        """
+        array = self._array
+        numpy_dtype = self.NUMPY_DTYPES[self.dtype]
+        capacity = max(start + len(positions), self.initial_capacity)
+        with open(path, "r+b" if start else "wb") as f:
+            required_bytes = capacity * self.dim * np.dtype(numpy_dtype).itemsize
+            if os.fstat(f.fileno()).st_size < required_bytes:
+                f.truncate(required_bytes)
+        if not len(positions):
+            return
+
+        target = np.memmap(path, dtype=numpy_dtype, mode="r+", shape=(capacity, self.dim))
+        for offset in range(0, len(positions), GATHER_CHUNK_ROWS):
+            rows = positions[offset:offset + GATHER_CHUNK_ROWS]
+            target[start + offset:start + offset + len(rows)] = array[rows]
+        target.flush()
+        del target
+
+    def replace_file(self, path: str, size: int):
+        """Move the embedding file at path (see write_rows) over this one and map it, holding size rows"""
+        os.replace(path, self.path)
+        self._map(max(size, self.initial_capacity))
+        self._size = size
+
+    def read_rows(self, positions: torch.Tensor) -> torch.Tensor:
+        """Copy of the rows at positions, read from the file without leaving their pages resident
+
+        Rows are read with pread rather than through the mapping, which
+        would also map the pages around each row.
+        """
+        if not len(positions):
+            return torch.empty((0, self.dim), dtype=self.dtype)
+        row_bytes = self.dim * self._array.itemsize
+        spans = [(position, position + 1) for position in positions.tolist()]
+        buffer = bytearray(len(spans) * row_bytes)
+        for i, (position, _) in enumerate(spans):
+            buffer[i * row_bytes:(i + 1) * row_bytes] = os.pread(self._reader.fileno(), row_bytes, position * row_bytes)
+        self._drop_pages(spans, mapped=False)
+        return torch.frombuffer(buffer, dtype=self.dtype).reshape(len(spans), self.dim)
+
+    def evict(self, start: int = 0, stop: Optional[int] = None):
+        """Drop the pages of rows start..stop from this process and the page cache
+
+        The rows stay in the file and are paged in again when read. Dirty
+        pages leave the page cache once the kernel has written them back.
+        """
+        self._drop_pages([(start, self._size if stop is None else stop)])
+
+    def _drop_pages(self, spans: List[Tuple[int, int]], mapped: bool = True):
+        """Advise the kernel that the rows in spans are not needed: unmap them (if mapped) and uncache them"""
+        if self._array is None:
+            return
+        # numpy keeps the mmap.mmap behind the array in _mmap
+        mapping = self._array._mmap
+        row_bytes = self.dim * self._array.itemsize
+        for start, stop in spans:
+            offset = start * row_bytes // mmap.PAGESIZE * mmap.PAGESIZE
+            length = min(stop * row_bytes, len(mapping)) - offset
+            if length > 0:
+                if mapped:
+                    mapping.madvise(mmap.MADV_DONTNEED, offset, length)
+                os.posix_fadvise(self._reader.fileno(), offset, length, os.POSIX_FADV_DONTNEED)
+
+    def flush(self):
+        """Write dirty pages back to the embedding file"""
+        if self._array is not None and not self.read_only:
+            self._array.flush()
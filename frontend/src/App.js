@@ -19,8 +19,18 @@ function App() {
 
   const loadDocuments = async () => {
     try {
-      const response = await axios.get(`${API_BASE_URL}/documents`);
-      setDocuments(response.data.documents);
+      // The list only shows ids, modalities and filenames; skip the heavy fields.
+      // Pages are capped at 1000 documents, so follow next_cursor to the end.
+      const loaded = [];
+      let cursor = null;
+      do {
+        const response = await axios.get(`${API_BASE_URL}/documents`, {
+          params: { fields: 'modality,filename', limit: 1000, ...(cursor && { cursor }) }
+        });
+        loaded.push(...response.data.documents);
+        cursor = response.data.next_cursor;
+      } while (cursor);
+      setDocuments(loaded);
     } catch (error) {
       console.error('Error loading documents:', error);
     }